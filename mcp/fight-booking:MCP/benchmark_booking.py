@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Booking Contention Benchmark
+Fires thousands of concurrent book_flight calls (plus some cancellations)
+at a few hot flights, checks that no flight is overbooked and no booking
+id repeats, and reports throughput.
+
+    python benchmark_booking.py --calls 5000 --hot-flights 3
+    python benchmark_booking.py --db /tmp/bench.db --processes 4
+    python benchmark_booking.py --group-size 4
+    python benchmark_booking.py --journal /tmp/bench.journal
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import time
+
+from flight_store import BOOKING_COLUMNS
+
+
+def _load_server(db_path, journal_path=None):
+    # The server reads its configuration from the environment at import time
+    if db_path:
+        os.environ["FLIGHT_DB_PATH"] = db_path
+    if journal_path:
+        os.environ["FLIGHT_JOURNAL_PATH"] = journal_path
+    os.environ.setdefault("FLIGHT_INVENTORY_SEED", "42")
+    import flight_booking_fastmcp as server
+    server.generate_sample_flights()
+    return server
+
+
+async def _hammer(server, flight_ids, calls, cancel_ratio, seed, group_size=1):
+    """Run every call concurrently; returns (seconds, booked, rejected, cancelled, booking ids)"""
+    rng = random.Random(seed)
+    booked, rejected, cancelled, ids = 0, 0, 0, []
+    start = time.perf_counter()
+
+    async def one(i):
+        nonlocal booked, rejected, cancelled
+        flight_id = rng.choice(flight_ids)
+        if group_size > 1:
+            passengers = [{"name": f"Passenger {i}.{j}", "email": f"p{i}@example.com"} for j in range(group_size)]
+            result = await server.book_group(flight_id, passengers)
+        else:
+            result = await server.book_flight(flight_id, f"Passenger {i}", f"p{i}@example.com")
+        if "error" in result:
+            rejected += 1
+            return
+        booking_ids = [booking["booking_id"] for booking in result.get("bookings", [result])]
+        booked += len(booking_ids)
+        ids.extend(booking_ids)
+        if rng.random() < cancel_ratio:
+            for booking_id in booking_ids:
+                if "error" not in await server.cancel_booking(booking_id):
+                    cancelled += 1
+
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    return time.perf_counter() - start, booked, rejected, cancelled, ids
+
+
+def _worker(args, flight_ids, calls, seed, results):
+    server = _load_server(args.db)
+    results.put(asyncio.run(_hammer(server, flight_ids, calls, args.cancel_ratio, seed, args.group_size)))
+
+
+def _stored_state(db_path, flight_ids):
+    """Seat counts and confirmed seat numbers per flight, as recorded in the store"""
+    conn = sqlite3.connect(db_path)
+    marks = ", ".join("?" * len(flight_ids))
+    seats = dict(conn.execute(f"SELECT id, available_seats FROM flights WHERE id IN ({marks})", flight_ids))
+    confirmed = {}
+    for flight_id, seat_number in conn.execute(
+        f"SELECT flight_id, seat_number FROM bookings WHERE status = 'confirmed' AND flight_id IN ({marks})",
+        flight_ids
+    ):
+        confirmed.setdefault(flight_id, []).append(seat_number)
+    conn.close()
+    return seats, confirmed
+
+
+def _journal_state(journal_path, flight_ids):
+    """Seat counts and confirmed seat numbers per flight, as replayed from the journal"""
+    from journal_store import JournalStore
+    journal = JournalStore(journal_path)
+    seats = {flight_id: available_seats for flight_id, available_seats in journal.load_seat_counts()}
+    confirmed = {}
+    for row in journal.load_bookings():
+        booking = dict(zip(BOOKING_COLUMNS, row))
+        if booking["status"] == "confirmed" and booking["flight_id"] in flight_ids:
+            confirmed.setdefault(booking["flight_id"], []).append(booking["seat_number"])
+    journal.close()
+    return seats, confirmed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=5000, help="book_flight calls per process")
+    parser.add_argument("--hot-flights", type=int, default=3, help="number of flights all calls target")
+    parser.add_argument("--group-size", type=int, default=1, help="passengers per call (book_group when > 1)")
+    parser.add_argument("--cancel-ratio", type=float, default=0.1, help="share of bookings cancelled right away")
+    parser.add_argument("--db", help="SQLite store shared by the processes (default: in-memory only)")
+    parser.add_argument("--journal", help="write-ahead journal for a single process (checked by replaying it)")
+    parser.add_argument("--processes", type=int, default=1, help="server processes (needs --db when > 1)")
+    args = parser.parse_args()
+    if args.processes > 1 and not args.db:
+        parser.error("--processes > 1 needs a shared --db")
+    if args.db and args.journal:
+        parser.error("use either --db or --journal")
+    for path in (args.db, args.journal):
+        if path and os.path.exists(path):
+            parser.error(f"{path} already exists; the benchmark needs a fresh store")
+
+    server = _load_server(args.db, args.journal)
+    hot = server.sample_inventory(args.hot_flights)
+    flight_ids = [flight.id for flight in hot]
+    initial = {flight.id: flight.available_seats for flight in hot}
+    total_calls = args.calls * args.processes
+    print(f"🔥 {total_calls} concurrent booking calls on {len(hot)} flights with {sum(initial.values())} seats")
+    print(f"   processes: {args.processes}, group size: {args.group_size}, store: {args.db or args.journal or 'in-memory'}")
+
+    if args.processes == 1:
+        runs = [asyncio.run(_hammer(server, flight_ids, args.calls, args.cancel_ratio, 0, args.group_size))]
+    else:
+        # Spawn, not fork: children must open their own store connections
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        workers = [
+            context.Process(target=_worker, args=(args, flight_ids, args.calls, seed, results))
+            for seed in range(args.processes)
+        ]
+        for worker in workers:
+            worker.start()
+        runs = [results.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+
+    # Processes run side by side; the slowest one bounds the throughput
+    elapsed = max(run[0] for run in runs)
+    booked = sum(run[1] for run in runs)
+    rejected = sum(run[2] for run in runs)
+    cancelled = sum(run[3] for run in runs)
+    ids = [booking_id for run in runs for booking_id in run[4]]
+
+    if args.db:
+        seats, confirmed = _stored_state(args.db, flight_ids)
+    elif args.journal:
+        server.store.close()
+        seats, confirmed = _journal_state(args.journal, flight_ids)
+    else:
+        seats = {flight_id: server.get_flight(flight_id).available_seats for flight_id in flight_ids}
+        confirmed = {}
+        for booking in server.bookings_db:
+            if booking.status == "confirmed":
+                confirmed.setdefault(booking.flight_id, []).append(booking.seat_number)
+
+    print(f"\n⏱️ {elapsed:.2f}s, {total_calls / elapsed:,.0f} calls/s")
+    print(f"   seats booked: {booked}, calls rejected: {rejected}, cancelled: {cancelled}")
+
+    failures = []
+    if len(ids) != len(set(ids)):
+        failures.append(f"{len(ids) - len(set(ids))} duplicate booking ids")
+    for flight_id in flight_ids:
+        seat_numbers = confirmed.get(flight_id, [])
+        sold = len(seat_numbers)
+        print(f"   {flight_id}: {initial[flight_id]} seats, {sold} confirmed, {seats[flight_id]} left")
+        if seats[flight_id] < 0 or sold > initial[flight_id]:
+            failures.append(f"{flight_id} is overbooked")
+        if sold + seats[flight_id] != initial[flight_id]:
+            failures.append(f"{flight_id} seat count does not match its bookings")
+        if len(set(seat_numbers)) != sold:
+            failures.append(f"{flight_id} has seats assigned to more than one passenger")
+
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        sys.exit(1)
+    print("✅ No overbooking, no double-assigned seats, no duplicate booking ids")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Booking Statistics
+
+Running aggregates that every booking and cancellation updates in O(1),
+so reading them never scans the bookings:
+
+- Bookings, cancellations and revenue overall, per route, per airline and
+  per flight
+- Per-minute and per-hour rollups in fixed-size ring buffers; a bucket is
+  reset when its slot comes round again, so memory stays constant however
+  long the server runs
+
+Revenue is net: a cancellation takes its refund back off the route,
+airline and flight it was earned on. Rollups only see events recorded
+live, not history loaded at start-up.
+"""
+
+import heapq
+import math
+import time
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+# Bucket fields: bookings, cancellations, revenue
+EMPTY = (0, 0, 0.0)
+
+
+class RingCounter:
+    """Bookings, cancellations and revenue per time bucket, for the last `size` buckets"""
+
+    def __init__(self, width: float, size: int):
+        if width <= 0 or size <= 0:
+            raise ValueError("width and size must be positive")
+        self.width = width
+        self.size = size
+        self._counts: List[List[float]] = [list(EMPTY) for _ in range(size)]
+        # Bucket number (time // width) each slot currently counts
+        self._buckets: List[Optional[int]] = [None] * size
+
+    def add(self, now: float, bookings: int = 0, cancellations: int = 0, revenue: float = 0.0):
+        bucket = math.floor(now / self.width)
+        slot = bucket % self.size
+        counts = self._counts[slot]
+        if self._buckets[slot] != bucket:
+            self._buckets[slot] = bucket
+            counts[:] = EMPTY
+        counts[0] += bookings
+        counts[1] += cancellations
+        counts[2] += revenue
+
+    def series(self, now: float) -> List[Tuple[float, int, int, float]]:
+        """(bucket start, bookings, cancellations, revenue) for the last `size` buckets, oldest first"""
+        current = math.floor(now / self.width)
+        series = []
+        for bucket in range(current - self.size + 1, current + 1):
+            slot = bucket % self.size
+            counts = self._counts[slot] if self._buckets[slot] == bucket else EMPTY
+            series.append((bucket * self.width, int(counts[0]), int(counts[1]), counts[2]))
+        return series
+
+
+class Totals:
+    """Counters for one route, airline or flight"""
+
+    __slots__ = ("bookings", "cancellations", "revenue")
+
+    def __init__(self):
+        self.bookings = 0
+        self.cancellations = 0
+        self.revenue = 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "bookings": self.bookings,
+            "cancellations": self.cancellations,
+            "revenue": round(self.revenue, 2),
+            "cancellation_rate": round(self.cancellations / self.bookings, 4) if self.bookings else 0.0,
+        }
+
+
+def _entry(table: Dict[Hashable, Totals], key: Hashable) -> Totals:
+    totals = table.get(key)
+    if totals is None:
+        totals = table[key] = Totals()
+    return totals
+
+
+class BookingStats:
+    """O(1) running aggregates of bookings and cancellations"""
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self._clock = clock
+        self.total = Totals()
+        self.routes: Dict[Tuple[str, str], Totals] = {}
+        self.airlines: Dict[str, Totals] = {}
+        self.flights: Dict[str, Totals] = {}
+        self.per_minute = RingCounter(60, 60)
+        self.per_hour = RingCounter(3600, 24)
+
+    def _totals(self, route: Tuple[str, str], airline: str, flight_id: str) -> Tuple[Totals, ...]:
+        return (
+            self.total,
+            _entry(self.routes, route),
+            _entry(self.airlines, airline),
+            _entry(self.flights, flight_id),
+        )
+
+    def booked(self, route: Tuple[str, str], airline: str, flight_id: str, price: float, live: bool = True):
+        for totals in self._totals(route, airline, flight_id):
+            totals.bookings += 1
+            totals.revenue += price
+        if live:
+            now = self._clock()
+            self.per_minute.add(now, bookings=1, revenue=price)
+            self.per_hour.add(now, bookings=1, revenue=price)
+
+    def cancelled(self, route: Tuple[str, str], airline: str, flight_id: str, refund: float, live: bool = True):
+        for totals in self._totals(route, airline, flight_id):
+            totals.cancellations += 1
+            totals.revenue -= refund
+        if live:
+            now = self._clock()
+            self.per_minute.add(now, cancellations=1, revenue=-refund)
+            self.per_hour.add(now, cancellations=1, revenue=-refund)
+
+    def rollup(self, ring: RingCounter) -> Dict[str, object]:
+        """A ring's buckets plus their sums, for the window it spans"""
+        series = ring.series(self._clock())
+        bookings = sum(bucket[1] for bucket in series)
+        cancellations = sum(bucket[2] for bucket in series)
+        minutes = ring.width * ring.size / 60
+        return {
+            "bucket_seconds": ring.width,
+            "bookings": bookings,
+            "cancellations": cancellations,
+            "revenue": round(sum(bucket[3] for bucket in series), 2),
+            "bookings_per_minute": round(bookings / minutes, 3),
+            "cancellations_per_minute": round(cancellations / minutes, 3),
+            "buckets": [
+                {
+                    "start": time.strftime("%Y-%m-%d %H:%M", time.localtime(start)),
+                    "bookings": bookings,
+                    "cancellations": cancellations,
+                    "revenue": round(revenue, 2),
+                }
+                for start, bookings, cancellations, revenue in series
+            ],
+        }
+
+
+def top_by_revenue(totals: Dict[Hashable, Totals], count: int) -> List[Tuple[Hashable, Totals]]:
+    """The `count` entries with the most revenue"""
+    return heapq.nlargest(count, totals.items(), key=lambda item: item[1].revenue)
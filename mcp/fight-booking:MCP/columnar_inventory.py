@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Columnar Flight Inventory
+
+Optional storage backend that keeps every flight field in parallel NumPy
+arrays. Search filters run as vectorized masks over a route slice and
+Flight objects are only built for the rows that are actually returned.
+"""
+
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Row columns followed by the index arrays derived from them. Together they
+# are the complete state of an inventory (see arrays() / from_arrays()).
+COLUMNS = (
+    "ids", "flight_numbers", "departure_codes", "arrival_codes", "airline_codes", "aircraft_codes",
+    "departure_ts", "arrival_ts", "duration_minutes", "prices", "seats",
+)
+ARRAYS = COLUMNS + ("route_table", "id_order", "airport_order", "airport_departure_ts", "airport_table")
+
+
+class FlightLeg(NamedTuple):
+    """Lightweight view of one row, used by the itinerary search"""
+    row: int
+    id: str
+    departure_airport: str
+    arrival_airport: str
+    departure_ts: int
+    arrival_ts: int
+    price: float
+    available_seats: int
+
+
+def _encode(values: Sequence[str]) -> Tuple[List[str], np.ndarray]:
+    """Dictionary-encode a column of strings into (labels, codes)"""
+    labels, codes = np.unique(np.asarray(values, dtype=object), return_inverse=True)
+    return [str(label) for label in labels], codes.astype(np.uint16)
+
+
+class ColumnarInventory:
+    """Flight inventory stored as parallel arrays, grouped by route"""
+
+    def __init__(
+        self,
+        flight_cls: type,
+        ids: np.ndarray,
+        flight_numbers: np.ndarray,
+        airports: List[str],
+        departure_codes: np.ndarray,
+        arrival_codes: np.ndarray,
+        airlines: List[str],
+        airline_codes: np.ndarray,
+        aircraft_types: List[str],
+        aircraft_codes: np.ndarray,
+        departure_ts: np.ndarray,
+        arrival_ts: np.ndarray,
+        duration_minutes: np.ndarray,
+        prices: np.ndarray,
+        seats: np.ndarray,
+    ):
+        self.flight_cls = flight_cls
+        self.airports = list(airports)
+        self.airlines = list(airlines)
+        self.aircraft_types = list(aircraft_types)
+
+        # Rows are ordered by (route, departure time) so each route is one
+        # contiguous slice and time windows are a binary search inside it
+        order = np.lexsort((departure_ts, arrival_codes, departure_codes))
+        self.ids = np.asarray(ids, dtype="S")[order]
+        self.flight_numbers = np.asarray(flight_numbers, dtype="S")[order]
+        self.departure_codes = np.asarray(departure_codes, dtype=np.uint16)[order]
+        self.arrival_codes = np.asarray(arrival_codes, dtype=np.uint16)[order]
+        self.airline_codes = np.asarray(airline_codes, dtype=np.uint16)[order]
+        self.aircraft_codes = np.asarray(aircraft_codes, dtype=np.uint16)[order]
+        self.departure_ts = np.asarray(departure_ts, dtype=np.int64)[order]
+        self.arrival_ts = np.asarray(arrival_ts, dtype=np.int64)[order]
+        self.duration_minutes = np.asarray(duration_minutes, dtype=np.uint16)[order]
+        self.prices = np.asarray(prices, dtype=np.float32)[order]
+        self.seats = np.asarray(seats, dtype=np.int32)[order]
+
+        route_keys = self.departure_codes.astype(np.int64) * len(self.airports) + self.arrival_codes
+        keys, starts, counts = np.unique(route_keys, return_index=True, return_counts=True)
+        self.route_table = np.stack([keys, starts, starts + counts], axis=1).astype(np.int64)
+        self.id_order = np.argsort(self.ids, kind="stable")
+
+        # Second ordering by (departure airport, departure time) for
+        # connection searches that fan out to every destination
+        self.airport_order = np.lexsort((self.departure_ts, self.departure_codes))
+        self.airport_departure_ts = self.departure_ts[self.airport_order]
+        codes, starts, counts = np.unique(
+            self.departure_codes[self.airport_order], return_index=True, return_counts=True
+        )
+        self.airport_table = np.stack([codes, starts, starts + counts], axis=1).astype(np.int64)
+        self._build_lookups()
+
+    def _build_lookups(self):
+        """Small Python dicts over the route and airport tables"""
+        self._airport_codes = {code: i for i, code in enumerate(self.airports)}
+        self._routes: Dict[int, Tuple[int, int]] = {
+            int(key): (int(start), int(stop)) for key, start, stop in self.route_table.tolist()
+        }
+        self._airport_slices: Dict[int, Tuple[int, int]] = {
+            int(code): (int(start), int(stop)) for code, start, stop in self.airport_table.tolist()
+        }
+
+    @classmethod
+    def from_flights(cls, flights: Sequence[Any], flight_cls: type) -> "ColumnarInventory":
+        """Build the columns from a list of Flight objects"""
+        airports, airport_codes = _encode(
+            [f.departure_airport for f in flights] + [f.arrival_airport for f in flights]
+        )
+        airlines, airline_codes = _encode([f.airline for f in flights])
+        aircraft_types, aircraft_codes = _encode([f.aircraft_type for f in flights])
+        return cls(
+            flight_cls=flight_cls,
+            ids=np.array([f.id for f in flights], dtype="S"),
+            flight_numbers=np.array([f.flight_number for f in flights], dtype="S"),
+            airports=airports,
+            departure_codes=airport_codes[:len(flights)],
+            arrival_codes=airport_codes[len(flights):],
+            airlines=airlines,
+            airline_codes=airline_codes,
+            aircraft_types=aircraft_types,
+            aircraft_codes=aircraft_codes,
+            departure_ts=np.array([f.departure_ts for f in flights], dtype=np.int64),
+            arrival_ts=np.array([f.arrival_ts for f in flights], dtype=np.int64),
+            duration_minutes=np.array([f.duration_minutes for f in flights]),
+            prices=np.array([f.price for f in flights]),
+            seats=np.array([f.available_seats for f in flights]),
+        )
+
+    @classmethod
+    def from_batches(
+        cls,
+        batches: Iterable[Dict[str, np.ndarray]],
+        airports: List[str],
+        airlines: List[str],
+        aircraft_types: List[str],
+        flight_cls: type,
+    ) -> "ColumnarInventory":
+        """Build the inventory from streamed column batches (see inventory_generator)"""
+        columns: Dict[str, List[np.ndarray]] = {}
+        for batch in batches:
+            for name, values in batch.items():
+                columns.setdefault(name, []).append(values)
+        return cls(
+            flight_cls=flight_cls,
+            airports=airports,
+            airlines=airlines,
+            aircraft_types=aircraft_types,
+            **{name: np.concatenate(parts) for name, parts in columns.items()},
+        )
+
+    @classmethod
+    def from_arrays(
+        cls,
+        arrays: Dict[str, np.ndarray],
+        airports: List[str],
+        airlines: List[str],
+        aircraft_types: List[str],
+        flight_cls: type,
+    ) -> "ColumnarInventory":
+        """Adopt already-sorted columns and indexes (see arrays()) without copying them"""
+        inventory = cls.__new__(cls)
+        inventory.flight_cls = flight_cls
+        inventory.airports = list(airports)
+        inventory.airlines = list(airlines)
+        inventory.aircraft_types = list(aircraft_types)
+        for name in ARRAYS:
+            setattr(inventory, name, arrays[name])
+        inventory._build_lookups()
+        return inventory
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """Every column and index array, keyed by the names in ARRAYS"""
+        return {name: getattr(self, name) for name in ARRAYS}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def row_of(self, flight_id: str) -> Optional[int]:
+        """Row number for a flight id, or None"""
+        key = flight_id.encode()
+        pos = int(np.searchsorted(self.ids, key, sorter=self.id_order))
+        if pos < len(self.ids) and self.ids[self.id_order[pos]] == key:
+            return int(self.id_order[pos])
+        return None
+
+    def route_slice(self, departure_airport: str, arrival_airport: str) -> Tuple[int, int]:
+        """[start, stop) rows for a route, empty if the route is unknown"""
+        dep = self._airport_codes.get(departure_airport)
+        arr = self._airport_codes.get(arrival_airport)
+        if dep is None or arr is None:
+            return (0, 0)
+        return self._routes.get(dep * len(self.airports) + arr, (0, 0))
+
+    def search(
+        self,
+        departure_airport: str,
+        arrival_airport: str,
+        start_ts: int,
+        end_ts: int,
+        min_seats: int = 1,
+        max_price: Optional[float] = None,
+        limit: Optional[int] = None,
+        after: Optional[Tuple[float, str]] = None,
+    ) -> Tuple[np.ndarray, int, bool]:
+        """Cheapest rows on a route departing in [start_ts, end_ts).
+
+        Returns up to ``limit`` rows sorted by (price, id), the total number
+        of matches, and whether more rows follow the page. ``after`` is a
+        (price, id) pagination key; only rows sorting after it are paged.
+        Only the candidates at or below the k-th price are fully sorted.
+        """
+        start, stop = self.route_slice(departure_airport, arrival_airport)
+        times = self.departure_ts[start:stop]
+        lo = start + int(np.searchsorted(times, start_ts, side="left"))
+        hi = start + int(np.searchsorted(times, end_ts, side="left"))
+
+        mask = self.seats[lo:hi] >= min_seats
+        if max_price is not None:
+            mask &= self.prices[lo:hi] <= np.float32(max_price)
+        rows = np.flatnonzero(mask) + lo
+        count = len(rows)
+        if after is not None:
+            price, flight_id = np.float32(after[0]), after[1].encode()
+            prices = self.prices[rows]
+            rows = rows[(prices > price) | ((prices == price) & (self.ids[rows] > flight_id))]
+        has_more = limit is not None and limit < len(rows)
+        if has_more:
+            if limit <= 0:
+                return rows[:0], count, True
+            prices = self.prices[rows]
+            kth_price = np.partition(prices, limit - 1)[limit - 1]
+            # Keep every tie at the k-th price so the id tie-break stays exact
+            rows = rows[prices <= kth_price]
+        rows = rows[np.lexsort((self.ids[rows], self.prices[rows]))]
+        return rows[:limit], count, has_more
+
+    def departures(
+        self,
+        departure_airport: str,
+        start_ts: int,
+        end_ts: int,
+        arrival_airport: Optional[str] = None,
+        min_seats: int = 1,
+        max_price: Optional[float] = None,
+        max_arrival: Optional[int] = None,
+        order_by: Optional[str] = None,
+    ) -> Iterable[FlightLeg]:
+        """Legs leaving an airport in [start_ts, end_ts), by departure time or sorted by order_by.
+
+        Seats, price and arrival are filtered as masks over the window. With
+        order_by ("price" or "arrival") the rows are sorted as arrays and
+        legs are built lazily, so a caller that stops early never pays for
+        the rest.
+        """
+        if arrival_airport is not None:
+            start, stop = self.route_slice(departure_airport, arrival_airport)
+            times = self.departure_ts[start:stop]
+            rows = np.arange(
+                start + int(np.searchsorted(times, start_ts, side="left")),
+                start + int(np.searchsorted(times, end_ts, side="left")),
+            )
+        else:
+            code = self._airport_codes.get(departure_airport)
+            start, stop = self._airport_slices.get(code, (0, 0))
+            times = self.airport_departure_ts[start:stop]
+            lo = start + int(np.searchsorted(times, start_ts, side="left"))
+            hi = start + int(np.searchsorted(times, end_ts, side="left"))
+            rows = self.airport_order[lo:hi]
+        mask = self.seats[rows] >= min_seats
+        if max_price is not None:
+            mask &= self.prices[rows] <= max_price
+        if max_arrival is not None:
+            mask &= self.arrival_ts[rows] <= max_arrival
+        rows = rows[mask]
+        if order_by is None:
+            return self.legs(rows)
+        if order_by == "price":
+            # Rounded like FlightLeg.price, so ties keep departure order
+            key = np.round(self.prices[rows].astype(np.float64), 2)
+        else:
+            key = self.arrival_ts[rows]
+        return self._iter_legs(rows[np.argsort(key, kind="stable")])
+
+    def _iter_legs(self, rows: np.ndarray) -> Iterator[FlightLeg]:
+        """legs() in chunks that double in size, built as they are consumed"""
+        start, chunk = 0, 16
+        while start < len(rows):
+            yield from self.legs(rows[start:start + chunk])
+            start += chunk
+            chunk *= 2
+
+    def legs(self, rows: np.ndarray) -> List[FlightLeg]:
+        """Lightweight views of the given rows, in the same order"""
+        airports = self.airports
+        return [
+            FlightLeg(row, flight_id.decode(), airports[dep], airports[arr], dep_ts, arr_ts, price, seats)
+            for row, flight_id, dep, arr, dep_ts, arr_ts, price, seats in zip(
+                rows.tolist(),
+                self.ids[rows].tolist(),
+                self.departure_codes[rows].tolist(),
+                self.arrival_codes[rows].tolist(),
+                self.departure_ts[rows].tolist(),
+                self.arrival_ts[rows].tolist(),
+                np.round(self.prices[rows].astype(np.float64), 2).tolist(),
+                self.seats[rows].tolist(),
+            )
+        ]
+
+    def flight_at(self, row: int) -> Any:
+        """Materialize one row as a Flight object"""
+        return self.flight_cls(
+            id=self.ids[row].decode(),
+            airline=self.airlines[self.airline_codes[row]],
+            flight_number=self.flight_numbers[row].decode(),
+            departure_airport=self.airports[self.departure_codes[row]],
+            arrival_airport=self.airports[self.arrival_codes[row]],
+            # Epoch seconds and minutes; Flight formats them only when asked
+            departure_time=int(self.departure_ts[row]),
+            arrival_time=int(self.arrival_ts[row]),
+            duration=int(self.duration_minutes[row]),
+            price=round(float(self.prices[row]), 2),
+            available_seats=int(self.seats[row]),
+            aircraft_type=self.aircraft_types[self.aircraft_codes[row]],
+        )
+
+    def get(self, flight_id: str) -> Optional[Any]:
+        """Materialize a flight by id, or None"""
+        row = self.row_of(flight_id)
+        return None if row is None else self.flight_at(row)
+
+    def set_seats(self, flight_id: str, seats: int):
+        """Write back a seat count changed by a booking or cancellation"""
+        row = self.row_of(flight_id)
+        if row is not None:
+            self.seats[row] = seats
+
+    def airline_seat_totals(self, capacity_of: Callable[[str], int]) -> Dict[str, List[int]]:
+        """[seats, available seats] per airline, given the seat capacity of an aircraft type"""
+        capacities = np.asarray([capacity_of(aircraft) for aircraft in self.aircraft_types], dtype=np.int64)
+        seats = np.bincount(self.airline_codes, weights=capacities[self.aircraft_codes], minlength=len(self.airlines))
+        available = np.bincount(self.airline_codes, weights=self.seats, minlength=len(self.airlines))
+        return {
+            airline: [int(seats[code]), int(available[code])]
+            for code, airline in enumerate(self.airlines)
+            if seats[code]
+        }
+
+    def load_seat_counts(self, flight_ids: Sequence[str], seats: Sequence[int]):
+        """Overwrite many seat counts at once; unknown flight ids are ignored"""
+        if len(self.ids) == 0 or len(flight_ids) == 0:
+            return
+        keys = np.asarray([flight_id.encode() for flight_id in flight_ids], dtype="S")
+        positions = np.searchsorted(self.ids, keys, sorter=self.id_order)
+        rows = self.id_order[np.minimum(positions, len(self.ids) - 1)]
+        found = self.ids[rows] == keys
+        self.seats[rows[found]] = np.asarray(seats, dtype=np.int32)[found]
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Concurrency Primitives for the Booking Path
+
+- StripedLocks: a fixed pool of asyncio locks picked by key hash, so
+  writes to different flights almost never wait on each other while the
+  memory used stays constant however many flights there are
+- IdAllocator: monotonic ids that never repeat inside a process and,
+  given a reserve callback, never repeat across processes either
+"""
+
+import asyncio
+import zlib
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+
+DEFAULT_STRIPES = 1024
+
+# await reserve(count, minimum) -> last id of a block of `count` ids above `minimum`
+ReserveFn = Callable[[int, int], Awaitable[int]]
+
+
+class StripedLocks:
+    """asyncio locks striped by key"""
+
+    def __init__(self, stripes: int = DEFAULT_STRIPES):
+        if stripes <= 0:
+            raise ValueError("stripes must be positive")
+        self.stripes = stripes
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._locks: List[asyncio.Lock] = []
+
+    def _stripe(self, key: str) -> int:
+        # crc32 rather than hash() so a key maps to the same stripe in every process
+        return zlib.crc32(key.encode()) % self.stripes
+
+    def _pool(self) -> List[asyncio.Lock]:
+        # asyncio locks belong to one event loop; start a fresh pool per loop
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._locks = [asyncio.Lock() for _ in range(self.stripes)]
+        return self._locks
+
+    def lock_for(self, key: str) -> asyncio.Lock:
+        return self._pool()[self._stripe(key)]
+
+    @asynccontextmanager
+    async def hold(self, *keys: str) -> AsyncIterator[None]:
+        """Hold the locks for every key.
+
+        Stripes are taken once each and in ascending order, so callers
+        locking overlapping sets of keys cannot deadlock.
+        """
+        pool = self._pool()
+        stripes = sorted({self._stripe(key) for key in keys})
+        acquired = []
+        try:
+            for stripe in stripes:
+                await pool[stripe].acquire()
+                acquired.append(pool[stripe])
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
+
+
+class IdAllocator:
+    """Formats increasing sequence numbers as ids like BK0001.
+
+    Without a reserve callback numbers come from a local counter. With one,
+    the allocator reserves blocks of numbers from shared storage and hands
+    them out locally, so processes sharing the storage never collide and
+    only touch it once per block. Reserving is awaited, so a slow or
+    contended store never stalls the event loop.
+    """
+
+    def __init__(self, prefix: str, width: int = 4, reserve: Optional[ReserveFn] = None, block_size: int = 64):
+        self.prefix = prefix
+        self.width = width
+        self._reserve = reserve
+        self._block_size = block_size
+        self._last = 0
+        self._block_end = 0
+        # One reservation at a time; like StripedLocks, a fresh lock per event loop
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._refill: Optional[asyncio.Lock] = None
+
+    def format(self, number: int) -> str:
+        return f"{self.prefix}{number:0{self.width}d}"
+
+    def observe(self, existing_id: str):
+        """Never hand out an id at or below one that already exists"""
+        if existing_id.startswith(self.prefix) and existing_id[len(self.prefix):].isdigit():
+            self._last = max(self._last, int(existing_id[len(self.prefix):]))
+
+    def _refill_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._refill = asyncio.Lock()
+        return self._refill
+
+    async def next_id(self) -> str:
+        # observe() may move past the block while a reservation is awaited, hence the loop
+        while self._reserve is not None and self._last >= self._block_end:
+            async with self._refill_lock():
+                if self._last >= self._block_end:
+                    block_end = await self._reserve(self._block_size, self._last)
+                    self._block_end = block_end
+                    self._last = max(self._last, block_end - self._block_size)
+        # No await between the check above and advancing the counter
+        self._last += 1
+        return self.format(self._last)
+
+    async def take(self, count: int) -> List[str]:
+        return [await self.next_id() for _ in range(count)]
@@ -6,32 +6,129 @@ A modern Model Context Protocol server using FastMCP framework
 that provides flight booking functionality with Tools, Resources, and Prompts.
 """
 
+import asyncio
+import base64
+import bisect
+import gc
+import heapq
+import itertools
+import json
+import os
 import random
-from datetime import datetime, timedelta
-from typing import Dict, List, Any
-from dataclasses import dataclass
+import sys
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Dict, Iterable, List, Any, Optional, Tuple, Union
+from dataclasses import dataclass, field
 
 from mcp.server.fastmcp import FastMCP
 
+import itinerary_search
+from booking_stats import BookingStats, Totals, top_by_revenue
+from concurrency import IdAllocator, StripedLocks
+from flight_store import FLIGHT_COLUMNS, FlightStore, SeatUnavailable, SQLiteStore, normalize_email
+from idempotency import IdempotencyStore, idempotent
+from journal_store import JournalStore
+from inventory_generator import AIRCRAFT_TYPES, generate_column_batches, generate_flight_records
+from json_fragments import Fragment, dumps as dumps_json, fragment
+from search_cache import SearchCache
+from seat_maps import SEAT_CLASSES, SeatMaps, layout_for
+from timer_wheel import TimerWheel
+
+try:
+    from columnar_inventory import ColumnarInventory
+    from inventory_snapshot import open_snapshot, write_snapshot
+except ImportError:  # numpy is optional; the columnar backend and snapshots are unavailable without it
+    ColumnarInventory = None
+
 # Initialize FastMCP server
 mcp = FastMCP("flight-booking-server")
 
+TIME_FORMAT = "%Y-%m-%d %H:%M"
+
+def parse_timestamp(value: str) -> int:
+    """Epoch seconds for a "YYYY-MM-DD" or "YYYY-MM-DD HH:MM" string (read as UTC)"""
+    return int(datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp())
+
+@lru_cache(maxsize=1 << 16)
+def format_timestamp(ts: int) -> str:
+    """"YYYY-MM-DD HH:MM" (UTC) for epoch seconds; flights share a few thousand distinct times"""
+    return datetime.fromtimestamp(ts, timezone.utc).strftime(TIME_FORMAT)
+
+def parse_duration(value: str) -> int:
+    """Minutes in a "5h 23m" style duration"""
+    hours, _, rest = value.partition("h")
+    return int(hours) * 60 + int(rest.strip().rstrip("m") or 0)
+
 # Data models
-@dataclass
+@dataclass(init=False, slots=True)
 class Flight:
+    """A scheduled flight.
+
+    Slotted, with times held as epoch seconds and minutes; the formatted
+    departure_time, arrival_time and duration strings are derived on
+    access. Airline, airport and aircraft names are interned so millions
+    of flights share one copy of each.
+    """
     id: str
     airline: str
     flight_number: str
     departure_airport: str
     arrival_airport: str
-    departure_time: str
-    arrival_time: str
-    duration: str
+    departure_ts: int
+    arrival_ts: int
+    duration_minutes: int
     price: float
     available_seats: int
     aircraft_type: str
+    # Pre-encoded JSON of the static fields, built on first use (see _flight_summary)
+    summary_json: Optional[Tuple[Dict[str, Any], str, str]] = field(default=None, repr=False, compare=False)
+    details_json: Optional[Fragment] = field(default=None, repr=False, compare=False)
+
+    def __init__(
+        self,
+        id: str,
+        airline: str,
+        flight_number: str,
+        departure_airport: str,
+        arrival_airport: str,
+        departure_time: Union[str, int],
+        arrival_time: Union[str, int],
+        duration: Union[str, int],
+        price: float,
+        available_seats: int,
+        aircraft_type: str
+    ):
+        """Times are "YYYY-MM-DD HH:MM" strings or epoch seconds, duration "5h 23m" or minutes"""
+        self.id = id
+        self.airline = sys.intern(airline)
+        self.flight_number = flight_number
+        self.departure_airport = sys.intern(departure_airport)
+        self.arrival_airport = sys.intern(arrival_airport)
+        self.departure_ts = departure_time if isinstance(departure_time, int) else parse_timestamp(departure_time)
+        self.arrival_ts = arrival_time if isinstance(arrival_time, int) else parse_timestamp(arrival_time)
+        self.duration_minutes = duration if isinstance(duration, int) else parse_duration(duration)
+        self.price = price
+        self.available_seats = available_seats
+        self.aircraft_type = sys.intern(aircraft_type)
+        self.summary_json = None
+        self.details_json = None
+
+    @property
+    def departure_time(self) -> str:
+        return format_timestamp(self.departure_ts)
+
+    @property
+    def arrival_time(self) -> str:
+        return format_timestamp(self.arrival_ts)
 
-@dataclass
+    @property
+    def duration(self) -> str:
+        return f"{self.duration_minutes // 60}h {self.duration_minutes % 60}m"
+
+@dataclass(slots=True)
 class Booking:
     id: str
     flight_id: str
@@ -42,6 +139,30 @@ class Booking:
     status: str
     total_price: float
 
+@dataclass(slots=True)
+class SeatHold:
+    id: str
+    flight_id: str
+    booking_ids: List[str]
+    expires_at: str
+    # time.monotonic() deadline
+    deadline: float = field(repr=False)
+
+@dataclass(slots=True)
+class WaitlistEntry:
+    id: str
+    flight_id: str
+    passenger_name: str
+    passenger_email: str
+    seat_preference: str
+    priority: int
+    # Join order, breaking ties between equal priorities
+    order: int
+    joined_at: str
+    # "waiting", "promoting", "booked" or "left"
+    status: str = "waiting"
+    booking_id: Optional[str] = None
+
 # Sample data
 AIRPORTS = [
     {"code": "JFK", "name": "John F. Kennedy International Airport", "city": "New York", "country": "USA"},
@@ -60,45 +181,1064 @@ AIRLINES = [
     "Japan Airlines", "Qantas", "Turkish Airlines"
 ]
 
+# Version and timestamp of the reference data above. Call
+# reference_data_changed() after editing AIRPORTS or AIRLINES so cached
+# serializations of them are rebuilt.
+reference_data_version = 1
+reference_data_updated = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+def reference_data_changed():
+    """Mark AIRPORTS / AIRLINES as edited"""
+    global reference_data_version, reference_data_updated
+    reference_data_version += 1
+    reference_data_updated = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
 # In-memory storage
 flights_db: List[Flight] = []
 bookings_db: List[Booking] = []
 
-def generate_sample_flights():
-    """Generate sample flight data"""
-    global flights_db
-    if flights_db:
-        return
+# Primary-key lookup tables, kept in sync with flights_db / bookings_db
+flights_by_id: Dict[str, Flight] = {}
+bookings_by_id: Dict[str, Booking] = {}
+
+# Secondary index: normalized passenger email -> that passenger's bookings,
+# kept sorted by (booking_date, id), the order the store returns them in
+bookings_by_email: Dict[str, List[Booking]] = {}
+BOOKING_STATUSES = ("confirmed", "held", "cancelled")
+MAX_BOOKINGS_PAGE = 100
+
+# Search index: (departure_airport, arrival_airport, departure day) -> flights
+# that still have seats, kept sorted by (price, id)
+route_index: Dict[Tuple[str, str, str], List[Flight]] = {}
+
+# Departure-time index: (departure_airport, arrival_airport) -> every flight on
+# the route, kept sorted by (departure_ts, id) for flexible-date windows
+departure_index: Dict[Tuple[str, str], List[Flight]] = {}
+
+# Per-airport departure lists, sorted the same way, for connecting itineraries
+airport_departures: Dict[str, List[Flight]] = {}
+
+# Upper bound on max_stops accepted by search_itineraries
+MAX_ITINERARY_STOPS = 3
+
+# Widest flex_days accepted by the searches, either side of the date
+MAX_FLEX_DAYS = 30
+
+# A return flight must leave at least this long after the outbound lands
+MIN_TURNAROUND_MINUTES = 60
+
+# search_flights_batch: most queries per call, and the fields a query may set
+MAX_BATCH_QUERIES = 50
+SEARCH_QUERY_FIELDS = (
+    "departure_airport", "arrival_airport", "departure_date", "passengers", "return_date",
+    "max_price", "limit", "cursor", "flex_days", "departure_after", "departure_before",
+)
+REQUIRED_QUERY_FIELDS = ("departure_airport", "arrival_airport", "departure_date")
+
+# Optional columnar backend (FLIGHT_INVENTORY_BACKEND=columnar). When enabled it
+# owns the inventory; flights_by_id then only caches materialized flights.
+INVENTORY_BACKEND = os.environ.get("FLIGHT_INVENTORY_BACKEND", "objects")
+
+# Sample inventory size and seed; set the seed to make runs reproducible
+INVENTORY_SIZE = int(os.environ.get("FLIGHT_INVENTORY_SIZE", "50"))
+INVENTORY_SEED = os.environ.get("FLIGHT_INVENTORY_SEED")
+
+# Optional persistent store (FLIGHT_DB_PATH=flights.db). When set, seat counts
+# and bookings live in SQLite and every server process shares them.
+DB_PATH = os.environ.get("FLIGHT_DB_PATH")
+
+# Optional write-ahead journal (FLIGHT_JOURNAL_PATH=bookings.journal) for a
+# single server process: bookings survive a crash without a database. Writes
+# arriving within FLIGHT_JOURNAL_SYNC_MS share one fsync.
+JOURNAL_PATH = os.environ.get("FLIGHT_JOURNAL_PATH")
+JOURNAL_SYNC_MS = float(os.environ.get("FLIGHT_JOURNAL_SYNC_MS", "2"))
+
+store: Optional[FlightStore] = None
+if DB_PATH:
+    store = SQLiteStore(DB_PATH)
+elif JOURNAL_PATH:
+    store = JournalStore(JOURNAL_PATH, sync_interval=JOURNAL_SYNC_MS / 1000)
+
+# Optional inventory snapshot (FLIGHT_SNAPSHOT_PATH=flights.snap). The first
+# process writes it; every later one maps it instead of building the inventory.
+SNAPSHOT_PATH = os.environ.get("FLIGHT_SNAPSHOT_PATH")
+columnar_inventory: Optional["ColumnarInventory"] = None
+
+# Exempt the loaded inventory from garbage collection (FLIGHT_GC_FREEZE=0 to
+# keep it collectable). Full collections otherwise rescan every flight.
+GC_FREEZE = os.environ.get("FLIGHT_GC_FREEZE", "1") != "0"
+
+# Seat changes on a flight are serialized by its lock stripe; flights on
+# different stripes are booked in parallel
+SEAT_LOCK_STRIPES = 1024
+seat_locks = StripedLocks(SEAT_LOCK_STRIPES)
+
+# Version per (departure_airport, arrival_airport), bumped whenever seats on
+# the route change. Values come from one global counter so they never repeat.
+route_versions: Dict[Tuple[str, str], int] = {}
+_version_counter = itertools.count(1)
+
+# search_flights responses, valid only while their routes keep the same version
+SEARCH_CACHE_MAX_ENTRIES = 4096
+SEARCH_CACHE_MAX_BYTES = 64 * 1024 * 1024
+SEARCH_CACHE_TTL_SECONDS = 30.0
+search_cache = SearchCache(SEARCH_CACHE_MAX_ENTRIES, SEARCH_CACHE_MAX_BYTES, SEARCH_CACHE_TTL_SECONDS)
+# Bytes counted for a response's criteria and for each round-trip wrapper,
+# on top of the flight summaries inside them
+SEARCH_RESPONSE_OVERHEAD = 512
+ROUND_TRIP_OVERHEAD = 64
+
+# Bitset seat maps, built the first time a flight's seats are touched
+seat_maps = SeatMaps()
+
+# Largest party book_group accepts in one reservation
+MAX_GROUP_SIZE = 9
+
+# How often a booking picks another seat after losing one to another process
+SEAT_CONFLICT_RETRIES = 5
+
+# Booking ids only ever increase. With a store, blocks of ids are reserved
+# there so processes sharing it never hand out the same id.
+booking_ids = IdAllocator(
+    "BK", reserve=(lambda count, minimum: store.reserve_ids("booking", count, minimum)) if store else None
+)
+
+# Results of book_flight, book_group and cancel_booking calls made with an
+# idempotency key, so retried or hedged duplicates never book twice
+IDEMPOTENCY_MAX_KEYS = 100_000
+IDEMPOTENCY_TTL_SECONDS = 24 * 3600
+idempotency_keys = IdempotencyStore(IDEMPOTENCY_MAX_KEYS, IDEMPOTENCY_TTL_SECONDS)
+
+# Booking analytics, updated as bookings change status so get_stats never
+# scans bookings_db. Load factors come from seat counts: per flight straight
+# from the record, per airline from totals counted once per loaded inventory
+# and kept current by _update_available_seats (None until first needed).
+booking_stats = BookingStats()
+MAX_STATS_ROUTES = 100
+airline_seats: Optional[Dict[str, List[int]]] = None
+
+# Per-flight waitlists: heaps of (-priority, join order, entry id). A seat
+# freed by a cancellation or an expired hold books the head directly, and
+# waitlist_status callers wait on a future until then instead of polling.
+# Booked and left entries are forgotten WAITLIST_RESULT_TTL_SECONDS after
+# they finish; finished_waitlist holds their expiry times, oldest first.
+MAX_WAITLIST_WAIT_SECONDS = 300
+WAITLIST_RESULT_TTL_SECONDS = 3600
+waitlists: Dict[str, List[Tuple[int, int, str]]] = {}
+waitlist_entries: Dict[str, WaitlistEntry] = {}
+finished_waitlist: "OrderedDict[str, float]" = OrderedDict()
+waitlist_waiters: Dict[str, List[asyncio.Future]] = {}
+_waitlist_order = itertools.count()
+waitlist_ids = IdAllocator(
+    "WL", reserve=(lambda count, minimum: store.reserve_ids("waitlist", count, minimum)) if store else None
+)
+
+# Seat holds: seats taken by "held" bookings until confirm_hold turns them
+# into confirmed ones or the hold expires. One task per event loop expires
+# them from a timer wheel whose ring spans the longest hold.
+DEFAULT_HOLD_SECONDS = 300
+MAX_HOLD_SECONDS = 1800
+HOLD_TICK_SECONDS = 1.0
+seat_holds: Dict[str, "SeatHold"] = {}
+hold_timers = TimerWheel(HOLD_TICK_SECONDS, slots=2048)
+hold_reaper: Optional[asyncio.Task] = None
+hold_ids = IdAllocator(
+    "HD", reserve=(lambda count, minimum: store.reserve_ids("hold", count, minimum)) if store else None
+)
+
+def _route_key(flight: Flight) -> Tuple[str, str, str]:
+    """Index key for a flight: route plus YYYY-MM-DD departure day"""
+    return (flight.departure_airport, flight.arrival_airport, flight.departure_time[:10])
+
+def _price_key(flight: Flight) -> Tuple[float, str]:
+    """Sort key inside a route bucket"""
+    return (flight.price, flight.id)
+
+def _departure_key(flight: Flight) -> Tuple[int, str]:
+    """Sort key inside a route's departure timeline"""
+    return (flight.departure_ts, flight.id)
+
+def _timeline_slice(timeline: List[Flight], start_ts: int, end_ts: int) -> Iterable[Flight]:
+    """Flights of a departure-sorted timeline departing in [start_ts, end_ts)"""
+    lo = bisect.bisect_left(timeline, (start_ts, ""), key=_departure_key)
+    hi = bisect.bisect_left(timeline, (end_ts, ""), key=_departure_key)
+    return (timeline[i] for i in range(lo, hi))
+
+def _departures_between(
+    departure_airport: str,
+    arrival_airport: str,
+    start_ts: int,
+    end_ts: int
+) -> Iterable[Flight]:
+    """Flights on a route departing in [start_ts, end_ts), found by bisection"""
+    return _timeline_slice(departure_index.get((departure_airport, arrival_airport), []), start_ts, end_ts)
+
+def _leg_departures(
+    departure_airport: str,
+    start_ts: int,
+    end_ts: int,
+    arrival_airport: Optional[str] = None,
+    min_seats: int = 1,
+    max_price: Optional[float] = None,
+    max_arrival: Optional[int] = None,
+    order_by: str = "price"
+) -> Iterable[Any]:
+    """Departures for the itinerary search, from whichever backend holds the inventory"""
+    if columnar_inventory is not None:
+        return columnar_inventory.departures(
+            departure_airport, start_ts, end_ts, arrival_airport, min_seats, max_price, max_arrival, order_by
+        )
+    if arrival_airport is not None:
+        candidates = _departures_between(departure_airport, arrival_airport, start_ts, end_ts)
+    else:
+        candidates = _timeline_slice(airport_departures.get(departure_airport, []), start_ts, end_ts)
+    return sorted(
+        (f for f in candidates
+         if f.available_seats >= min_seats
+         and (max_price is None or f.price <= max_price)
+         and (max_arrival is None or f.arrival_ts <= max_arrival)),
+        key=(lambda f: f.price) if order_by == "price" else (lambda f: f.arrival_ts)
+    )
+
+def _select_cheapest(
+    candidates: Iterable[Flight],
+    limit: int,
+    after: Optional[Tuple[float, str]] = None
+) -> Tuple[List[Flight], int, bool]:
+    """Keep the `limit` cheapest candidates in a bounded heap and count the rest.
+
+    Only candidates whose (price, id) sorts after `after` are eligible for the
+    page. Returns (page, total matches, whether more eligible matches remain).
+    """
+    count = 0
+    eligible = 0
     
-    base_date = datetime.now() + timedelta(days=1)
+    def counted():
+        nonlocal count, eligible
+        for flight in candidates:
+            count += 1
+            if after is None or _price_key(flight) > after:
+                eligible += 1
+                yield flight
     
-    for i in range(50):
-        departure_airport = random.choice(AIRPORTS)
-        arrival_airport = random.choice([ap for ap in AIRPORTS if ap["code"] != departure_airport["code"]])
-        
-        departure_time = base_date + timedelta(
-            days=random.randint(0, 30),
-            hours=random.randint(6, 22),
-            minutes=random.choice([0, 15, 30, 45])
-        )
-        
-        duration_hours = random.randint(1, 12)
-        arrival_time = departure_time + timedelta(hours=duration_hours)
-        
-        flight = Flight(
-            id=f"FL{i+1:03d}",
-            airline=random.choice(AIRLINES),
-            flight_number=f"{random.choice(['AA', 'DL', 'UA', 'BA', 'AF'])}{random.randint(100, 9999)}",
-            departure_airport=departure_airport["code"],
-            arrival_airport=arrival_airport["code"],
-            departure_time=departure_time.strftime("%Y-%m-%d %H:%M"),
-            arrival_time=arrival_time.strftime("%Y-%m-%d %H:%M"),
-            duration=f"{duration_hours}h {random.randint(0, 59)}m",
-            price=round(random.uniform(200, 2000), 2),
-            available_seats=random.randint(5, 200),
-            aircraft_type=random.choice(["Boeing 737", "Airbus A320", "Boeing 777", "Airbus A350"])
+    if limit > 0:
+        top = heapq.nsmallest(limit, counted(), key=_price_key)
+    else:
+        top = []
+        for _ in counted():
+            pass
+    return top, count, eligible > len(top)
+
+def _flight_summary(flight: Flight) -> Fragment:
+    """Search-result view of a flight.
+
+    Only available_seats changes after a flight is created, so the fields
+    and JSON around it are built once and the seat count spliced in.
+    """
+    if flight.summary_json is None:
+        static = {
+            "id": flight.id,
+            "airline": flight.airline,
+            "flight_number": flight.flight_number,
+            "departure_airport": flight.departure_airport,
+            "arrival_airport": flight.arrival_airport,
+            "departure_time": flight.departure_time,
+            "arrival_time": flight.arrival_time,
+            "duration": flight.duration,
+            "price": flight.price,
+            "available_seats": 0,
+            "aircraft_type": flight.aircraft_type
+        }
+        head, _, tail = dumps_json(static).partition('"available_seats":0')
+        flight.summary_json = (static, head + '"available_seats":', tail)
+    static, head, tail = flight.summary_json
+    seats = int(flight.available_seats)
+    summary = Fragment(static, f"{head}{seats}{tail}")
+    summary["available_seats"] = seats
+    return summary
+
+def _flight_details(flight: Flight) -> Fragment:
+    """Booking view of a flight: static fields only, so the whole fragment is cached"""
+    if flight.details_json is None:
+        flight.details_json = fragment({
+            "id": flight.id,
+            "airline": flight.airline,
+            "flight_number": flight.flight_number,
+            "departure_airport": flight.departure_airport,
+            "arrival_airport": flight.arrival_airport,
+            "departure_time": flight.departure_time,
+            "arrival_time": flight.arrival_time,
+            "duration": flight.duration,
+            "aircraft_type": flight.aircraft_type
+        })
+    return flight.details_json
+
+def _format_minutes(minutes: int) -> str:
+    """Format a duration the same way Flight.duration does"""
+    return f"{minutes // 60}h {minutes % 60}m"
+
+def _leg_flight(leg: Any) -> Flight:
+    """Resolve a search leg (a Flight, or a columnar row view) to a Flight"""
+    return leg if isinstance(leg, Flight) else columnar_inventory.flight_at(leg.row)
+
+def _itinerary_summary(path: List[Any]) -> Dict[str, Any]:
+    """Response view of one itinerary found by itinerary_search"""
+    legs = [_leg_flight(leg) for leg in path]
+    return {
+        "stops": len(legs) - 1,
+        "total_price": round(sum(leg.price for leg in legs), 2),
+        "total_duration": _format_minutes((legs[-1].arrival_ts - legs[0].departure_ts) // 60),
+        "departure_time": legs[0].departure_time,
+        "arrival_time": legs[-1].arrival_time,
+        "layovers": [
+            {"airport": inbound.arrival_airport, "minutes": (outbound.departure_ts - inbound.arrival_ts) // 60}
+            for inbound, outbound in zip(legs, legs[1:])
+        ],
+        "flights": [_flight_summary(leg) for leg in legs]
+    }
+
+def _flights_by_price(
+    departure_airport: str,
+    arrival_airport: str,
+    day: str,
+    passengers: int,
+    max_price: Optional[float],
+    flex_days: int = 0
+) -> List[Any]:
+    """Every flight on a route within ±flex_days of a day with enough seats, cheapest first"""
+    window = _search_window(day, flex_days)
+    if columnar_inventory is not None:
+        rows, _, _ = columnar_inventory.search(
+            departure_airport, arrival_airport, *window, passengers, max_price
         )
+        return columnar_inventory.legs(rows)
+    if flex_days == 0:
+        bucket = route_index.get((departure_airport, arrival_airport, day), ())
+        return [
+            f for f in bucket
+            if f.available_seats >= passengers and (max_price is None or f.price <= max_price)
+        ]
+    return sorted(
+        (f for f in _departures_between(departure_airport, arrival_airport, *window)
+         if f.available_seats >= passengers and (max_price is None or f.price <= max_price)),
+        key=_price_key
+    )
+
+def _first_departing(latest: List[int], node: int, lo: int, hi: int, start: int, earliest: int) -> Optional[int]:
+    """Lowest position >= start in [lo, hi) leaving at or after `earliest`, found in the max-tree `latest`"""
+    if hi <= start or latest[node] < earliest:
+        return None
+    if hi - lo == 1:
+        return lo
+    mid = (lo + hi) // 2
+    found = _first_departing(latest, 2 * node, lo, mid, start, earliest)
+    if found is None:
+        found = _first_departing(latest, 2 * node + 1, mid, hi, start, earliest)
+    return found
+
+def _cheapest_round_trips(
+    outbound: List[Any],
+    inbound: List[Any],
+    limit: int,
+    turnaround: int
+) -> Tuple[List[Tuple[Any, Any]], int]:
+    """The `limit` cheapest valid (outbound, inbound) pairs plus the number of valid pairs.
+
+    A pair is valid when the inbound flight leaves at least `turnaround`
+    seconds after the outbound lands. Both lists are sorted by price, so
+    each outbound flight's valid pairs, taken in inbound order, get dearer;
+    a heap merges those streams in total-price order. A max-tree over the
+    inbound departures jumps straight to an outbound flight's next valid
+    inbound flight, so invalid pairs are never visited.
+    """
+    inbound_departures = sorted(f.departure_ts for f in inbound)
+    valid_count = sum(
+        len(inbound_departures) - bisect.bisect_left(inbound_departures, f.arrival_ts + turnaround)
+        for f in outbound
+    )
+    pairs = []
+    if valid_count == 0 or limit <= 0:
+        return pairs, valid_count
+    
+    # Leaves hold inbound departures in price order; each node the latest below it
+    size = 1 << (len(inbound) - 1).bit_length()
+    latest = [-1] * size + [f.departure_ts for f in inbound] + [-1] * (size - len(inbound))
+    for node in range(size - 1, 0, -1):
+        latest[node] = max(latest[2 * node], latest[2 * node + 1])
+    
+    def next_valid(i: int, start: int) -> Optional[int]:
+        return _first_departing(latest, 1, 0, size, start, outbound[i].arrival_ts + turnaround)
+    
+    frontier = []
+    for i, flight in enumerate(outbound):
+        j = next_valid(i, 0)
+        if j is not None:
+            frontier.append((flight.price + inbound[j].price, i, j))
+    heapq.heapify(frontier)
+    while frontier and len(pairs) < limit:
+        _, i, j = heapq.heappop(frontier)
+        pairs.append((outbound[i], inbound[j]))
+        j = next_valid(i, j + 1)
+        if j is not None:
+            heapq.heappush(frontier, (outbound[i].price + inbound[j].price, i, j))
+    return pairs, valid_count
+
+def encode_cursor(flight: Flight) -> str:
+    """Opaque pagination cursor pointing just past a flight"""
+    return base64.urlsafe_b64encode(json.dumps([flight.price, flight.id]).encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    """Decode a cursor into the (price, id) key it points past"""
+    try:
+        price, flight_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return (float(price), str(flight_id))
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+def encode_booking_cursor(booking: Booking) -> str:
+    """Opaque pagination cursor pointing just past a booking"""
+    return base64.urlsafe_b64encode(json.dumps(_booking_key(booking)).encode()).decode()
+
+def decode_booking_cursor(cursor: str) -> Tuple[str, str]:
+    """Decode a cursor into the (booking_date, id) key it points past"""
+    try:
+        booking_date, booking_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return (str(booking_date), str(booking_id))
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+def _bump_route(departure_airport: str, arrival_airport: str):
+    """Invalidate cached searches on a route"""
+    route_versions[(departure_airport, arrival_airport)] = next(_version_counter)
+
+def _index_flight(flight: Flight):
+    """Insert a flight into its route bucket if it has seats left"""
+    if flight.available_seats <= 0:
+        return
+    bucket = route_index.setdefault(_route_key(flight), [])
+    bisect.insort(bucket, flight, key=_price_key)
+
+def _unindex_flight(flight: Flight):
+    """Remove a flight from its route bucket"""
+    key = _route_key(flight)
+    bucket = route_index.get(key)
+    if not bucket:
+        return
+    i = bisect.bisect_left(bucket, _price_key(flight), key=_price_key)
+    if i < len(bucket) and bucket[i] is flight:
+        del bucket[i]
+        if not bucket:
+            del route_index[key]
+
+def add_flights(flights: Iterable[Flight]):
+    """Bulk-load flights, sorting each touched index list once instead of per insert"""
+    global airline_seats
+    airline_seats = None
+    touched_buckets, touched_routes, touched_airports = set(), set(), set()
+    for flight in flights:
         flights_db.append(flight)
+        flights_by_id[flight.id] = flight
+        if flight.available_seats > 0:
+            key = _route_key(flight)
+            route_index.setdefault(key, []).append(flight)
+            touched_buckets.add(key)
+        route = (flight.departure_airport, flight.arrival_airport)
+        departure_index.setdefault(route, []).append(flight)
+        touched_routes.add(route)
+        airport_departures.setdefault(flight.departure_airport, []).append(flight)
+        touched_airports.add(flight.departure_airport)
+    
+    for key in touched_buckets:
+        route_index[key].sort(key=_price_key)
+    for route in touched_routes:
+        departure_index[route].sort(key=_departure_key)
+        _bump_route(*route)
+    for airport in touched_airports:
+        airport_departures[airport].sort(key=_departure_key)
+
+def add_booking(booking: Booking):
+    """Record a booking and make it addressable by id"""
+    bookings_db.append(booking)
+    bookings_by_id[booking.id] = booking
+    bisect.insort(
+        bookings_by_email.setdefault(normalize_email(booking.passenger_email), []), booking, key=_booking_key
+    )
+    booking_ids.observe(booking.id)
+    if booking.status in ("confirmed", "held"):
+        flight = get_flight(booking.flight_id)
+        if flight:
+            seat_maps.claim(flight, booking.seat_number)
+
+def _booking_key(booking: Booking) -> Tuple[str, str]:
+    return (booking.booking_date, booking.id)
+
+def get_flight(flight_id: str) -> Optional[Flight]:
+    """Look up a flight by id in whichever backend holds the inventory"""
+    flight = flights_by_id.get(flight_id)
+    if flight is None and columnar_inventory is not None:
+        flight = columnar_inventory.get(flight_id)
+        if flight is not None:
+            # Cache it so every write lands on the same object
+            flights_by_id[flight_id] = flight
+    return flight
+
+def inventory_size() -> int:
+    """Number of flights in the active backend"""
+    return len(columnar_inventory) if columnar_inventory is not None else len(flights_db)
+
+def sample_inventory(count: int) -> List[Flight]:
+    """First few flights of the active backend"""
+    if columnar_inventory is not None:
+        return [columnar_inventory.flight_at(row) for row in range(min(count, len(columnar_inventory)))]
+    return flights_db[:count]
+
+def iter_inventory() -> Iterable[Flight]:
+    """Every flight of the active backend"""
+    if columnar_inventory is not None:
+        return (columnar_inventory.flight_at(row) for row in range(len(columnar_inventory)))
+    return iter(flights_db)
+
+def _reset_inventory():
+    """Drop the loaded inventory and every index built on it"""
+    global columnar_inventory, airline_seats
+    columnar_inventory = None
+    airline_seats = None
+    flights_db.clear()
+    flights_by_id.clear()
+    route_index.clear()
+    departure_index.clear()
+    airport_departures.clear()
+    search_cache.clear()
+    # Let the collector see the old inventory again so it can be freed
+    gc.unfreeze()
+
+def _update_available_seats(flight: Flight, delta: int):
+    """Change a flight's seat count, keeping the route index and search cache in sync.
+
+    Sold-out flights drop out of their bucket and come back when a
+    cancellation frees a seat, so searches never walk full flights.
+    """
+    was_listed = flight.available_seats > 0
+    flight.available_seats += delta
+    if airline_seats is not None:
+        airline_seats[flight.airline][1] += delta
+    _bump_route(flight.departure_airport, flight.arrival_airport)
+    if columnar_inventory is not None:
+        columnar_inventory.set_seats(flight.id, flight.available_seats)
+        return
+    if was_listed and flight.available_seats <= 0:
+        _unindex_flight(flight)
+    elif not was_listed and flight.available_seats > 0:
+        _index_flight(flight)
+
+def _set_available_seats(flight: Flight, seats: int):
+    """Adopt a seat count reported by the store"""
+    if seats != flight.available_seats:
+        _update_available_seats(flight, seats - flight.available_seats)
+    # Other processes may have sold or freed seats this one never saw
+    seat_maps.sync(flight)
+
+async def reserve_seats(flight: Flight, bookings: List[Booking], seat_preference: str = "any") -> Optional[str]:
+    """Atomically assign seats, take them and record the bookings, all or none.
+
+    A single booking gets a seat matching seat_preference; a group gets
+    adjacent seats where possible. Returns an error message, or None once
+    every booking is recorded with its status ("confirmed" or "held").
+    Holding the flight's lock across the store round-trip also keeps seat
+    counts reported by the store from being applied out of order.
+    """
+    count = len(bookings)
+    specific_seat = count == 1 and (seat_preference or "any").strip().lower() not in ("any",) + SEAT_CLASSES
+    seat_taken = f"Seat {seat_preference} is not available on flight {flight.id}"
+    refreshed = False
+    async with seat_locks.hold(flight.id):
+        for _ in range(SEAT_CONFLICT_RETRIES):
+            if store is None and flight.available_seats < count:
+                break
+            if count == 1:
+                seat = seat_maps.allocate(flight, seat_preference)
+                seats = [seat] if seat else None
+            else:
+                seats = seat_maps.allocate_block(flight, count)
+            if seats is None:
+                if store is not None and not refreshed:
+                    # Other processes may have freed seats this map still counts as
+                    # taken; after a refresh the map frees exactly what the store does
+                    await _refresh_seat_map(flight)
+                    refreshed = True
+                    continue
+                if specific_seat:
+                    return seat_taken
+                break
+            for booking, seat in zip(bookings, seats):
+                booking.seat_number = seat
+            if store is None:
+                _update_available_seats(flight, -count)
+            else:
+                try:
+                    seats_left = await store.book(bookings)
+                except SeatUnavailable:
+                    # Another process sold one of these seats; learn which and pick again
+                    await _refresh_seat_map(flight)
+                    refreshed = True
+                    if specific_seat:
+                        return seat_taken
+                    continue
+                if seats_left is None:
+                    # The store refused: the flight really has too few seats left
+                    await _refresh_seat_map(flight)
+                    break
+                _set_available_seats(flight, seats_left)
+            for booking in bookings:
+                add_booking(booking)
+                _count_status(booking, None)
+            return None
+    if count == 1:
+        return f"Flight {flight.id} is fully booked"
+    return f"Flight {flight.id} has fewer than {count} seats left"
+
+async def _refresh_seat_map(flight: Flight):
+    """Re-read a flight's taken seats and seat count from the store; caller holds its lock"""
+    taken = await store.taken_seats(flight.id)
+    seats_left = await store.available_seats(flight.id)
+    seat_maps.reload(flight, taken)
+    if seats_left is not None:
+        _set_available_seats(flight, seats_left)
+    else:
+        seat_maps.sync(flight)
+
+async def release_seats(booking: Booking, held_only: bool = False) -> bool:
+    """Atomically cancel a booking and free its seat; False if already cancelled.
+
+    With held_only, only a booking that is still held is cancelled, so an
+    expiring hold never undoes a confirmation made by another process.
+    The freed seat goes to the head of the flight's waitlist, if any.
+    """
+    async with seat_locks.hold(booking.flight_id):
+        if booking.status == "cancelled" or (held_only and booking.status != "held"):
+            return False
+        flight = get_flight(booking.flight_id)
+        if store is None:
+            seats_left = None
+        elif held_only:
+            seats_left = await store.expire_hold(booking.id, booking.flight_id)
+        else:
+            seats_left = await store.cancel(booking.id, booking.flight_id)
+        # With a store, None means another process confirmed or cancelled it first
+        if store is not None and seats_left is None:
+            row = await store.get_booking(booking.id) if held_only else None
+            if row is not None:
+                _merge_stored_booking(row)
+            else:
+                booking.status = "cancelled"
+            if flight:
+                # Its seat may already be sold again over there
+                await _refresh_seat_map(flight)
+            return False
+        previous, booking.status = booking.status, "cancelled"
+        if flight:
+            seat_maps.release(flight, booking.seat_number)
+            if store is None:
+                _update_available_seats(flight, 1)
+            else:
+                _set_available_seats(flight, seats_left)
+        _count_status(booking, previous)
+    if waitlists.get(booking.flight_id):
+        await _promote_waitlist(booking.flight_id)
+    return True
+
+def _register_hold(hold_id: str, flight_id: str, booking_ids: List[str], seconds: float) -> SeatHold:
+    """Track held bookings and schedule their expiry"""
+    hold = SeatHold(
+        id=hold_id,
+        flight_id=flight_id,
+        booking_ids=booking_ids,
+        expires_at=(datetime.now() + timedelta(seconds=seconds)).strftime("%Y-%m-%d %H:%M:%S"),
+        deadline=time.monotonic() + seconds
+    )
+    seat_holds[hold.id] = hold
+    hold_timers.schedule(hold.id, hold.deadline)
+    return hold
+
+def _take_hold(hold_id: str) -> Optional[SeatHold]:
+    """Remove a hold from tracking; whoever takes it decides its bookings' fate"""
+    hold = seat_holds.pop(hold_id, None)
+    if hold is not None:
+        hold_timers.cancel(hold_id)
+    return hold
+
+async def _release_hold(hold: SeatHold):
+    """Give the seats of a taken hold back to the flight"""
+    for booking_id in hold.booking_ids:
+        booking = bookings_by_id.get(booking_id)
+        if booking is not None and booking.status == "held":
+            await release_seats(booking, held_only=True)
+
+async def _reap_holds():
+    """Expire holds as their deadlines pass; exits once no hold is left"""
+    while seat_holds:
+        await asyncio.sleep(HOLD_TICK_SECONDS)
+        for hold_id in hold_timers.advance(time.monotonic()):
+            hold = _take_hold(hold_id)
+            if hold is not None:
+                await _release_hold(hold)
+
+def _ensure_hold_reaper():
+    """Run the expiry task in the current event loop while there are holds"""
+    global hold_reaper
+    if not seat_holds:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return  # not in a tool call; the next one starts it
+    if hold_reaper is None or hold_reaper.done() or hold_reaper.get_loop() is not loop:
+        hold_reaper = loop.create_task(_reap_holds())
+
+def _adopt_stored_holds():
+    """Expire held bookings found in the store whose hold died with its process.
+
+    Their deadline is unknown, so they get the longest one: a live hold in
+    another process has expired or been confirmed by then.
+    """
+    held = {}
+    for booking in bookings_db:
+        if booking.status == "held":
+            held.setdefault(booking.flight_id, []).append(booking.id)
+    for flight_id, held_ids in held.items():
+        # No client knows this hold, so it is named after its first booking
+        _register_hold(f"{hold_ids.prefix}-{held_ids[0]}", flight_id, held_ids, MAX_HOLD_SECONDS)
+
+def _waitlist_view(entry: WaitlistEntry) -> Dict[str, Any]:
+    """Response view of a waitlist entry"""
+    view = {
+        "entry_id": entry.id,
+        "flight_id": entry.flight_id,
+        "passenger_name": entry.passenger_name,
+        "priority": entry.priority,
+        "joined_at": entry.joined_at,
+        "status": entry.status
+    }
+    if entry.status == "waiting":
+        key = _waitlist_key(entry)
+        view["position"] = 1 + sum(
+            1 for item in waitlists.get(entry.flight_id, ())
+            if item < key and waitlist_entries[item[2]].status == "waiting"
+        )
+    elif entry.booking_id:
+        booking = bookings_by_id[entry.booking_id]
+        view["booking"] = _booking_summary(booking, get_flight(booking.flight_id))
+    return view
+
+def _waitlist_key(entry: WaitlistEntry) -> Tuple[int, int, str]:
+    """Heap key: higher priority first, then first come first served"""
+    return (-entry.priority, entry.order, entry.id)
+
+def _notify_waiters(entry_id: str):
+    for waiter in waitlist_waiters.pop(entry_id, ()):
+        if not waiter.done():
+            waiter.set_result(None)
+
+def _finish_waitlist_entry(entry: WaitlistEntry, status: str):
+    """Take an entry out of the running, keeping its result for a while"""
+    entry.status = status
+    finished_waitlist[entry.id] = time.monotonic() + WAITLIST_RESULT_TTL_SECONDS
+    _notify_waiters(entry.id)
+
+def _expire_waitlist_entries():
+    """Forget finished entries whose result has been kept long enough"""
+    now = time.monotonic()
+    while finished_waitlist:
+        entry_id, expires_at = next(iter(finished_waitlist.items()))
+        if expires_at > now:
+            break
+        del finished_waitlist[entry_id]
+        waitlist_entries.pop(entry_id, None)
+
+async def _promote_waitlist(flight_id: str):
+    """Book free seats on a flight for the front of its waitlist"""
+    _expire_waitlist_entries()
+    queue = waitlists.get(flight_id)
+    flight = get_flight(flight_id)
+    while queue and flight is not None:
+        # With a store only reserve_seats knows whether a seat is free
+        if store is None and flight.available_seats <= 0:
+            break
+        item = heapq.heappop(queue)
+        entry = waitlist_entries[item[2]]
+        if entry.status != "waiting":
+            continue
+        # Off the queue while booking, so joins and leaves cannot disturb it
+        entry.status = "promoting"
+        booking = Booking(
+            id=await booking_ids.next_id(),
+            flight_id=flight_id,
+            passenger_name=entry.passenger_name,
+            passenger_email=entry.passenger_email,
+            seat_number="",
+            booking_date=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            status="confirmed",
+            total_price=flight.price
+        )
+        if await reserve_seats(flight, [booking], entry.seat_preference):
+            entry.status = "waiting"
+            heapq.heappush(queue, item)
+            break
+        entry.booking_id = booking.id
+        _finish_waitlist_entry(entry, "booked")
+    if not queue:
+        waitlists.pop(flight_id, None)
+
+def enable_columnar_inventory():
+    """Move the loaded flights into the columnar backend"""
+    global columnar_inventory
+    if ColumnarInventory is None:
+        raise RuntimeError("The columnar inventory backend requires numpy")
+    inventory = ColumnarInventory.from_flights(flights_db, Flight)
+    _reset_inventory()
+    columnar_inventory = inventory
+
+def _is_date(value: str) -> bool:
+    """Whether a string is a valid YYYY-MM-DD date"""
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return False
+    return True
+
+def _search_window(
+    departure_date: str,
+    flex_days: int = 0,
+    departure_after: str = None,
+    departure_before: str = None
+) -> Tuple[int, int]:
+    """Departure window [start, end) in epoch seconds.
+
+    Defaults to the departure date widened by ±flex_days; explicit
+    departure_after / departure_before bounds replace either end.
+    """
+    try:
+        day = datetime.strptime(departure_date, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid departure_date {departure_date!r}, expected YYYY-MM-DD")
+    if not 0 <= flex_days <= MAX_FLEX_DAYS:
+        raise ValueError(f"flex_days must be between 0 and {MAX_FLEX_DAYS}")
+    try:
+        start_ts = int((day - timedelta(days=flex_days)).timestamp())
+        end_ts = int((day + timedelta(days=flex_days + 1)).timestamp())
+    except OverflowError:
+        # Windows reaching past year 1 or 9999
+        raise ValueError(f"departure_date {departure_date!r} with flex_days {flex_days} is out of range")
+    try:
+        if departure_after:
+            start_ts = parse_timestamp(departure_after)
+        if departure_before:
+            end_ts = parse_timestamp(departure_before)
+    except (ValueError, OverflowError):
+        raise ValueError("departure_after/departure_before must be YYYY-MM-DD or YYYY-MM-DD HH:MM")
+    return start_ts, end_ts
+
+def load_generated_inventory(count: int, seed: int = 0, **options):
+    """Generate `count` synthetic flights and stream them into the active backend.
+
+    Replaces the loaded inventory. Extra options (start_date, days,
+    route_skew, route_weights, weekday_weights, batch_size) are passed to
+    inventory_generator.
+    """
+    global columnar_inventory
+    airport_codes = [ap["code"] for ap in AIRPORTS]
+    if INVENTORY_BACKEND == "columnar":
+        if ColumnarInventory is None:
+            raise RuntimeError("The columnar inventory backend requires numpy")
+        # Vectorized batches go straight into the columns, no Flight objects
+        inventory = ColumnarInventory.from_batches(
+            generate_column_batches(count, airport_codes, AIRLINES, seed, **options),
+            airport_codes, AIRLINES, AIRCRAFT_TYPES, Flight
+        )
+        _reset_inventory()
+        columnar_inventory = inventory
+        return
+    _reset_inventory()
+    for batch in generate_flight_records(count, airport_codes, AIRLINES, seed, **options):
+        add_flights(Flight(**record) for record in batch)
+
+def save_inventory_snapshot(path: str):
+    """Write the loaded inventory to a memory-mappable snapshot file"""
+    if ColumnarInventory is None:
+        raise RuntimeError("Inventory snapshots require numpy")
+    inventory = columnar_inventory or ColumnarInventory.from_flights(flights_db, Flight)
+    write_snapshot(inventory, path)
+
+def load_inventory_snapshot(path: str):
+    """Map a snapshot as the inventory; it is always served by the columnar backend"""
+    global columnar_inventory
+    if ColumnarInventory is None:
+        raise RuntimeError("Inventory snapshots require numpy")
+    inventory = open_snapshot(path, Flight)
+    _reset_inventory()
+    columnar_inventory = inventory
+
+def sync_from_store():
+    """Adopt the store's seat counts and bookings on top of the loaded inventory"""
+    counts = list(store.load_seat_counts())
+    if columnar_inventory is not None:
+        columnar_inventory.load_seat_counts([count[0] for count in counts], [count[1] for count in counts])
+    else:
+        for flight_id, available_seats in counts:
+            flight = flights_by_id.get(flight_id)
+            if flight is not None:
+                _set_available_seats(flight, available_seats)
+    _load_stored_bookings()
+    _adopt_stored_holds()
+
+def _load_stored_bookings():
+    """Adopt the store's booking history"""
+    for row in store.load_bookings():
+        booking = Booking(*row)
+        add_booking(booking)
+        _count_status(booking, None, live=False)
+
+def _seed_store():
+    """Save the loaded inventory as the store's initial flights"""
+    rows = (tuple(getattr(f, column) for column in FLIGHT_COLUMNS) for f in iter_inventory())
+    return store.seed_flights(rows)
+
+def restore_from_store():
+    """Load the inventory and booking history saved in the store"""
+    _reset_inventory()
+    add_flights(Flight(*row) for row in store.load_flights())
+    _load_stored_bookings()
+    _adopt_stored_holds()
+    if INVENTORY_BACKEND == "columnar":
+        enable_columnar_inventory()
+
+def _load_journaled_inventory():
+    """Load the inventory a journal's bookings refer to, then replay them on top"""
+    inventory = store.inventory
+    snapshot = bool(SNAPSHOT_PATH) and os.path.exists(SNAPSHOT_PATH)
+    if inventory is None:
+        seed = int(INVENTORY_SEED) if INVENTORY_SEED else random.randrange(2**32)
+        inventory = {"snapshot": SNAPSHOT_PATH} if snapshot else {"size": INVENTORY_SIZE, "seed": seed}
+        store.record_inventory(inventory)
+    if snapshot:
+        load_inventory_snapshot(SNAPSHOT_PATH)
+    elif "seed" in inventory:
+        load_generated_inventory(inventory["size"], inventory["seed"])
+        if SNAPSHOT_PATH:
+            save_inventory_snapshot(SNAPSHOT_PATH)
+    else:
+        raise RuntimeError(f"Journal {store.path} refers to snapshot {inventory['snapshot']}, which is missing")
+    # Flights without bookings in the journal still have their inventory seat count
+    store.inventory_seats = lambda flight_id: getattr(get_flight(flight_id), "available_seats", None)
+    sync_from_store()
+
+def _load_inventory():
+    """Map the snapshot, restore the store or generate flights, whichever applies"""
+    if store is not None and not store.keeps_inventory:
+        _load_journaled_inventory()
+        return
+    
+    if SNAPSHOT_PATH and os.path.exists(SNAPSHOT_PATH):
+        load_inventory_snapshot(SNAPSHOT_PATH)
+        if store is not None and not _seed_store():
+            sync_from_store()
+        return
+    
+    if store is not None and store.has_flights():
+        restore_from_store()
+    else:
+        seed = int(INVENTORY_SEED) if INVENTORY_SEED else random.randrange(2**32)
+        load_generated_inventory(INVENTORY_SIZE, seed)
+        if store is not None and not _seed_store():
+            # Another process seeded the store first; share its inventory
+            restore_from_store()
+    
+    if SNAPSHOT_PATH:
+        save_inventory_snapshot(SNAPSHOT_PATH)
+
+def freeze_inventory():
+    """Collect load-time garbage, then move every surviving object out of the GC's reach"""
+    gc.collect()
+    gc.freeze()
+
+def generate_sample_flights():
+    """Generate sample flight data"""
+    if flights_db or columnar_inventory is not None:
+        # Held bookings restored from the store start expiring with the first tool call
+        _ensure_hold_reaper()
+        return
+    
+    # Collections triggered while millions of long-lived objects are
+    # created would only rescan them
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        _load_inventory()
+    finally:
+        if gc_enabled:
+            gc.enable()
+    if GC_FREEZE:
+        freeze_inventory()
+    _ensure_hold_reaper()
+
+async def _find_booking(booking_id: str) -> Optional[Booking]:
+    """Look up a booking, reading through the store when one is configured"""
+    booking = bookings_by_id.get(booking_id)
+    if store is None:
+        return booking
+    row = await store.get_booking(booking_id)
+    if row is None:
+        return None
+    return _merge_stored_booking(row)
+
+def _merge_stored_booking(row: Tuple) -> Booking:
+    """Adopt a booking row read from the store"""
+    stored = Booking(*row)
+    booking = bookings_by_id.get(stored.id)
+    if booking is None:
+        # Made by another server process
+        add_booking(stored)
+        _count_status(stored, None, live=False)
+        return stored
+    previous, booking.status = booking.status, stored.status
+    _count_status(booking, previous, live=False)
+    return booking
+
+def _count_status(booking: Booking, previous: Optional[str], live: bool = True):
+    """Update the booking analytics for a booking whose status was `previous`.
+
+    Only confirmed bookings count: confirming one books its revenue and
+    cancelling it refunds it. Held seats released unconfirmed count as neither.
+    """
+    if booking.status == previous or "confirmed" not in (booking.status, previous):
+        return
+    flight = get_flight(booking.flight_id)
+    if flight is None:
+        return
+    route = (flight.departure_airport, flight.arrival_airport)
+    if booking.status == "confirmed":
+        booking_stats.booked(route, flight.airline, flight.id, booking.total_price, live)
+    else:
+        booking_stats.cancelled(route, flight.airline, flight.id, booking.total_price, live)
+
+def _airline_seat_totals() -> Dict[str, List[int]]:
+    """[seats, available seats] per airline, counted once per loaded inventory"""
+    global airline_seats
+    if airline_seats is None:
+        if columnar_inventory is not None:
+            totals = columnar_inventory.airline_seat_totals(lambda aircraft: layout_for(aircraft).capacity)
+        else:
+            totals = {}
+            for flight in flights_db:
+                seats = totals.setdefault(flight.airline, [0, 0])
+                seats[0] += layout_for(flight.aircraft_type).capacity
+                seats[1] += flight.available_seats
+        airline_seats = totals
+    return airline_seats
+
+def _load_factor(seats: int, available: int) -> float:
+    """Share of seats sold"""
+    return round(1 - available / seats, 4) if seats else 0.0
 
 # ============================================================================
 # 🛠️ TOOLS - Functions that can be called to perform actions
@@ -110,7 +1250,13 @@ async def search_flights(
     arrival_airport: str, 
     departure_date: str,
     passengers: int = 1,
-    return_date: str = None
+    return_date: str = None,
+    max_price: float = None,
+    limit: int = 10,
+    cursor: str = None,
+    flex_days: int = 0,
+    departure_after: str = None,
+    departure_before: str = None
 ) -> Dict[str, Any]:
     """
     Search for available flights between airports on specific dates.
@@ -120,7 +1266,17 @@ async def search_flights(
         arrival_airport: IATA airport code for arrival (e.g., LHR, CDG)
         departure_date: Departure date in YYYY-MM-DD format
         passengers: Number of passengers (default: 1)
-        return_date: Return date for round-trip flights (optional)
+        return_date: Return date for round-trip flights in YYYY-MM-DD format (optional);
+            adds the cheapest outbound + return combinations as round_trips;
+            flex_days widens both legs
+        max_price: Only return flights at or below this price (optional)
+        limit: Maximum number of flights to return, cheapest first (default: 10)
+        cursor: next_cursor from a previous page to continue from (optional)
+        flex_days: Also search this many days either side of departure_date (default: 0, at most 30)
+        departure_after: Earliest departure, YYYY-MM-DD HH:MM (optional, overrides the date window start;
+            one-way searches only)
+        departure_before: Latest departure (exclusive), YYYY-MM-DD HH:MM (optional, overrides the window end;
+            one-way searches only)
     
     Returns:
         Dictionary containing flight search results
@@ -130,29 +1286,211 @@ async def search_flights(
     departure_airport = departure_airport.upper()
     arrival_airport = arrival_airport.upper()
     
-    # Filter flights
-    matching_flights = []
-    for flight in flights_db:
-        if (flight.departure_airport == departure_airport and 
-            flight.arrival_airport == arrival_airport and
-            flight.departure_time.startswith(departure_date) and
-            flight.available_seats >= passengers):
-            matching_flights.append({
-                "id": flight.id,
-                "airline": flight.airline,
-                "flight_number": flight.flight_number,
-                "departure_airport": flight.departure_airport,
-                "arrival_airport": flight.arrival_airport,
-                "departure_time": flight.departure_time,
-                "arrival_time": flight.arrival_time,
-                "duration": flight.duration,
-                "price": flight.price,
-                "available_seats": flight.available_seats,
-                "aircraft_type": flight.aircraft_type
-            })
-    
-    # Sort by price
-    matching_flights.sort(key=lambda x: x["price"])
+    # A cached response is only reused while no seats changed on its routes
+    cache_key = (
+        departure_airport, arrival_airport, departure_date, passengers, return_date,
+        max_price, limit, cursor, flex_days, departure_after, departure_before
+    )
+    versions = (route_versions.get((departure_airport, arrival_airport), 0),)
+    if return_date:
+        versions += (route_versions.get((arrival_airport, departure_airport), 0),)
+    cached = search_cache.get(cache_key, versions)
+    if cached is not None:
+        return cached
+    
+    try:
+        after = decode_cursor(cursor) if cursor else None
+        start_ts, end_ts = _search_window(departure_date, flex_days, departure_after, departure_before)
+    except ValueError as e:
+        return {"error": str(e)}
+    if return_date and not _is_date(return_date):
+        return {"error": f"Invalid return_date {return_date!r}, expected YYYY-MM-DD"}
+    if return_date and (departure_after or departure_before):
+        return {"error": "departure_after/departure_before apply to one-way searches only; use flex_days on round trips"}
+    
+    if columnar_inventory is not None:
+        rows, results_count, has_more = columnar_inventory.search(
+            departure_airport, arrival_airport, start_ts, end_ts, passengers, max_price, limit, after
+        )
+        top_flights = [columnar_inventory.flight_at(row) for row in rows]
+    elif flex_days == 0 and not departure_after and not departure_before:
+        # Route/day bucket holds only flights with seats; dicts are built for the top `limit` only
+        bucket = route_index.get((departure_airport, arrival_airport, departure_date), ())
+        if max_price is not None:
+            bucket = itertools.takewhile(lambda f: f.price <= max_price, bucket)
+        top_flights, results_count, has_more = _select_cheapest(
+            (f for f in bucket if f.available_seats >= passengers), limit, after
+        )
+    else:
+        # Wider windows bisect into the route's departure timeline instead
+        top_flights, results_count, has_more = _select_cheapest(
+            (f for f in _departures_between(departure_airport, arrival_airport, start_ts, end_ts)
+             if f.available_seats >= passengers and (max_price is None or f.price <= max_price)),
+            limit, after
+        )
+    
+    response = {
+        "search_criteria": {
+            "departure_airport": departure_airport,
+            "arrival_airport": arrival_airport,
+            "departure_date": departure_date,
+            "passengers": passengers,
+            "return_date": return_date,
+            "max_price": max_price,
+            "limit": limit,
+            "flex_days": flex_days,
+            "departure_after": departure_after,
+            "departure_before": departure_before
+        },
+        "results_count": results_count,
+        "flights": [_flight_summary(flight) for flight in top_flights],
+        "next_cursor": encode_cursor(top_flights[-1]) if has_more and top_flights else None
+    }
+    
+    if return_date:
+        # Both legs come straight from their price-sorted route buckets
+        outbound = _flights_by_price(departure_airport, arrival_airport, departure_date, passengers, max_price, flex_days)
+        inbound = _flights_by_price(arrival_airport, departure_airport, return_date, passengers, max_price, flex_days)
+        pairs, response["round_trips_count"] = _cheapest_round_trips(
+            outbound, inbound, limit, MIN_TURNAROUND_MINUTES * 60
+        )
+        response["round_trips"] = [
+            {
+                "total_price": round(out_leg.price + in_leg.price, 2),
+                "outbound": _flight_summary(_leg_flight(out_leg)),
+                "inbound": _flight_summary(_leg_flight(in_leg))
+            }
+            for out_leg, in_leg in pairs
+        ]
+    
+    search_cache.put(cache_key, versions, response, _search_response_size(response))
+    return response
+
+def _search_response_size(response: Dict[str, Any]) -> int:
+    """Approximate encoded size of a search_flights response, for the cache's memory cap.
+
+    Flight summaries already carry their JSON text, so only their lengths
+    are summed; the criteria and round-trip wrappers count as a constant.
+    """
+    size = SEARCH_RESPONSE_OVERHEAD + sum(len(summary.json) for summary in response["flights"])
+    for trip in response.get("round_trips", ()):
+        size += ROUND_TRIP_OVERHEAD + len(trip["outbound"].json) + len(trip["inbound"].json)
+    return size
+
+@mcp.tool()
+async def search_flights_batch(queries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Run several flight searches in one call.
+    
+    Args:
+        queries: Up to 50 searches, each a dictionary of search_flights
+            arguments (departure_airport, arrival_airport and departure_date
+            are required)
+    
+    Returns:
+        Dictionary with one result per query, in query order; a query that
+        fails gets an {"error": ...} entry without affecting the others
+    """
+    generate_sample_flights()
+    
+    if not isinstance(queries, list) or not queries:
+        return {"error": "queries must be a non-empty list"}
+    if len(queries) > MAX_BATCH_QUERIES:
+        return {"error": f"At most {MAX_BATCH_QUERIES} queries per batch"}
+    
+    results: List[Optional[Dict[str, Any]]] = [None] * len(queries)
+    # Queries are grouped by route so each route's index is walked while it
+    # is hot, and identical queries are only answered once
+    routes: Dict[Tuple[str, str], List[Tuple[int, Dict[str, Any]]]] = {}
+    for position, query in enumerate(queries):
+        if not isinstance(query, dict):
+            results[position] = {"error": "Each query must be a dictionary"}
+            continue
+        unknown = sorted(set(query) - set(SEARCH_QUERY_FIELDS))
+        missing = [name for name in REQUIRED_QUERY_FIELDS if not query.get(name)]
+        if unknown or missing:
+            problem = f"unknown fields {', '.join(unknown)}" if unknown else f"missing {', '.join(missing)}"
+            results[position] = {"error": f"Invalid query: {problem}"}
+            continue
+        params = dict(query)
+        params["departure_airport"] = str(params["departure_airport"]).upper()
+        params["arrival_airport"] = str(params["arrival_airport"]).upper()
+        routes.setdefault((params["departure_airport"], params["arrival_airport"]), []).append((position, params))
+    
+    for members in routes.values():
+        answered: Dict[Tuple, Dict[str, Any]] = {}
+        for position, params in members:
+            key = tuple(sorted((name, repr(value)) for name, value in params.items()))
+            if key not in answered:
+                try:
+                    answered[key] = await search_flights(**params)
+                except Exception as e:
+                    answered[key] = {"error": f"Search failed: {e}"}
+            results[position] = answered[key]
+    
+    return {
+        "queries_count": len(queries),
+        "results": results
+    }
+
+@mcp.tool()
+async def search_itineraries(
+    departure_airport: str,
+    arrival_airport: str,
+    departure_date: str,
+    passengers: int = 1,
+    max_stops: int = 1,
+    min_connection_minutes: int = 45,
+    max_connection_minutes: int = 360,
+    sort_by: str = "price",
+    limit: int = 5,
+    flex_days: int = 0
+) -> Dict[str, Any]:
+    """
+    Search for direct and connecting itineraries between airports.
+    
+    Args:
+        departure_airport: IATA airport code for departure (e.g., JFK)
+        arrival_airport: IATA airport code for the final destination (e.g., SYD)
+        departure_date: Departure date of the first leg in YYYY-MM-DD format
+        passengers: Number of passengers; every leg needs this many seats (default: 1)
+        max_stops: Maximum number of connections (default: 1, max: 3)
+        min_connection_minutes: Minimum layover between legs (default: 45)
+        max_connection_minutes: Maximum layover between legs (default: 360)
+        sort_by: Rank itineraries by "price" or "duration" (default: price)
+        limit: Maximum number of itineraries to return (default: 5)
+        flex_days: Also depart this many days either side of departure_date (default: 0, at most 30)
+    
+    Returns:
+        Dictionary containing the best itineraries found
+    """
+    generate_sample_flights()
+    
+    departure_airport = departure_airport.upper()
+    arrival_airport = arrival_airport.upper()
+    
+    if not 0 <= max_stops <= MAX_ITINERARY_STOPS:
+        return {"error": f"max_stops must be between 0 and {MAX_ITINERARY_STOPS}"}
+    if not 0 <= min_connection_minutes <= max_connection_minutes:
+        return {"error": "Connection window must satisfy 0 <= min_connection_minutes <= max_connection_minutes"}
+    
+    try:
+        start_ts, end_ts = _search_window(departure_date, flex_days)
+        paths = itinerary_search.search_itineraries(
+            _leg_departures,
+            departure_airport,
+            arrival_airport,
+            start_ts,
+            end_ts,
+            max_stops=max_stops,
+            min_connection=min_connection_minutes * 60,
+            max_connection=max_connection_minutes * 60,
+            sort_by=sort_by,
+            limit=limit,
+            min_seats=passengers
+        )
+    except ValueError as e:
+        return {"error": str(e)}
     
     return {
         "search_criteria": {
@@ -160,18 +1498,86 @@ async def search_flights(
             "arrival_airport": arrival_airport,
             "departure_date": departure_date,
             "passengers": passengers,
-            "return_date": return_date
+            "max_stops": max_stops,
+            "min_connection_minutes": min_connection_minutes,
+            "max_connection_minutes": max_connection_minutes,
+            "sort_by": sort_by,
+            "limit": limit,
+            "flex_days": flex_days
         },
-        "results_count": len(matching_flights),
-        "flights": matching_flights[:10]  # Top 10 results
+        "results_count": len(paths),
+        "itineraries": [_itinerary_summary(path) for path in paths]
+    }
+
+def _booking_summary(booking: Booking, flight: Flight) -> Dict[str, Any]:
+    """Response view of a single booking"""
+    return {
+        "booking_id": booking.id,
+        "passenger_name": booking.passenger_name,
+        "passenger_email": booking.passenger_email,
+        "flight_details": _flight_details(flight),
+        "seat_number": booking.seat_number,
+        "total_price": booking.total_price,
+        "status": booking.status,
+        "booking_date": booking.booking_date
+    }
+
+def _passengers_error(passengers: List[Dict[str, str]]) -> Optional[str]:
+    """Why a passenger list cannot be booked together, or None"""
+    if not passengers:
+        return "At least one passenger is required"
+    if len(passengers) > MAX_GROUP_SIZE:
+        return f"A group booking can hold at most {MAX_GROUP_SIZE} passengers"
+    for passenger in passengers:
+        if not isinstance(passenger, dict) or not passenger.get("name") or not passenger.get("email"):
+            return "Every passenger needs a name and an email"
+    return None
+
+async def _new_bookings(flight: Flight, passengers: List[Dict[str, str]], status: str) -> List[Booking]:
+    """One booking per passenger; seats are assigned when they are reserved"""
+    booking_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return [
+        Booking(
+            id=booking_id,
+            flight_id=flight.id,
+            passenger_name=passenger["name"],
+            passenger_email=passenger["email"],
+            seat_number="",
+            booking_date=booking_date,
+            status=status,
+            total_price=flight.price
+        )
+        for booking_id, passenger in zip(await booking_ids.take(len(passengers)), passengers)
+    ]
+
+def _group_summary(flight: Flight, bookings: List[Booking]) -> Dict[str, Any]:
+    """Response view of bookings made together on one flight"""
+    return {
+        "flight_details": _flight_details(flight),
+        "bookings": [
+            {
+                "booking_id": booking.id,
+                "passenger_name": booking.passenger_name,
+                "passenger_email": booking.passenger_email,
+                "seat_number": booking.seat_number,
+                "total_price": booking.total_price,
+                "status": booking.status
+            }
+            for booking in bookings
+        ],
+        "passenger_count": len(bookings),
+        "total_price": round(sum(booking.total_price for booking in bookings), 2),
+        "booking_date": bookings[0].booking_date
     }
 
 @mcp.tool()
+@idempotent(idempotency_keys, "book_flight")
 async def book_flight(
     flight_id: str,
     passenger_name: str,
     passenger_email: str,
-    seat_preference: str = "any"
+    seat_preference: str = "any",
+    idempotency_key: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Book a specific flight for a passenger.
@@ -181,6 +1587,7 @@ async def book_flight(
         passenger_name: Full name of the passenger
         passenger_email: Email address of the passenger
         seat_preference: Seat preference (window, aisle, middle, or specific seat)
+        idempotency_key: Optional client-chosen key; retries with the same key return the first result
     
     Returns:
         Dictionary containing booking confirmation details
@@ -188,78 +1595,339 @@ async def book_flight(
     generate_sample_flights()
     
     # Find the flight
-    flight = next((f for f in flights_db if f.id == flight_id), None)
+    flight = get_flight(flight_id)
     if not flight:
         return {"error": f"Flight {flight_id} not found"}
     
-    if flight.available_seats <= 0:
+    # Another process may have freed seats, so with a store only it can say no
+    if store is None and flight.available_seats <= 0:
         return {"error": f"Flight {flight_id} is fully booked"}
     
-    # Generate seat number
-    seat_number = f"{random.randint(1, 30)}{random.choice(['A', 'B', 'C', 'D', 'E', 'F'])}"
-    
-    # Create booking
+    # Create booking; the seat is assigned when it is reserved
     booking = Booking(
-        id=f"BK{len(bookings_db)+1:04d}",
+        id=await booking_ids.next_id(),
         flight_id=flight_id,
         passenger_name=passenger_name,
         passenger_email=passenger_email,
-        seat_number=seat_number,
+        seat_number="",
         booking_date=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         status="confirmed",
         total_price=flight.price
     )
     
-    bookings_db.append(booking)
+    # Pick a seat, take it and record the booking atomically
+    error = await reserve_seats(flight, [booking], seat_preference)
+    if error:
+        return {"error": error}
+    
+    return _booking_summary(booking, flight)
+
+@mcp.tool()
+@idempotent(idempotency_keys, "book_group")
+async def book_group(
+    flight_id: str,
+    passengers: List[Dict[str, str]],
+    idempotency_key: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Book several passengers on one flight in a single reservation.
+    
+    Either every passenger gets a seat or nobody is booked. Seats are
+    assigned next to each other where the cabin allows it.
+    
+    Args:
+        flight_id: ID of the flight to book
+        passengers: Passengers to book, each with "name" and "email"
+        idempotency_key: Optional client-chosen key; retries with the same key return the first result
+    
+    Returns:
+        Dictionary containing one booking per passenger
+    """
+    generate_sample_flights()
+    
+    error = _passengers_error(passengers)
+    if error:
+        return {"error": error}
+    
+    flight = get_flight(flight_id)
+    if not flight:
+        return {"error": f"Flight {flight_id} not found"}
+    
+    if store is None and flight.available_seats < len(passengers):
+        return {"error": f"Flight {flight_id} has fewer than {len(passengers)} seats left"}
+    
+    bookings = await _new_bookings(flight, passengers, "confirmed")
+    
+    # One critical section takes every seat, or none
+    error = await reserve_seats(flight, bookings)
+    if error:
+        return {"error": error}
+    
+    return _group_summary(flight, bookings)
+
+@mcp.tool()
+async def hold_seats(
+    flight_id: str,
+    passengers: List[Dict[str, str]],
+    seat_preference: str = "any",
+    hold_seconds: int = DEFAULT_HOLD_SECONDS
+) -> Dict[str, Any]:
+    """
+    Reserve seats for a while without booking them yet.
+    
+    The seats are taken off the flight until confirm_hold books them,
+    release_hold gives them back, or the hold expires.
+    
+    Args:
+        flight_id: ID of the flight
+        passengers: Passengers to hold seats for, each with "name" and "email"
+        seat_preference: Seat preference for a single passenger (window, aisle, middle, or specific seat)
+        hold_seconds: How long to keep the seats (default: 300, at most 1800)
+    
+    Returns:
+        Dictionary containing the hold id, held seats and expiry time
+    """
+    generate_sample_flights()
+    
+    error = _passengers_error(passengers)
+    if error:
+        return {"error": error}
+    if not 1 <= hold_seconds <= MAX_HOLD_SECONDS:
+        return {"error": f"hold_seconds must be between 1 and {MAX_HOLD_SECONDS}"}
+    
+    flight = get_flight(flight_id)
+    if not flight:
+        return {"error": f"Flight {flight_id} not found"}
+    
+    if store is None and flight.available_seats < len(passengers):
+        return {"error": f"Flight {flight_id} has fewer than {len(passengers)} seats left"}
+    
+    bookings = await _new_bookings(flight, passengers, "held")
+    hold_id = await hold_ids.next_id()
+    error = await reserve_seats(flight, bookings, seat_preference if len(bookings) == 1 else "any")
+    if error:
+        return {"error": error}
     
-    # Update flight availability
-    flight.available_seats -= 1
+    hold = _register_hold(hold_id, flight.id, [booking.id for booking in bookings], hold_seconds)
+    _ensure_hold_reaper()
     
     return {
-        "booking_id": booking.id,
-        "passenger_name": passenger_name,
-        "passenger_email": passenger_email,
-        "flight_details": {
-            "id": flight.id,
-            "airline": flight.airline,
-            "flight_number": flight.flight_number,
-            "departure_airport": flight.departure_airport,
-            "arrival_airport": flight.arrival_airport,
-            "departure_time": flight.departure_time,
-            "arrival_time": flight.arrival_time,
-            "duration": flight.duration
-        },
-        "seat_number": seat_number,
-        "total_price": booking.total_price,
-        "status": booking.status,
-        "booking_date": booking.booking_date
+        "hold_id": hold.id,
+        **_group_summary(flight, bookings),
+        "expires_at": hold.expires_at,
+        "hold_seconds": hold_seconds
+    }
+
+@mcp.tool()
+async def confirm_hold(hold_id: str) -> Dict[str, Any]:
+    """
+    Book the seats of a hold.
+    
+    Args:
+        hold_id: ID returned by hold_seats
+    
+    Returns:
+        Dictionary containing one confirmed booking per held seat
+    """
+    hold = seat_holds.get(hold_id)
+    if hold is None:
+        return {"error": f"Hold {hold_id} not found or expired"}
+    
+    flight = get_flight(hold.flight_id)
+    bookings = [bookings_by_id[booking_id] for booking_id in hold.booking_ids]
+    async with seat_locks.hold(hold.flight_id):
+        # Taking the hold first means the expiry task can no longer release it
+        if _take_hold(hold_id) is not hold:
+            return {"error": f"Hold {hold_id} not found or expired"}
+        try:
+            confirmed = (
+                hold.deadline > time.monotonic()
+                and all(booking.status == "held" for booking in bookings)
+                and (store is None or await store.confirm(hold.booking_ids))
+            )
+        except Exception as e:
+            # Nothing was confirmed: put the hold back so it is confirmed or expires later
+            seat_holds[hold.id] = hold
+            hold_timers.schedule(hold.id, hold.deadline)
+            _ensure_hold_reaper()
+            return {"error": f"Could not confirm hold {hold_id}: {e}"}
+        if confirmed:
+            for booking in bookings:
+                booking.status = "confirmed"
+                _count_status(booking, "held")
+    if not confirmed:
+        await _release_hold(hold)
+        return {"error": f"Hold {hold_id} has expired"}
+    
+    return {"hold_id": hold_id, **_group_summary(flight, bookings)}
+
+@mcp.tool()
+async def release_hold(hold_id: str) -> Dict[str, Any]:
+    """
+    Give the seats of a hold back without booking them.
+    
+    Args:
+        hold_id: ID returned by hold_seats
+    
+    Returns:
+        Dictionary confirming the release
+    """
+    hold = _take_hold(hold_id)
+    if hold is None:
+        return {"error": f"Hold {hold_id} not found or expired"}
+    await _release_hold(hold)
+    return {
+        "hold_id": hold_id,
+        "flight_id": hold.flight_id,
+        "released_seats": len(hold.booking_ids),
+        "status": "released"
     }
 
+async def _wait_for_promotion(entry: WaitlistEntry, wait_seconds: float):
+    """Wait until the entry leaves the queue or the time runs out"""
+    if entry.status not in ("waiting", "promoting") or wait_seconds <= 0:
+        return
+    waiter = asyncio.get_running_loop().create_future()
+    waitlist_waiters.setdefault(entry.id, []).append(waiter)
+    try:
+        await asyncio.wait_for(waiter, wait_seconds)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        waiters = waitlist_waiters.get(entry.id)
+        if waiters and waiter in waiters:
+            waiters.remove(waiter)
+            if not waiters:
+                del waitlist_waiters[entry.id]
+
+@mcp.tool()
+async def join_waitlist(
+    flight_id: str,
+    passenger_name: str,
+    passenger_email: str,
+    seat_preference: str = "any",
+    priority: int = 0,
+    wait_seconds: int = 0
+) -> Dict[str, Any]:
+    """
+    Queue for a seat on a fully booked flight.
+    
+    When a booking is cancelled or a hold expires, the freed seat is booked
+    for the first passenger in line automatically.
+    
+    Args:
+        flight_id: ID of the flight
+        passenger_name: Full name of the passenger
+        passenger_email: Email address of the passenger
+        seat_preference: Seat class preference (any, window, aisle or middle)
+        priority: Higher priorities are served first (default: 0)
+        wait_seconds: Wait up to this long for a seat before answering (default: 0, at most 300)
+    
+    Returns:
+        Dictionary containing the waitlist entry, with the booking once a seat was found
+    """
+    generate_sample_flights()
+    
+    flight = get_flight(flight_id)
+    if not flight:
+        return {"error": f"Flight {flight_id} not found"}
+    seat_preference = (seat_preference or "any").strip().lower()
+    if seat_preference not in ("any",) + SEAT_CLASSES:
+        return {"error": f"seat_preference must be one of: {', '.join(('any',) + SEAT_CLASSES)}"}
+    if not 0 <= wait_seconds <= MAX_WAITLIST_WAIT_SECONDS:
+        return {"error": f"wait_seconds must be between 0 and {MAX_WAITLIST_WAIT_SECONDS}"}
+    
+    entry = WaitlistEntry(
+        id=await waitlist_ids.next_id(),
+        flight_id=flight_id,
+        passenger_name=passenger_name,
+        passenger_email=passenger_email,
+        seat_preference=seat_preference,
+        priority=priority,
+        order=next(_waitlist_order),
+        joined_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    )
+    waitlist_entries[entry.id] = entry
+    heapq.heappush(waitlists.setdefault(flight_id, []), _waitlist_key(entry))
+    
+    # A seat may have opened since the caller saw the flight full
+    await _promote_waitlist(flight_id)
+    await _wait_for_promotion(entry, wait_seconds)
+    return _waitlist_view(entry)
+
+@mcp.tool()
+async def waitlist_status(entry_id: str, wait_seconds: int = 0) -> Dict[str, Any]:
+    """
+    Check a waitlist entry, optionally waiting for it to get a seat.
+    
+    Args:
+        entry_id: ID returned by join_waitlist
+        wait_seconds: Wait up to this long for a seat before answering (default: 0, at most 300)
+    
+    Returns:
+        Dictionary containing the entry's status and position, or its booking
+    """
+    _expire_waitlist_entries()
+    entry = waitlist_entries.get(entry_id)
+    if entry is None:
+        return {"error": f"Waitlist entry {entry_id} not found"}
+    if not 0 <= wait_seconds <= MAX_WAITLIST_WAIT_SECONDS:
+        return {"error": f"wait_seconds must be between 0 and {MAX_WAITLIST_WAIT_SECONDS}"}
+    await _wait_for_promotion(entry, wait_seconds)
+    return _waitlist_view(entry)
+
+@mcp.tool()
+async def leave_waitlist(entry_id: str) -> Dict[str, Any]:
+    """
+    Leave a flight's waitlist.
+    
+    Args:
+        entry_id: ID returned by join_waitlist
+    
+    Returns:
+        Dictionary containing the entry's final status
+    """
+    _expire_waitlist_entries()
+    entry = waitlist_entries.get(entry_id)
+    if entry is None:
+        return {"error": f"Waitlist entry {entry_id} not found"}
+    if entry.status == "promoting":
+        return {"error": f"Waitlist entry {entry_id} is being booked; cancel the booking instead"}
+    if entry.status == "booked":
+        return {"error": f"Waitlist entry {entry_id} already has booking {entry.booking_id}"}
+    if entry.status == "waiting":
+        # Taken off the heap now, so a long-lived queue cannot fill up with leavers
+        queue = waitlists[entry.flight_id]
+        queue.remove(_waitlist_key(entry))
+        heapq.heapify(queue)
+        if not queue:
+            del waitlists[entry.flight_id]
+        _finish_waitlist_entry(entry, "left")
+    return _waitlist_view(entry)
+
 @mcp.tool()
-async def cancel_booking(booking_id: str) -> Dict[str, Any]:
+@idempotent(idempotency_keys, "cancel_booking")
+async def cancel_booking(booking_id: str, idempotency_key: Optional[str] = None) -> Dict[str, Any]:
     """
     Cancel a flight booking.
     
     Args:
         booking_id: ID of the booking to cancel
+        idempotency_key: Optional client-chosen key; retries with the same key return the first result
     
     Returns:
         Dictionary containing cancellation details
     """
-    booking = next((b for b in bookings_db if b.id == booking_id), None)
+    booking = await _find_booking(booking_id)
     if not booking:
         return {"error": f"Booking {booking_id} not found"}
     
     if booking.status == "cancelled":
         return {"error": f"Booking {booking_id} is already cancelled"}
     
-    # Update booking status
-    booking.status = "cancelled"
-    
-    # Restore flight availability
-    flight = next((f for f in flights_db if f.id == booking.flight_id), None)
-    if flight:
-        flight.available_seats += 1
+    # Mark it cancelled and restore flight availability atomically
+    if not await release_seats(booking):
+        return {"error": f"Booking {booking_id} is already cancelled"}
     
     return {
         "booking_id": booking_id,
@@ -269,6 +1937,110 @@ async def cancel_booking(booking_id: str) -> Dict[str, Any]:
         "status": "cancelled"
     }
 
+@mcp.tool()
+async def list_bookings(
+    passenger_email: str,
+    status: Optional[str] = None,
+    limit: int = 20,
+    cursor: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    List a passenger's bookings, oldest first.
+    
+    Args:
+        passenger_email: Email address the bookings were made with (case and surrounding spaces are ignored)
+        status: Only return bookings with this status: confirmed, held or cancelled (optional)
+        limit: Maximum number of bookings to return (default: 20, at most 100)
+        cursor: next_cursor from a previous page to continue from (optional)
+    
+    Returns:
+        Dictionary containing a page of bookings and the cursor of the next page
+    """
+    if status is not None and status not in BOOKING_STATUSES:
+        return {"error": f"status must be one of: {', '.join(BOOKING_STATUSES)}"}
+    if not 1 <= limit <= MAX_BOOKINGS_PAGE:
+        return {"error": f"limit must be between 1 and {MAX_BOOKINGS_PAGE}"}
+    try:
+        after = decode_booking_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return {"error": str(e)}
+    
+    if store is not None:
+        # Picks up bookings made and statuses changed by other server processes
+        for row in await store.get_bookings_by_email(passenger_email):
+            _merge_stored_booking(row)
+    
+    # Only this passenger's bookings are visited, starting at the cursor
+    bookings = bookings_by_email.get(normalize_email(passenger_email), [])
+    start = bisect.bisect_right(bookings, after, key=_booking_key) if after else 0
+    page, has_more = [], False
+    for index in range(start, len(bookings)):
+        booking = bookings[index]
+        if status is not None and booking.status != status:
+            continue
+        if len(page) == limit:
+            has_more = True
+            break
+        page.append(booking)
+    
+    return {
+        "passenger_email": passenger_email,
+        "status": status,
+        "bookings": [_booking_summary(booking, get_flight(booking.flight_id)) for booking in page],
+        "next_cursor": encode_booking_cursor(page[-1]) if has_more else None
+    }
+
+@mcp.tool()
+async def get_stats(flight_id: Optional[str] = None, top_routes: int = 10) -> Dict[str, Any]:
+    """
+    Get booking analytics: revenue, load factors and booking and cancellation rates.
+    
+    Args:
+        flight_id: Also report this flight's load factor and bookings (optional)
+        top_routes: Number of routes to list, highest revenue first (default: 10, at most 100)
+    
+    Returns:
+        Dictionary containing overall, per-route and per-airline totals, rates
+        over the last hour (per minute) and day (per hour), and cache statistics
+    """
+    generate_sample_flights()
+    
+    if not 0 <= top_routes <= MAX_STATS_ROUTES:
+        return {"error": f"top_routes must be between 0 and {MAX_STATS_ROUTES}"}
+    flight = None
+    if flight_id:
+        flight = get_flight(flight_id)
+        if not flight:
+            return {"error": f"Flight {flight_id} not found"}
+    
+    stats = {
+        "bookings": booking_stats.total.as_dict(),
+        "last_hour": booking_stats.rollup(booking_stats.per_minute),
+        "last_day": booking_stats.rollup(booking_stats.per_hour),
+        "routes": [
+            {"departure_airport": departure, "arrival_airport": arrival, **totals.as_dict()}
+            for (departure, arrival), totals in top_by_revenue(booking_stats.routes, top_routes)
+        ],
+        "airlines": [
+            {
+                "airline": airline,
+                "load_factor": _load_factor(seats, available),
+                **booking_stats.airlines.get(airline, Totals()).as_dict()
+            }
+            for airline, (seats, available) in sorted(_airline_seat_totals().items())
+        ],
+        "search_cache": search_cache.stats(),
+        "idempotency_keys": idempotency_keys.stats()
+    }
+    if flight is not None:
+        stats["flight"] = {
+            "flight_id": flight.id,
+            "load_factor": _load_factor(layout_for(flight.aircraft_type).capacity, flight.available_seats),
+            "available_seats": flight.available_seats,
+            **booking_stats.flights.get(flight.id, Totals()).as_dict()
+        }
+    return stats
+
 @mcp.tool()
 async def list_airports() -> Dict[str, Any]:
     """
@@ -312,7 +2084,7 @@ async def get_flight_status(flight_id: str) -> Dict[str, Any]:
     """
     generate_sample_flights()
     
-    flight = next((f for f in flights_db if f.id == flight_id), None)
+    flight = get_flight(flight_id)
     if not flight:
         return {"error": f"Flight {flight_id} not found"}
     
@@ -344,11 +2116,11 @@ async def get_booking_details(booking_id: str) -> Dict[str, Any]:
     Returns:
         Dictionary containing booking details
     """
-    booking = next((b for b in bookings_db if b.id == booking_id), None)
+    booking = await _find_booking(booking_id)
     if not booking:
         return {"error": f"Booking {booking_id} not found"}
     
-    flight = next((f for f in flights_db if f.id == booking.flight_id), None)
+    flight = get_flight(booking.flight_id)
     if not flight:
         return {"error": f"Flight details not found for booking {booking_id}"}
     
@@ -356,23 +2128,51 @@ async def get_booking_details(booking_id: str) -> Dict[str, Any]:
         "booking_id": booking.id,
         "passenger_name": booking.passenger_name,
         "passenger_email": booking.passenger_email,
-        "flight_details": {
-            "id": flight.id,
-            "airline": flight.airline,
-            "flight_number": flight.flight_number,
-            "departure_airport": flight.departure_airport,
-            "arrival_airport": flight.arrival_airport,
-            "departure_time": flight.departure_time,
-            "arrival_time": flight.arrival_time,
-            "duration": flight.duration,
-            "aircraft_type": flight.aircraft_type
-        },
+        "flight_details": _flight_details(flight),
         "seat_number": booking.seat_number,
         "total_price": booking.total_price,
         "status": booking.status,
         "booking_date": booking.booking_date
     }
 
+@mcp.resource("booking://list/{passenger_email}")
+async def get_passenger_bookings(passenger_email: str) -> Dict[str, Any]:
+    """
+    Get the first page of a passenger's bookings.
+    
+    Args:
+        passenger_email: Email address the bookings were made with
+    
+    Returns:
+        Dictionary containing up to 100 bookings, oldest first, and the
+        list_bookings cursor of the next page
+    """
+    return await list_bookings(passenger_email, limit=MAX_BOOKINGS_PAGE)
+
+@mcp.resource("seat://map/{flight_id}")
+async def get_seat_map(flight_id: str) -> Dict[str, Any]:
+    """
+    Get the seat map of a specific flight.
+    
+    Args:
+        flight_id: ID of the flight
+    
+    Returns:
+        Dictionary with the cabin layout, free seats per class and one line
+        per row ("." free, "x" taken)
+    """
+    generate_sample_flights()
+    
+    flight = get_flight(flight_id)
+    if not flight:
+        return {"error": f"Flight {flight_id} not found"}
+    
+    return {
+        "flight_id": flight_id,
+        "available_seats": flight.available_seats,
+        **seat_maps.describe(flight)
+    }
+
 @mcp.resource("airport://info/{airport_code}")
 async def get_airport_info(airport_code: str) -> Dict[str, Any]:
     """
@@ -390,15 +2190,19 @@ async def get_airport_info(airport_code: str) -> Dict[str, Any]:
     if not airport:
         return {"error": f"Airport {airport_code} not found"}
     
+    # Simulated facilities are drawn from the airport code so the same
+    # airport always reports the same reference data
+    facilities = random.Random(airport["code"])
+    
     return {
         "code": airport["code"],
         "name": airport["name"],
         "city": airport["city"],
         "country": airport["country"],
         "timezone": "UTC-5" if airport["country"] == "USA" else "UTC+0",  # Simplified
-        "terminals": random.randint(1, 5),
-        "runways": random.randint(2, 4),
-        "last_updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        "terminals": facilities.randint(1, 5),
+        "runways": facilities.randint(2, 4),
+        "last_updated": reference_data_updated
     }
 
 # ============================================================================
@@ -419,7 +2223,7 @@ async def find_flight_suggestions(travel_preferences: str) -> str:
     generate_sample_flights()
     
     # Extract some sample flights for suggestions
-    sample_flights = flights_db[:5]
+    sample_flights = sample_inventory(5)
     
     suggestions = f"🛫 Flight Suggestions based on: {travel_preferences}\n\n"
     suggestions += "Here are some recommended flights:\n\n"
@@ -531,18 +2335,37 @@ if __name__ == "__main__":
     generate_sample_flights()
     
     print("🛫 Starting Flight Booking MCP Server with FastMCP...")
-    print(f"📊 Generated {len(flights_db)} sample flights")
+    print(f"📊 Generated {inventory_size()} sample flights")
     print(f"🏢 Available airports: {len(AIRPORTS)}")
     print(f"✈️ Available airlines: {len(AIRLINES)}")
+    if DB_PATH:
+        print(f"💾 Persistent store: {DB_PATH}")
+    elif JOURNAL_PATH:
+        print(f"📒 Booking journal: {JOURNAL_PATH} ({JOURNAL_SYNC_MS:g} ms group commit)")
+    if SNAPSHOT_PATH:
+        print(f"🗺️ Inventory snapshot: {SNAPSHOT_PATH}")
     print("\n🛠️ Available Tools:")
     print("  - search_flights")
+    print("  - search_flights_batch")
+    print("  - search_itineraries")
     print("  - book_flight") 
+    print("  - book_group")
+    print("  - hold_seats")
+    print("  - confirm_hold")
+    print("  - release_hold")
+    print("  - join_waitlist")
+    print("  - waitlist_status")
+    print("  - leave_waitlist")
     print("  - cancel_booking")
+    print("  - list_bookings")
+    print("  - get_stats")
     print("  - list_airports")
     print("  - list_airlines")
     print("\n📚 Available Resources:")
     print("  - flight://status/{flight_id}")
     print("  - booking://details/{booking_id}")
+    print("  - booking://list/{passenger_email}")
+    print("  - seat://map/{flight_id}")
     print("  - airport://info/{airport_code}")
     print("\n💬 Available Prompts:")
     print("  - find_flight_suggestions")
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Persistent Storage for Flights and Bookings
+
+Pluggable storage layer behind the in-memory indexes of the flight booking
+server. The in-memory inventory serves searches; the store is the source
+of truth for seat counts and bookings, so several server processes (the
+SSE MCP server and the REST API) can share one inventory.
+
+- FlightStore: the interface the server talks to
+- SQLiteStore: SQLite in WAL mode with one writer connection and a small
+  pool of reader connections. Blocking calls run in worker threads so they
+  never stall the event loop.
+"""
+
+import asyncio
+import queue
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+FLIGHT_COLUMNS = (
+    "id", "airline", "flight_number", "departure_airport", "arrival_airport",
+    "departure_time", "arrival_time", "duration", "price", "available_seats", "aircraft_type",
+)
+BOOKING_COLUMNS = (
+    "id", "flight_id", "passenger_name", "passenger_email", "seat_number",
+    "booking_date", "status", "total_price",
+)
+
+
+def normalize_email(email: str) -> str:
+    """Key bookings are indexed and looked up by: trimmed and lower-cased"""
+    return email.strip().lower()
+
+
+class SeatUnavailable(Exception):
+    """A requested seat is already taken by another confirmed or held booking on the flight"""
+
+
+class FlightStore(ABC):
+    """Interface for persistent flight and booking storage.
+
+    Seat-changing methods return the flight's new available_seats as
+    recorded by the store, or None when the change was refused.
+
+    A store with keeps_inventory False records bookings only: the server
+    loads the inventory itself and adopts the store's seat counts on top.
+    Every method but close() is abstract, so a backend missing one fails when
+    it is instantiated rather than on the first call that needs it.
+    """
+
+    keeps_inventory = True
+
+    @abstractmethod
+    def has_flights(self) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def seed_flights(self, flights: Iterable[Sequence[Any]]) -> bool:
+        """Insert the initial inventory; False if another process already did"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def load_flights(self) -> Iterator[Tuple]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def load_seat_counts(self) -> Iterator[Tuple[str, int]]:
+        """(flight_id, available_seats) for every flight"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def load_bookings(self) -> Iterator[Tuple]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def book(self, bookings: Sequence[Any]) -> Optional[int]:
+        """Take one seat per booking on their (shared) flight and record them all atomically.
+
+        Bookings are stored with their status, "confirmed" or "held". Raises
+        SeatUnavailable if another confirmed or held booking has one of the seats.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def confirm(self, booking_ids: Sequence[str]) -> bool:
+        """Turn held bookings into confirmed ones, all or none; False if any is no longer held"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def cancel(self, booking_id: str, flight_id: str, seats: int = 1) -> Optional[int]:
+        """Mark a booking cancelled and return its seats atomically"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def expire_hold(self, booking_id: str, flight_id: str, seats: int = 1) -> Optional[int]:
+        """Like cancel, but only while the booking is still held; None once it was confirmed or cancelled"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_booking(self, booking_id: str) -> Optional[Tuple]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def reserve_ids(self, name: str, count: int, minimum: int = 0) -> int:
+        """Reserve `count` numbers of a named sequence, all above `minimum`.
+
+        Returns the last reserved number; the block is (last - count, last].
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_bookings_by_email(self, passenger_email: str) -> List[Tuple]:
+        """Bookings whose normalized email matches, ordered by (booking_date, id)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def taken_seats(self, flight_id: str) -> List[str]:
+        """Seat numbers of every confirmed or held booking on a flight"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def available_seats(self, flight_id: str) -> Optional[int]:
+        """A flight's seat count as recorded by the store, or None if unknown"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS flights (
+    id TEXT PRIMARY KEY,
+    airline TEXT NOT NULL,
+    flight_number TEXT NOT NULL,
+    departure_airport TEXT NOT NULL,
+    arrival_airport TEXT NOT NULL,
+    departure_time TEXT NOT NULL,
+    arrival_time TEXT NOT NULL,
+    duration TEXT NOT NULL,
+    price REAL NOT NULL,
+    available_seats INTEGER NOT NULL,
+    aircraft_type TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS flights_route_date
+    ON flights (departure_airport, arrival_airport, departure_time);
+
+CREATE TABLE IF NOT EXISTS bookings (
+    id TEXT PRIMARY KEY,
+    flight_id TEXT NOT NULL REFERENCES flights (id),
+    passenger_name TEXT NOT NULL,
+    passenger_email TEXT NOT NULL,
+    seat_number TEXT NOT NULL,
+    booking_date TEXT NOT NULL,
+    status TEXT NOT NULL,
+    total_price REAL NOT NULL
+) WITHOUT ROWID;
+-- Matches normalize_email() for ASCII addresses; SQLite's lower() leaves other letters alone
+DROP INDEX IF EXISTS bookings_passenger_email;
+CREATE INDEX IF NOT EXISTS bookings_email_key ON bookings (lower(trim(passenger_email)), booking_date, id);
+CREATE INDEX IF NOT EXISTS bookings_flight ON bookings (flight_id);
+
+CREATE TABLE IF NOT EXISTS sequences (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+# One confirmed or held booking per seat, even across processes sharing the file
+SEAT_INDEX = (
+    "CREATE UNIQUE INDEX IF NOT EXISTS bookings_active_seat "
+    "ON bookings (flight_id, seat_number) WHERE status IN ('confirmed', 'held')"
+)
+
+# Statements are fixed strings with parameters, so sqlite3's per-connection
+# statement cache compiles each one once and reuses it
+INSERT_FLIGHT = f"INSERT INTO flights ({', '.join(FLIGHT_COLUMNS)}) VALUES ({', '.join('?' * len(FLIGHT_COLUMNS))})"
+INSERT_BOOKING = f"INSERT INTO bookings ({', '.join(BOOKING_COLUMNS)}) VALUES ({', '.join('?' * len(BOOKING_COLUMNS))})"
+SELECT_FLIGHTS = f"SELECT {', '.join(FLIGHT_COLUMNS)} FROM flights"
+SELECT_SEAT_COUNTS = "SELECT id, available_seats FROM flights"
+SELECT_SEAT_COUNT = "SELECT available_seats FROM flights WHERE id = ?"
+SELECT_BOOKINGS = f"SELECT {', '.join(BOOKING_COLUMNS)} FROM bookings"
+SELECT_BOOKING = f"{SELECT_BOOKINGS} WHERE id = ?"
+SELECT_BOOKINGS_BY_EMAIL = f"{SELECT_BOOKINGS} WHERE lower(trim(passenger_email)) = ? ORDER BY booking_date, id"
+SELECT_TAKEN_SEATS = "SELECT seat_number FROM bookings WHERE flight_id = ? AND status IN ('confirmed', 'held')"
+TAKE_SEATS = (
+    "UPDATE flights SET available_seats = available_seats - ? "
+    "WHERE id = ? AND available_seats >= ? RETURNING available_seats"
+)
+RETURN_SEATS = "UPDATE flights SET available_seats = available_seats + ? WHERE id = ? RETURNING available_seats"
+RESERVE_IDS = (
+    "INSERT INTO sequences (name, value) VALUES (?1, ?2 + ?3) "
+    "ON CONFLICT (name) DO UPDATE SET value = MAX(value, ?2) + ?3 RETURNING value"
+)
+CANCEL_BOOKING = "UPDATE bookings SET status = 'cancelled' WHERE id = ? AND status != 'cancelled'"
+CONFIRM_BOOKING = "UPDATE bookings SET status = 'confirmed' WHERE id = ? AND status = 'held'"
+EXPIRE_HOLD = "UPDATE bookings SET status = 'cancelled' WHERE id = ? AND status = 'held'"
+
+
+class SQLiteStore(FlightStore):
+    """SQLite (WAL) implementation of FlightStore"""
+
+    def __init__(self, path: str, readers: int = 4):
+        self.path = path
+        self._write_lock = threading.Lock()
+        self._writer = self._connect()
+        self._writer.executescript(SCHEMA)
+        try:
+            self._writer.execute(SEAT_INDEX)
+        except sqlite3.IntegrityError:
+            pass  # databases from before seat maps may hold duplicate seats
+        self._readers: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        for _ in range(readers):
+            self._readers.put(self._connect())
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None: transactions are opened explicitly with BEGIN IMMEDIATE
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Serialized write transaction on the writer connection"""
+        with self._write_lock:
+            self._writer.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._writer
+            except BaseException:
+                self._writer.execute("ROLLBACK")
+                raise
+            self._writer.execute("COMMIT")
+
+    @contextmanager
+    def _reader(self) -> Iterator[sqlite3.Connection]:
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    def has_flights(self) -> bool:
+        with self._reader() as conn:
+            return conn.execute("SELECT 1 FROM flights LIMIT 1").fetchone() is not None
+
+    def seed_flights(self, flights: Iterable[Sequence[Any]]) -> bool:
+        with self._transaction() as conn:
+            if conn.execute("SELECT 1 FROM flights LIMIT 1").fetchone() is not None:
+                return False
+            conn.executemany(INSERT_FLIGHT, flights)
+        return True
+
+    def load_flights(self) -> Iterator[Tuple]:
+        with self._reader() as conn:
+            yield from conn.execute(SELECT_FLIGHTS)
+
+    def load_seat_counts(self) -> Iterator[Tuple[str, int]]:
+        with self._reader() as conn:
+            yield from conn.execute(SELECT_SEAT_COUNTS)
+
+    def load_bookings(self) -> Iterator[Tuple]:
+        with self._reader() as conn:
+            yield from conn.execute(SELECT_BOOKINGS)
+
+    def _book(self, bookings: Sequence[Any]) -> Optional[int]:
+        seats = len(bookings)
+        with self._transaction() as conn:
+            row = conn.execute(TAKE_SEATS, (seats, bookings[0].flight_id, seats)).fetchone()
+            if row is None:
+                return None
+            try:
+                conn.executemany(
+                    INSERT_BOOKING,
+                    [tuple(getattr(booking, column) for column in BOOKING_COLUMNS) for booking in bookings]
+                )
+            except sqlite3.IntegrityError as e:
+                if "seat_number" in str(e):
+                    raise SeatUnavailable(bookings[0].flight_id) from e
+                raise
+            return row[0]
+
+    def _cancel(self, booking_id: str, flight_id: str, seats: int, statement: str = CANCEL_BOOKING) -> Optional[int]:
+        with self._transaction() as conn:
+            if conn.execute(statement, (booking_id,)).rowcount == 0:
+                return None
+            row = conn.execute(RETURN_SEATS, (seats, flight_id)).fetchone()
+            return row[0] if row else None
+
+    def _confirm(self, booking_ids: Sequence[str]) -> bool:
+        try:
+            with self._transaction() as conn:
+                for booking_id in booking_ids:
+                    if conn.execute(CONFIRM_BOOKING, (booking_id,)).rowcount == 0:
+                        raise LookupError(booking_id)
+        except LookupError:
+            return False  # rolled back: one of them expired or was cancelled
+        return True
+
+    def _reserve_ids(self, name: str, count: int, minimum: int) -> int:
+        with self._transaction() as conn:
+            return conn.execute(RESERVE_IDS, (name, minimum, count)).fetchone()[0]
+
+    def _get_booking(self, booking_id: str) -> Optional[Tuple]:
+        with self._reader() as conn:
+            return conn.execute(SELECT_BOOKING, (booking_id,)).fetchone()
+
+    def _get_bookings_by_email(self, passenger_email: str) -> List[Tuple]:
+        with self._reader() as conn:
+            return conn.execute(SELECT_BOOKINGS_BY_EMAIL, (normalize_email(passenger_email),)).fetchall()
+
+    def _taken_seats(self, flight_id: str) -> List[str]:
+        with self._reader() as conn:
+            return [row[0] for row in conn.execute(SELECT_TAKEN_SEATS, (flight_id,))]
+
+    def _available_seats(self, flight_id: str) -> Optional[int]:
+        with self._reader() as conn:
+            row = conn.execute(SELECT_SEAT_COUNT, (flight_id,)).fetchone()
+            return row[0] if row else None
+
+    async def book(self, bookings: Sequence[Any]) -> Optional[int]:
+        return await asyncio.to_thread(self._book, bookings)
+
+    async def cancel(self, booking_id: str, flight_id: str, seats: int = 1) -> Optional[int]:
+        return await asyncio.to_thread(self._cancel, booking_id, flight_id, seats)
+
+    async def expire_hold(self, booking_id: str, flight_id: str, seats: int = 1) -> Optional[int]:
+        return await asyncio.to_thread(self._cancel, booking_id, flight_id, seats, EXPIRE_HOLD)
+
+    async def confirm(self, booking_ids: Sequence[str]) -> bool:
+        return await asyncio.to_thread(self._confirm, booking_ids)
+
+    async def reserve_ids(self, name: str, count: int, minimum: int = 0) -> int:
+        return await asyncio.to_thread(self._reserve_ids, name, count, minimum)
+
+    async def get_booking(self, booking_id: str) -> Optional[Tuple]:
+        return await asyncio.to_thread(self._get_booking, booking_id)
+
+    async def get_bookings_by_email(self, passenger_email: str) -> List[Tuple]:
+        return await asyncio.to_thread(self._get_bookings_by_email, passenger_email)
+
+    async def taken_seats(self, flight_id: str) -> List[str]:
+        return await asyncio.to_thread(self._taken_seats, flight_id)
+
+    async def available_seats(self, flight_id: str) -> Optional[int]:
+        return await asyncio.to_thread(self._available_seats, flight_id)
+
+    def close(self):
+        self._writer.close()
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
@@ -7,7 +7,10 @@ Uses HTTP transport instead of stdio to avoid connection issues
 import asyncio
 import aiohttp
 import json
-from typing import Dict, Any
+from typing import Dict, Any, Tuple
+
+# Tools the REST API serves with GET (cacheable reference data)
+GET_TOOLS = {"list_airports", "list_airlines"}
 
 class HTTPMCPClient:
     """HTTP-based MCP client"""
@@ -15,6 +18,8 @@ class HTTPMCPClient:
     def __init__(self, base_url: str = "http://localhost:8000"):
         self.base_url = base_url
         self.session = None
+        # url -> (ETag, parsed body) for conditional GET requests
+        self._etag_cache: Dict[str, Tuple[str, Dict[str, Any]]] = {}
     
     async def __aenter__(self):
         self.session = aiohttp.ClientSession()
@@ -24,28 +29,47 @@ class HTTPMCPClient:
         if self.session:
             await self.session.close()
     
-    async def call_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
-        """Call a tool via HTTP"""
-        url = f"{self.base_url}/tools/{tool_name}"
+    async def get(self, path: str) -> Dict[str, Any]:
+        """GET an endpoint, revalidating a cached copy with If-None-Match.
         
-        async with self.session.post(url, json=arguments) as response:
+        A 304 answer reuses the cached body, so unchanged data costs no
+        response body and no JSON parsing.
+        """
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        cached = self._etag_cache.get(url)
+        headers = {"If-None-Match": cached[0]} if cached else {}
+        
+        async with self.session.get(url, headers=headers) as response:
+            if response.status == 304 and cached:
+                return cached[1]
             if response.status == 200:
-                return await response.json()
+                body = await response.json()
+                etag = response.headers.get("ETag")
+                if etag:
+                    self._etag_cache[url] = (etag, body)
+                return body
             else:
                 error_text = await response.text()
                 return {"error": f"HTTP {response.status}: {error_text}"}
     
-    async def read_resource(self, uri: str) -> Dict[str, Any]:
-        """Read a resource via HTTP"""
-        url = f"{self.base_url}/resources/{uri}"
+    async def call_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """Call a tool via HTTP"""
+        if tool_name in GET_TOOLS:
+            return await self.get(f"tools/{tool_name}")
+        
+        url = f"{self.base_url}/tools/{tool_name}"
         
-        async with self.session.get(url) as response:
+        async with self.session.post(url, json=arguments) as response:
             if response.status == 200:
                 return await response.json()
             else:
                 error_text = await response.text()
                 return {"error": f"HTTP {response.status}: {error_text}"}
     
+    async def read_resource(self, uri: str) -> Dict[str, Any]:
+        """Read a resource via HTTP (flight://status/FL001 -> /resources/flight/status/FL001)"""
+        return await self.get(f"resources/{uri.replace('://', '/', 1)}")
+    
     async def get_prompt(self, prompt_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
         """Get a prompt via HTTP"""
         url = f"{self.base_url}/prompts/{prompt_name}"
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Idempotency Keys
+
+Remembers the result of every call made with an idempotency key, so a
+client that timed out, retried or sent a hedged duplicate gets the
+original result instead of a second booking.
+
+- A duplicate arriving while the first call is still running waits for
+  that call instead of starting another one
+- Finished results are kept for a time-to-live, up to a maximum number
+  of keys; entries live in insertion order, which is also expiry order,
+  so expiring and evicting only ever look at the oldest entry
+- Reusing a key for a different request is refused rather than answered
+  with an unrelated result
+- Calls that raise are not remembered, so they can be retried; if the
+  original call is cancelled, a duplicate waiting for it runs the call
+  itself
+
+Keys live in the memory of one server process.
+"""
+
+import asyncio
+import functools
+import inspect
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class IdempotencyConflict(ValueError):
+    """An idempotency key was reused for a different request"""
+
+
+class IdempotencyStore:
+    """Bounded, expiring map from idempotency key to result"""
+
+    def __init__(self, max_entries: int = 100_000, ttl: float = 24 * 3600, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        # key -> (expires_at, fingerprint, result), oldest first
+        self._results: "OrderedDict[Hashable, Tuple[float, str, Any]]" = OrderedDict()
+        # key -> (fingerprint, future of the call in progress)
+        self._running: Dict[Hashable, Tuple[str, asyncio.Future]] = {}
+        self.replays = 0
+        self.conflicts = 0
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def _expire(self, now: float):
+        while self._results:
+            key, (expires_at, _, _) = next(iter(self._results.items()))
+            if expires_at > now:
+                break
+            del self._results[key]
+
+    async def run(self, key: Hashable, fingerprint: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Result of call(), run at most once per key while the key is remembered"""
+        while True:
+            now = self._clock()
+            self._expire(now)
+            entry = self._results.get(key)
+            if entry is not None:
+                if entry[1] != fingerprint:
+                    self.conflicts += 1
+                    raise IdempotencyConflict(key)
+                self.replays += 1
+                return entry[2]
+            running = self._running.get(key)
+            if running is None:
+                break
+            if running[0] != fingerprint:
+                self.conflicts += 1
+                raise IdempotencyConflict(key)
+            try:
+                # shield: a duplicate giving up must not cancel the original call
+                result = await asyncio.shield(running[1])
+            except asyncio.CancelledError:
+                if not running[1].cancelled():
+                    raise  # this duplicate was cancelled itself
+                # The original call was cancelled and its key dropped; run it again
+                continue
+            self.replays += 1
+            return result
+
+        future = asyncio.get_running_loop().create_future()
+        self._running[key] = (fingerprint, future)
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Retrieved here so an exception nobody waited for is not logged
+            future.exception()
+            raise
+        finally:
+            del self._running[key]
+        future.set_result(result)
+        self._results[key] = (self._clock() + self.ttl, fingerprint, result)
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "keys": len(self._results),
+            "in_progress": len(self._running),
+            "max_keys": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "replays": self.replays,
+            "conflicts": self.conflicts,
+        }
+
+
+def idempotent(store: IdempotencyStore, scope: str):
+    """Make a tool honour its `idempotency_key` argument.
+
+    The other arguments form the request fingerprint. Calls without a key
+    run as before; a key reused with different arguments gets an error.
+    """
+    def decorator(fn: Callable[..., Awaitable[Dict[str, Any]]]):
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs) -> Dict[str, Any]:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            key = arguments.pop("idempotency_key", None)
+            if not key:
+                return await fn(*args, **kwargs)
+            fingerprint = json.dumps(arguments, sort_keys=True, default=str)
+            try:
+                return await store.run((scope, key), fingerprint, lambda: fn(*args, **kwargs))
+            except IdempotencyConflict:
+                return {"error": f"Idempotency key {key} was already used for a different {scope} request"}
+
+        return wrapper
+
+    return decorator
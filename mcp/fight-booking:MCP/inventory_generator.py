@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Synthetic Flight Inventory Generator
+
+Seeded, repeatable flight data from 10^3 up to 10^8 flights. Output is
+produced in fixed-size batches so callers can stream it straight into a
+store instead of holding the whole inventory twice.
+
+- generate_column_batches(): vectorized NumPy batches in the column layout
+  used by ColumnarInventory (requires numpy)
+- generate_flight_records(): pure-Python dicts of Flight fields
+
+Each generator is deterministic: the same seed, batch_size and options
+always produce the same flights (the two generators do not produce the
+same flights as each other). Route popularity follows a Zipf curve over a
+seeded route ranking, and departure days follow weekday weights.
+"""
+
+import random
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # only generate_column_batches needs numpy
+    np = None
+
+AIRCRAFT_TYPES = ["Boeing 737", "Airbus A320", "Boeing 777", "Airbus A350"]
+FLIGHT_NUMBER_PREFIXES = ["AA", "DL", "UA", "BA", "AF"]
+
+# Relative traffic Monday..Sunday: Friday and Sunday are the busiest
+DEFAULT_WEEKDAY_WEIGHTS = (1.0, 0.9, 0.9, 1.0, 1.3, 1.0, 1.2)
+
+DEFAULT_BATCH_SIZE = 100_000
+
+
+def _routes(airports: Sequence[str]) -> List[Tuple[str, str]]:
+    return [(dep, arr) for dep in airports for arr in airports if dep != arr]
+
+
+def _route_weights(
+    routes: List[Tuple[str, str]],
+    seed: int,
+    route_skew: float,
+    route_weights: Optional[Mapping[Tuple[str, str], float]],
+) -> List[float]:
+    """Popularity per route: explicit weights, else Zipf over a seeded ranking"""
+    if route_weights is not None:
+        return [float(route_weights.get(route, 0.0)) for route in routes]
+    ranking = list(range(len(routes)))
+    random.Random(seed).shuffle(ranking)
+    weights = [0.0] * len(routes)
+    for rank, index in enumerate(ranking, start=1):
+        weights[index] = 1.0 / rank ** route_skew
+    return weights
+
+
+def _day_weights(start: date, days: int, weekday_weights: Sequence[float]) -> List[float]:
+    return [weekday_weights[(start + timedelta(days=d)).weekday()] for d in range(days)]
+
+
+def _start_epoch(start_date: Optional[str]) -> Tuple[date, int]:
+    """Midnight (UTC) of the first generated day, tomorrow by default"""
+    if start_date:
+        start = datetime.strptime(start_date, "%Y-%m-%d").date()
+    else:
+        start = date.today() + timedelta(days=1)
+    midnight = datetime(start.year, start.month, start.day, tzinfo=timezone.utc)
+    return start, int(midnight.timestamp())
+
+
+def _id_width(count: int) -> int:
+    return max(3, len(str(count)))
+
+
+def generate_column_batches(
+    count: int,
+    airports: Sequence[str],
+    airlines: Sequence[str],
+    seed: int = 0,
+    start_date: Optional[str] = None,
+    days: int = 31,
+    route_skew: float = 1.0,
+    route_weights: Optional[Mapping[Tuple[str, str], float]] = None,
+    weekday_weights: Sequence[float] = DEFAULT_WEEKDAY_WEIGHTS,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Iterator[Dict[str, Any]]:
+    """Yield batches of flight columns, vectorized with NumPy.
+
+    Each batch maps ColumnarInventory column names to arrays. Airport,
+    airline and aircraft columns hold indexes into ``airports``,
+    ``airlines`` and AIRCRAFT_TYPES.
+    """
+    if np is None:
+        raise RuntimeError("generate_column_batches requires numpy")
+    routes = _routes(airports)
+    airport_index = {code: i for i, code in enumerate(airports)}
+    route_dep = np.array([airport_index[dep] for dep, _ in routes], dtype=np.uint16)
+    route_arr = np.array([airport_index[arr] for _, arr in routes], dtype=np.uint16)
+    route_p = np.array(_route_weights(routes, seed, route_skew, route_weights))
+    route_p /= route_p.sum()
+
+    start, base_ts = _start_epoch(start_date)
+    day_p = np.array(_day_weights(start, days, weekday_weights))
+    day_p /= day_p.sum()
+    prefixes = np.array(FLIGHT_NUMBER_PREFIXES, dtype="S2")
+    width = _id_width(count)
+
+    # One child stream per batch keeps the output independent of how far
+    # a consumer has read and lets batches be regenerated on their own
+    streams = np.random.SeedSequence(seed).spawn((count + batch_size - 1) // batch_size)
+    for batch, stream in enumerate(streams):
+        rng = np.random.default_rng(stream)
+        first = batch * batch_size
+        n = min(batch_size, count - first)
+
+        route = rng.choice(len(routes), size=n, p=route_p)
+        departure_ts = (
+            base_ts
+            + rng.choice(days, size=n, p=day_p).astype(np.int64) * 86400
+            + rng.integers(6, 23, size=n, dtype=np.int64) * 3600
+            + rng.integers(0, 4, size=n, dtype=np.int64) * 900
+        )
+        duration_hours = rng.integers(1, 13, size=n, dtype=np.int64)
+        numbers = rng.integers(100, 10000, size=n).astype("S4")
+
+        yield {
+            "ids": np.char.add(b"FL", np.char.zfill(np.arange(first + 1, first + n + 1).astype("S"), width)),
+            "flight_numbers": np.char.add(prefixes[rng.integers(0, len(prefixes), size=n)], numbers),
+            "departure_codes": route_dep[route],
+            "arrival_codes": route_arr[route],
+            "airline_codes": rng.integers(0, len(airlines), size=n).astype(np.uint16),
+            "aircraft_codes": rng.integers(0, len(AIRCRAFT_TYPES), size=n).astype(np.uint16),
+            "departure_ts": departure_ts,
+            "arrival_ts": departure_ts + duration_hours * 3600,
+            "duration_minutes": (duration_hours * 60 + rng.integers(0, 60, size=n)).astype(np.uint16),
+            "prices": np.round(rng.uniform(200, 2000, size=n), 2).astype(np.float32),
+            "seats": rng.integers(5, 201, size=n).astype(np.int32),
+        }
+
+
+def generate_flight_records(
+    count: int,
+    airports: Sequence[str],
+    airlines: Sequence[str],
+    seed: int = 0,
+    start_date: Optional[str] = None,
+    days: int = 31,
+    route_skew: float = 1.0,
+    route_weights: Optional[Mapping[Tuple[str, str], float]] = None,
+    weekday_weights: Sequence[float] = DEFAULT_WEEKDAY_WEIGHTS,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Iterator[List[Dict[str, Any]]]:
+    """Yield batches of Flight keyword arguments using only the standard library"""
+    routes = _routes(airports)
+    weights = _route_weights(routes, seed, route_skew, route_weights)
+    start, _ = _start_epoch(start_date)
+    day_weights = _day_weights(start, days, weekday_weights)
+    base = datetime(start.year, start.month, start.day)
+    width = _id_width(count)
+
+    for batch, first in enumerate(range(0, count, batch_size)):
+        rng = random.Random(f"{seed}:{batch}")
+        n = min(batch_size, count - first)
+        chosen_routes = rng.choices(routes, weights=weights, k=n)
+        chosen_days = rng.choices(range(days), weights=day_weights, k=n)
+        records = []
+        for i, ((dep, arr), day) in enumerate(zip(chosen_routes, chosen_days)):
+            departure_time = base + timedelta(
+                days=day, hours=rng.randint(6, 22), minutes=rng.choice([0, 15, 30, 45])
+            )
+            duration_hours = rng.randint(1, 12)
+            arrival_time = departure_time + timedelta(hours=duration_hours)
+            records.append({
+                "id": f"FL{first + i + 1:0{width}d}",
+                "airline": rng.choice(airlines),
+                "flight_number": f"{rng.choice(FLIGHT_NUMBER_PREFIXES)}{rng.randint(100, 9999)}",
+                "departure_airport": dep,
+                "arrival_airport": arr,
+                "departure_time": departure_time.strftime("%Y-%m-%d %H:%M"),
+                "arrival_time": arrival_time.strftime("%Y-%m-%d %H:%M"),
+                "duration": f"{duration_hours}h {rng.randint(0, 59)}m",
+                "price": round(rng.uniform(200, 2000), 2),
+                "available_seats": rng.randint(5, 200),
+                "aircraft_type": rng.choice(AIRCRAFT_TYPES),
+            })
+        yield records
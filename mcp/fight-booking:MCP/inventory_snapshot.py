@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Memory-Mapped Inventory Snapshots
+
+Binary snapshot of a ColumnarInventory that worker processes can map
+instead of regenerating or reloading the inventory. Every column is a
+fixed-width array, stored already sorted by route together with the
+route, id and airport indexes, so opening a snapshot only parses a small
+header: pages are read on demand and shared through the OS page cache.
+
+File layout:
+
+- 8-byte magic, then the header length as a little-endian uint64
+- JSON header: row count, airport/airline/aircraft labels and, for each
+  array, its dtype, shape and offset from the start of the data section
+- data section, every array aligned to 64 bytes
+
+The mapping is copy-on-write: seat counts changed by bookings stay private
+to the process (the persistent store is what shares them), while untouched
+pages stay shared.
+"""
+
+import json
+import mmap
+import os
+import struct
+from typing import Any, Dict, Tuple
+
+import numpy as np
+
+from columnar_inventory import ARRAYS, ColumnarInventory
+
+MAGIC = b"FLTSNAP1"
+ALIGNMENT = 64
+_PREFIX = struct.Struct("<8sQ")
+
+# The only array bookings write to; every other array is mapped read-only
+WRITABLE_ARRAYS = {"seats"}
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _data_start(header: bytes) -> int:
+    return _align(_PREFIX.size + len(header))
+
+
+def write_snapshot(inventory: ColumnarInventory, path: str):
+    """Write a snapshot atomically: readers see the old file or the complete new one"""
+    arrays = {name: np.ascontiguousarray(values) for name, values in inventory.arrays().items()}
+    layout = []
+    offset = 0
+    for name in ARRAYS:
+        values = arrays[name]
+        layout.append({"name": name, "dtype": values.dtype.str, "shape": list(values.shape), "offset": offset})
+        offset = _align(offset + values.nbytes)
+    header = json.dumps({
+        "rows": len(inventory),
+        "airports": inventory.airports,
+        "airlines": inventory.airlines,
+        "aircraft_types": inventory.aircraft_types,
+        "arrays": layout,
+    }).encode()
+    start = _data_start(header)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(_PREFIX.pack(MAGIC, len(header)))
+            f.write(header)
+            for entry in layout:
+                f.seek(start + entry["offset"])
+                f.write(arrays[entry["name"]].data)
+            f.truncate(start + offset)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _read_header(buffer: mmap.mmap) -> Tuple[Dict[str, Any], int]:
+    if len(buffer) < _PREFIX.size:
+        raise ValueError("Not a flight inventory snapshot")
+    magic, length = _PREFIX.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ValueError("Not a flight inventory snapshot")
+    header = bytes(buffer[_PREFIX.size:_PREFIX.size + length])
+    return json.loads(header), _data_start(header)
+
+
+def open_snapshot(path: str, flight_cls: type) -> ColumnarInventory:
+    """Map a snapshot written by write_snapshot() as a ColumnarInventory"""
+    with open(path, "rb") as f:
+        # The mapping outlives the file object; the arrays keep it alive
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    meta, start = _read_header(buffer)
+
+    arrays = {}
+    for entry in meta["arrays"]:
+        dtype = np.dtype(entry["dtype"])
+        count = int(np.prod(entry["shape"], dtype=np.int64))
+        values = np.frombuffer(buffer, dtype=dtype, count=count, offset=start + entry["offset"])
+        values = values.reshape(entry["shape"])
+        values.flags.writeable = entry["name"] in WRITABLE_ARRAYS
+        arrays[entry["name"]] = values
+    missing = set(ARRAYS) - set(arrays)
+    if missing:
+        raise ValueError(f"Snapshot is missing arrays: {', '.join(sorted(missing))}")
+
+    return ColumnarInventory.from_arrays(
+        arrays, meta["airports"], meta["airlines"], meta["aircraft_types"], flight_cls
+    )
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Connecting Itinerary Search
+
+Finds the k best multi-leg itineraries over a time-expanded flight graph.
+The graph is never materialized: each expansion asks the inventory for the
+departures leaving an airport inside the connection window, which the
+inventory answers by bisecting a per-airport timeline.
+
+Legs can be any object exposing id, arrival_airport, departure_ts,
+arrival_ts and price (Flight objects, or lightweight columnar rows).
+Once k itineraries are known, each expansion passes the inventory a price
+or arrival bound, so legs that cannot beat the k-th best are filtered out
+before any leg is built.
+"""
+
+import heapq
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+# departures(airport, start_ts, end_ts, arrival_airport, min_seats, max_price, max_arrival, order_by)
+# -> legs sorted by order_by ("price" or "arrival"). The bounds are optional
+# filters; returning a few legs beyond them is harmless. The search stops
+# reading legs early, so an inventory may build them lazily.
+DeparturesFn = Callable[
+    [str, int, int, Optional[str], int, Optional[float], Optional[int], str], Iterable[Any]
+]
+
+SORT_KEYS = ("price", "duration")
+
+
+def _price(path: List[Any]) -> float:
+    return sum(leg.price for leg in path)
+
+
+def _duration(path: List[Any]) -> int:
+    return path[-1].arrival_ts - path[0].departure_ts
+
+
+def search_itineraries(
+    departures: DeparturesFn,
+    origin: str,
+    destination: str,
+    start_ts: int,
+    end_ts: int,
+    max_stops: int = 1,
+    min_connection: int = 45 * 60,
+    max_connection: int = 6 * 3600,
+    sort_by: str = "price",
+    limit: int = 5,
+    min_seats: int = 1,
+) -> List[List[Any]]:
+    """Best itineraries from origin to destination, first leg departing in [start_ts, end_ts).
+
+    Connections must leave between min_connection and max_connection
+    seconds after the previous leg lands. Itineraries never revisit an
+    airport. Results are ordered by total price or total duration
+    (the other one breaks ties).
+    """
+    if sort_by not in SORT_KEYS:
+        raise ValueError(f"sort_by must be one of {', '.join(SORT_KEYS)}")
+    if limit <= 0:
+        return []
+
+    primary, secondary = (_price, _duration) if sort_by == "price" else (_duration, _price)
+    leg_order = "price" if sort_by == "price" else "arrival"
+    # Max-heap of the best `limit` itineraries seen so far: (-primary, -secondary, seq, path)
+    best: List[Tuple[float, float, int, List[Any]]] = []
+    seq = 0
+
+    def worst_primary() -> Optional[float]:
+        return -best[0][0] if len(best) >= limit else None
+
+    def leg_bounds(path: List[Any]) -> Tuple[Optional[float], Optional[int]]:
+        """(max price, latest arrival) of a next leg that can still make the k best"""
+        bound = worst_primary()
+        if bound is None:
+            return None, None
+        if sort_by == "price":
+            # A cent of slack: rounding in the inventory must never drop a leg at the bound
+            return bound - _price(path) + 0.01, None
+        # Duration is measured from the first departure, so it caps every later arrival
+        return None, path[0].departure_ts + bound
+
+    def record(path: List[Any]):
+        nonlocal seq
+        entry = (-primary(path), -secondary(path), seq, path)
+        seq += 1
+        if len(best) < limit:
+            heapq.heappush(best, entry)
+        elif entry > best[0]:
+            heapq.heapreplace(best, entry)
+
+    def extend(path: List[Any], visited: set):
+        last = path[-1]
+        stops_left = max_stops - (len(path) - 1)
+        window_start = last.arrival_ts + min_connection
+        window_end = last.arrival_ts + max_connection + 1
+        # On the final hop only legs into the destination can complete the trip
+        arrival = destination if stops_left == 1 else None
+        max_price, max_arrival = leg_bounds(path)
+        if max_arrival is not None:
+            # A leg leaves before it lands, so the arrival bound also ends the window
+            window_end = min(window_end, max_arrival)
+            if window_end <= window_start:
+                return
+        legs = departures(
+            last.arrival_airport, window_start, window_end, arrival, min_seats, max_price, max_arrival, leg_order
+        )
+        for leg in legs:
+            if leg.arrival_airport in visited:
+                continue
+            candidate = path + [leg]
+            # Both price and duration only grow as legs are added, so a partial
+            # itinerary already worse than the k-th best can be dropped. Legs
+            # are visited in leg_order, so every later leg is worse as well.
+            bound = worst_primary()
+            if bound is not None and primary(candidate) > bound:
+                break
+            if leg.arrival_airport == destination:
+                record(candidate)
+            elif stops_left > 1:
+                extend(candidate, visited | {leg.arrival_airport})
+
+    # Expanding the most promising legs first fills the result heap early,
+    # which lets the bound prune most of the remaining fan-out
+    first_legs = departures(
+        origin, start_ts, end_ts, destination if max_stops == 0 else None, min_seats, None, None, leg_order
+    )
+    for first in first_legs:
+        if first.arrival_airport == destination:
+            record([first])
+        elif max_stops > 0 and first.arrival_airport != origin:
+            bound = worst_primary()
+            if bound is not None and primary([first]) > bound:
+                continue
+            extend([first], {origin, first.arrival_airport})
+
+    return [entry[3] for entry in sorted(best, reverse=True)]
@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""
+Write-Ahead Booking Journal
+
+FlightStore that keeps its state in memory and makes every change durable
+by appending it to an append-only journal file, for a single server
+process that wants durability without a database.
+
+Only bookings are journaled, never the inventory: the journal names the
+generated inventory it was written against (its seed and size), and every
+booking or cancellation records the resulting seat count of its flight.
+Replay rebuilds those counts, so memory, replay and compaction grow with
+the flights actually booked, not with the size of the inventory.
+
+- Every book/cancel is applied in memory, encoded as a binary record and
+  queued; the caller is answered once its record is on disk.
+- Group commit: a background thread writes everything queued during one
+  sync interval and covers it with a single fsync, so throughput is bound
+  by how many bookings arrive per interval, not by fsync latency.
+- Records are framed with their length and a CRC32. On startup the
+  journal is replayed; a torn record left by a crash (kill -9, power
+  loss) ends the replay and is cut off.
+- Compaction: once the records appended since the last compaction
+  outgrow the compacted state, the current state is written to a new
+  journal that atomically replaces the old one, so recovery time stays
+  proportional to the state rather than to its history.
+
+Record layout: uint32 payload length, uint32 CRC32 of kind + payload,
+uint8 kind, then a compact JSON payload.
+"""
+
+import asyncio
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from flight_store import BOOKING_COLUMNS, FlightStore, SeatUnavailable, normalize_email
+
+try:
+    import fcntl
+except ImportError:  # Windows: nothing stops two processes from sharing a journal
+    fcntl = None
+
+MAGIC = b"FLTJRNL2"
+OLD_MAGIC = b"FLTJRNL1"
+_RECORD = struct.Struct("<IIB")
+
+# Record kinds
+INVENTORY = 1  # {...}: description of the inventory, as passed to record_inventory
+BOOKINGS = 2   # [booking row, ...]: booking rows as they stand (compaction only)
+BOOK = 3       # [seats left, [booking row, ...]]: new bookings on one flight
+CANCEL = 4     # [booking_id, flight_id, seats left]
+SEQUENCE = 5   # [name, value]
+CONFIRM = 6    # [booking_id, ...]: held bookings becoming confirmed
+SEATS = 7      # [[flight_id, seats left], ...]: seat counts of booked flights (compaction only)
+
+BOOKING_FLIGHT = BOOKING_COLUMNS.index("flight_id")
+BOOKING_EMAIL = BOOKING_COLUMNS.index("passenger_email")
+BOOKING_DATE = BOOKING_COLUMNS.index("booking_date")
+BOOKING_SEAT = BOOKING_COLUMNS.index("seat_number")
+BOOKING_STATUS = BOOKING_COLUMNS.index("status")
+
+# Statuses that keep a seat taken
+ACTIVE = ("confirmed", "held")
+
+# Rows per BOOKINGS/SEATS record when compacting
+CHUNK_ROWS = 10_000
+
+
+def _encode(kind: int, payload: Any) -> bytes:
+    body = json.dumps(payload, separators=(",", ":")).encode()
+    return _RECORD.pack(len(body), zlib.crc32(body, zlib.crc32(bytes((kind,)))), kind) + body
+
+
+def _chunks(rows: List[Any]) -> Iterator[List[Any]]:
+    for start in range(0, len(rows), CHUNK_ROWS):
+        yield rows[start:start + CHUNK_ROWS]
+
+
+def _state_records(state: Tuple[Any, ...]) -> List[bytes]:
+    """Encode a state snapshot as records, for compaction"""
+    inventory, seats, bookings, sequences = state
+    records = [_encode(INVENTORY, inventory)] if inventory is not None else []
+    records += [_encode(SEATS, rows) for rows in _chunks(seats)]
+    records += [_encode(BOOKINGS, rows) for rows in _chunks(bookings)]
+    records += [_encode(SEQUENCE, [name, value]) for name, value in sequences]
+    return records
+
+
+class JournalStore(FlightStore):
+    """In-memory FlightStore made durable by a group-committed journal.
+
+    The server supplies the inventory: `inventory_seats` gives the seat
+    count of a flight the journal has not seen yet, or None if there is no
+    such flight.
+    """
+
+    keeps_inventory = False
+
+    def __init__(
+        self,
+        path: str,
+        sync_interval: float = 0.002,
+        compact_bytes: int = 64 * 1024 * 1024,
+        inventory_seats: Optional[Callable[[str], Optional[int]]] = None,
+    ):
+        self.path = path
+        self.sync_interval = sync_interval
+        self.compact_bytes = compact_bytes
+        self.inventory_seats = inventory_seats
+        self._lock = threading.Lock()
+        self.inventory: Optional[Dict[str, Any]] = None
+        # flight_id -> seats left, for flights with bookings only
+        self._seats: Dict[str, int] = {}
+        self._bookings: Dict[str, list] = {}
+        self._by_email: Dict[str, List[str]] = {}
+        self._taken: Dict[str, set] = {}
+        self._sequences: Dict[str, int] = {}
+
+        # Records waiting for the next group commit, and the future it resolves
+        self._pending: List[bytes] = []
+        self._batch: Optional[Future] = None
+        self._wakeup = threading.Event()
+        self._closing = False
+
+        self.records_replayed = 0
+        self.truncated_bytes = 0
+        self.syncs = 0
+        self.records_written = 0
+        self.compactions = 0
+
+        self._file = self._open()
+        self._replay()
+        self._compacted_bytes = self._log_bytes
+        self._flusher = threading.Thread(target=self._flush_loop, name="journal-flusher", daemon=True)
+        self._flusher.start()
+
+    # ------------------------------------------------------------------
+    # Replay
+
+    def _open(self):
+        f = open(self.path, "a+b")
+        if fcntl is not None:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                raise RuntimeError(f"Journal {self.path} is in use by another process")
+        if f.seek(0, os.SEEK_END) == 0:
+            f.write(MAGIC)
+            f.flush()
+            os.fsync(f.fileno())
+        return f
+
+    def _replay(self):
+        self._file.seek(0)
+        data = self._file.read()
+        if data[:len(MAGIC)] == OLD_MAGIC:
+            raise ValueError(f"{self.path} holds the inventory as well; it was written by an older version")
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{self.path} is not a booking journal")
+        offset = len(MAGIC)
+        while offset + _RECORD.size <= len(data):
+            length, crc, kind = _RECORD.unpack_from(data, offset)
+            end = offset + _RECORD.size + length
+            body = data[offset + _RECORD.size:end]
+            if end > len(data) or zlib.crc32(body, zlib.crc32(bytes((kind,)))) != crc:
+                break
+            self._apply(kind, json.loads(body))
+            self.records_replayed += 1
+            offset = end
+        if offset < len(data):
+            # Torn write from a crash: nobody was told it succeeded, so drop it
+            self.truncated_bytes = len(data) - offset
+            self._file.truncate(offset)
+            os.fsync(self._file.fileno())
+        self._file.seek(0, os.SEEK_END)
+        self._log_bytes = offset
+
+    def _apply(self, kind: int, payload: Any):
+        """Apply one record to the in-memory state; shared by replay and live writes"""
+        if kind == INVENTORY:
+            self.inventory = payload
+        elif kind in (BOOKINGS, BOOK):
+            rows = payload if kind == BOOKINGS else payload[1]
+            for row in rows:
+                booking_id = row[0]
+                self._bookings[booking_id] = row
+                self._by_email.setdefault(normalize_email(row[BOOKING_EMAIL]), []).append(booking_id)
+                if row[BOOKING_STATUS] in ACTIVE:
+                    self._taken.setdefault(row[BOOKING_FLIGHT], set()).add(row[BOOKING_SEAT])
+            if kind == BOOK:
+                self._seats[rows[0][BOOKING_FLIGHT]] = payload[0]
+        elif kind == CANCEL:
+            booking_id, flight_id, seats_left = payload
+            row = self._bookings[booking_id]
+            if row[BOOKING_STATUS] in ACTIVE:
+                self._taken.get(flight_id, set()).discard(row[BOOKING_SEAT])
+            row[BOOKING_STATUS] = "cancelled"
+            self._seats[flight_id] = seats_left
+        elif kind == SEATS:
+            self._seats.update(payload)
+        elif kind == CONFIRM:
+            for booking_id in payload:
+                self._bookings[booking_id][BOOKING_STATUS] = "confirmed"
+        elif kind == SEQUENCE:
+            name, value = payload
+            self._sequences[name] = max(self._sequences.get(name, 0), value)
+        else:
+            raise ValueError(f"Unknown journal record kind {kind}")
+
+    # ------------------------------------------------------------------
+    # Group commit
+
+    def _append(self, kind: int, payload: Any) -> Future:
+        """Apply a record and queue it for the next commit; caller holds the lock"""
+        self._apply(kind, payload)
+        self._pending.append(_encode(kind, payload))
+        if self._batch is None:
+            self._batch = Future()
+            self._wakeup.set()
+        return self._batch
+
+    def _state_snapshot(self) -> Tuple[Any, ...]:
+        """Copy of the whole state, encoded after the lock is released; caller holds the lock"""
+        return (
+            self.inventory,
+            [list(item) for item in self._seats.items()],
+            # Rows are copied too: cancel and confirm update their status in place
+            [list(row) for row in self._bookings.values()],
+            list(self._sequences.items()),
+        )
+
+    def _compact(self, records: List[bytes]):
+        """Replace the journal with one holding only the current state"""
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC)
+            for record in records:
+                f.write(record)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        directory = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        except OSError:
+            pass  # some filesystems cannot sync a directory
+        finally:
+            os.close(directory)
+        self._file.close()
+        self._file = self._open()
+        self._log_bytes = self._compacted_bytes = self._file.tell()
+        self.compactions += 1
+
+    def _flush_loop(self):
+        while True:
+            self._wakeup.wait()
+            # Let writers arriving during the interval join this commit
+            time.sleep(self.sync_interval)
+            with self._lock:
+                records, batch = self._pending, self._batch
+                self._pending, self._batch = [], None
+                self._wakeup.clear()
+                closing = self._closing
+                size = sum(len(record) for record in records)
+                compact = (
+                    self._log_bytes + size - self._compacted_bytes > max(self.compact_bytes, self._compacted_bytes)
+                )
+                if compact:
+                    state = self._state_snapshot()
+            try:
+                if compact:
+                    # Encoded outside the lock so writers are not held up
+                    records = _state_records(state)
+                    self._compact(records)
+                elif records:
+                    self._file.write(b"".join(records))
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                    self._log_bytes += size
+                self.syncs += 1
+                self.records_written += len(records)
+                if batch is not None:
+                    batch.set_result(None)
+            except BaseException as e:
+                if batch is not None:
+                    batch.set_exception(e)
+            if closing:
+                return
+
+    # ------------------------------------------------------------------
+    # FlightStore
+
+    # The inventory is never journaled, only which one bookings refer to
+
+    def has_flights(self) -> bool:
+        return False
+
+    def seed_flights(self, flights: Iterable[Sequence[Any]]) -> bool:
+        raise NotImplementedError("JournalStore does not keep the inventory; use record_inventory")
+
+    def load_flights(self) -> Iterator[Tuple]:
+        return iter(())
+
+    def record_inventory(self, description: Dict[str, Any]):
+        """Remember which inventory the bookings refer to, e.g. the generator seed and size"""
+        with self._lock:
+            batch = self._append(INVENTORY, description)
+        batch.result()
+
+    def load_seat_counts(self) -> Iterator[Tuple[str, int]]:
+        """Seat counts of the flights that have bookings; the others are as in the inventory"""
+        return iter(list(self._seats.items()))
+
+    def _seats_left(self, flight_id: str) -> Optional[int]:
+        seats = self._seats.get(flight_id)
+        if seats is None and self.inventory_seats is not None:
+            seats = self.inventory_seats(flight_id)
+        return seats
+
+    def load_bookings(self) -> Iterator[Tuple]:
+        for row in list(self._bookings.values()):
+            yield tuple(row)
+
+    async def book(self, bookings: Sequence[Any]) -> Optional[int]:
+        rows = [[getattr(booking, column) for column in BOOKING_COLUMNS] for booking in bookings]
+        flight_id = rows[0][BOOKING_FLIGHT]
+        with self._lock:
+            seats_left = self._seats_left(flight_id)
+            if seats_left is None or seats_left < len(rows):
+                return None
+            taken = self._taken.get(flight_id, ())
+            seats = [row[BOOKING_SEAT] for row in rows]
+            if len(set(seats)) != len(seats) or any(seat in taken for seat in seats):
+                raise SeatUnavailable(flight_id)
+            seats_left -= len(rows)
+            batch = self._append(BOOK, [seats_left, rows])
+        await asyncio.wrap_future(batch)
+        return seats_left
+
+    async def cancel(self, booking_id: str, flight_id: str, seats: int = 1) -> Optional[int]:
+        return await self._cancel(booking_id, flight_id, seats, ACTIVE)
+
+    async def expire_hold(self, booking_id: str, flight_id: str, seats: int = 1) -> Optional[int]:
+        return await self._cancel(booking_id, flight_id, seats, ("held",))
+
+    async def _cancel(self, booking_id: str, flight_id: str, seats: int, statuses: Sequence[str]) -> Optional[int]:
+        with self._lock:
+            row = self._bookings.get(booking_id)
+            seats_left = self._seats_left(flight_id)
+            if row is None or row[BOOKING_STATUS] not in statuses or seats_left is None:
+                return None
+            seats_left += seats
+            batch = self._append(CANCEL, [booking_id, flight_id, seats_left])
+        await asyncio.wrap_future(batch)
+        return seats_left
+
+    async def confirm(self, booking_ids: Sequence[str]) -> bool:
+        with self._lock:
+            for booking_id in booking_ids:
+                row = self._bookings.get(booking_id)
+                if row is None or row[BOOKING_STATUS] != "held":
+                    return False
+            batch = self._append(CONFIRM, list(booking_ids))
+        await asyncio.wrap_future(batch)
+        return True
+
+    async def get_booking(self, booking_id: str) -> Optional[Tuple]:
+        row = self._bookings.get(booking_id)
+        return tuple(row) if row is not None else None
+
+    async def reserve_ids(self, name: str, count: int, minimum: int = 0) -> int:
+        # Not waited on: an id only reaches a client inside a booking record,
+        # which is durable before the client hears about it
+        with self._lock:
+            value = max(self._sequences.get(name, 0), minimum) + count
+            self._append(SEQUENCE, [name, value])
+        return value
+
+    async def get_bookings_by_email(self, passenger_email: str) -> List[Tuple]:
+        rows = [self._bookings[booking_id] for booking_id in self._by_email.get(normalize_email(passenger_email), ())]
+        return [tuple(row) for row in sorted(rows, key=lambda row: (row[BOOKING_DATE], row[0]))]
+
+    async def taken_seats(self, flight_id: str) -> List[str]:
+        return sorted(self._taken.get(flight_id, ()))
+
+    async def available_seats(self, flight_id: str) -> Optional[int]:
+        with self._lock:
+            return self._seats_left(flight_id)
+
+    def close(self):
+        with self._lock:
+            self._closing = True
+            if self._batch is None:
+                self._batch = Future()
+            self._wakeup.set()
+        self._flusher.join()
+        self._file.close()
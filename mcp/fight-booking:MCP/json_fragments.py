@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Pre-encoded JSON Fragments
+
+A Fragment is a dict that also carries its own JSON text. Tools keep
+returning plain-looking dicts (MCP clients and json.dumps see an ordinary
+dict), while dumps() splices each fragment's text into the output instead
+of walking and re-encoding it. Flights cache the text of their static
+fields once, so a search response only encodes the parts that change.
+
+Output matches Starlette's JSONResponse: compact separators, UTF-8.
+"""
+
+import json
+from json.encoder import encode_basestring
+from typing import Any, Dict, List
+
+SEPARATOR = ","
+KEY_SEPARATOR = ":"
+
+
+class Fragment(dict):
+    """dict whose JSON encoding is already known; treat it as read-only"""
+
+    __slots__ = ("json",)
+
+    def __init__(self, data: Dict[str, Any], text: str):
+        super().__init__(data)
+        self.json = text
+
+
+def _scalar(value: Any) -> str:
+    if value is None:
+        return "null"
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if type(value) is int:
+        return int.__repr__(value)
+    # floats (NaN, infinities) and anything else follow json.dumps
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _encode(value: Any, parts: List[str]):
+    if isinstance(value, str):
+        parts.append(encode_basestring(value))
+    elif isinstance(value, Fragment):
+        parts.append(value.json)
+    elif isinstance(value, dict):
+        parts.append("{")
+        first = True
+        for key, item in value.items():
+            if not first:
+                parts.append(SEPARATOR)
+            first = False
+            if not isinstance(key, str):
+                # json.dumps turns 1, True and None keys into "1", "true" and "null"
+                key = _scalar(key)
+            parts.append(encode_basestring(key))
+            parts.append(KEY_SEPARATOR)
+            _encode(item, parts)
+        parts.append("}")
+    elif isinstance(value, (list, tuple)):
+        parts.append("[")
+        for index, item in enumerate(value):
+            if index:
+                parts.append(SEPARATOR)
+            _encode(item, parts)
+        parts.append("]")
+    else:
+        parts.append(_scalar(value))
+
+
+def dumps(value: Any) -> str:
+    """Encode like json.dumps, splicing in the text of any Fragment"""
+    parts: List[str] = []
+    _encode(value, parts)
+    return "".join(parts)
+
+
+def fragment(data: Dict[str, Any]) -> Fragment:
+    """Fragment of a dict, encoding it once"""
+    return Fragment(data, dumps(data))
@@ -4,13 +4,20 @@ REST API Server for Flight Booking MCP
 Provides HTTP endpoints that work reliably without MCP client issues
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import flight_booking_fastmcp
+import json_fragments
 from flight_booking_fastmcp import (
-    search_flights, book_flight, cancel_booking, 
-    list_airports, list_airlines,
-    get_flight_status, get_booking_details, get_airport_info,
+    search_flights, search_flights_batch, search_itineraries, book_flight, book_group,
+    hold_seats, confirm_hold, release_hold, join_waitlist, waitlist_status, leave_waitlist, cancel_booking,
+    list_bookings, get_stats, list_airports, list_airlines,
+    get_flight_status, get_booking_details, get_passenger_bookings, get_seat_map, get_airport_info,
     find_flight_suggestions, booking_confirmation_template, travel_tips
 )
 
@@ -26,6 +33,52 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ============================================================================
+# ⚡ FAST JSON RESPONSES
+# ============================================================================
+
+class FragmentJSONResponse(Response):
+    """JSON response that splices in pre-encoded fragments.
+
+    Returning a Response also skips FastAPI's jsonable_encoder pass, which
+    would otherwise copy every dict of the result before encoding it.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return json_fragments.dumps(content).encode("utf-8")
+
+# ============================================================================
+# 📦 PRE-SERIALIZED REFERENCE DATA
+# ============================================================================
+
+# path -> (reference data version, ETag, JSON body). Reference data is
+# serialized once per version and then served as bytes.
+_static_responses: Dict[str, Tuple[int, str, bytes]] = {}
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match uses weak comparison, so a W/ prefix is ignored"""
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+async def _static_response(request: Request, path: str, build: Callable[[], Awaitable[Dict[str, Any]]]) -> Response:
+    """Serve reference data from cached bytes with a strong ETag; 304 when the client has it"""
+    version = flight_booking_fastmcp.reference_data_version
+    cached = _static_responses.get(path)
+    if cached is None or cached[0] != version:
+        data = await build()
+        body = json.dumps({"success": True, "data": data}).encode()
+        cached = (version, f'"{hashlib.sha256(body).hexdigest()[:32]}"', body)
+        if "error" not in data:
+            _static_responses[path] = cached
+    _, etag, body = cached
+    # no-cache: clients may keep the body but must revalidate it with the ETag
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
 # ============================================================================
 # 🛠️ TOOL ENDPOINTS
 # ============================================================================
@@ -39,50 +92,189 @@ async def api_search_flights(request: dict):
             request.get("arrival_airport"),
             request.get("departure_date"),
             request.get("passengers", 1),
-            request.get("return_date")
+            request.get("return_date"),
+            max_price=request.get("max_price"),
+            limit=request.get("limit", 10),
+            cursor=request.get("cursor"),
+            flex_days=request.get("flex_days", 0),
+            departure_after=request.get("departure_after"),
+            departure_before=request.get("departure_before")
+        )
+        return FragmentJSONResponse({"success": True, "data": result})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/tools/search_flights_batch")
+async def api_search_flights_batch(request: dict):
+    """Run several flight searches in one request"""
+    try:
+        result = await search_flights_batch(request.get("queries", []))
+        return FragmentJSONResponse({"success": True, "data": result})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/tools/search_itineraries")
+async def api_search_itineraries(request: dict):
+    """Search for direct and connecting itineraries"""
+    try:
+        result = await search_itineraries(
+            request.get("departure_airport"),
+            request.get("arrival_airport"),
+            request.get("departure_date"),
+            request.get("passengers", 1),
+            max_stops=request.get("max_stops", 1),
+            min_connection_minutes=request.get("min_connection_minutes", 45),
+            max_connection_minutes=request.get("max_connection_minutes", 360),
+            sort_by=request.get("sort_by", "price"),
+            limit=request.get("limit", 5),
+            flex_days=request.get("flex_days", 0)
         )
-        return {"success": True, "data": result}
+        return FragmentJSONResponse({"success": True, "data": result})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/tools/book_flight")
-async def api_book_flight(request: dict):
-    """Book a flight"""
+async def api_book_flight(request: dict, idempotency_key: Optional[str] = Header(None)):
+    """Book a flight; an Idempotency-Key header or idempotency_key field makes retries safe"""
     try:
         result = await book_flight(
             request.get("flight_id"),
             request.get("passenger_name"),
             request.get("passenger_email"),
-            request.get("seat_preference", "any")
+            request.get("seat_preference", "any"),
+            idempotency_key=request.get("idempotency_key") or idempotency_key
+        )
+        return FragmentJSONResponse({"success": True, "data": result})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/tools/book_group")
+async def api_book_group(request: dict, idempotency_key: Optional[str] = Header(None)):
+    """Book several passengers on one flight"""
+    try:
+        result = await book_group(
+            request.get("flight_id"),
+            request.get("passengers", []),
+            idempotency_key=request.get("idempotency_key") or idempotency_key
+        )
+        return FragmentJSONResponse({"success": True, "data": result})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/tools/hold_seats")
+async def api_hold_seats(request: dict):
+    """Hold seats on a flight for a while"""
+    try:
+        result = await hold_seats(
+            request.get("flight_id"),
+            request.get("passengers", []),
+            request.get("seat_preference", "any"),
+            request.get("hold_seconds", flight_booking_fastmcp.DEFAULT_HOLD_SECONDS)
+        )
+        return FragmentJSONResponse({"success": True, "data": result})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/tools/confirm_hold")
+async def api_confirm_hold(request: dict):
+    """Book the seats of a hold"""
+    try:
+        result = await confirm_hold(request.get("hold_id"))
+        return FragmentJSONResponse({"success": True, "data": result})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/tools/release_hold")
+async def api_release_hold(request: dict):
+    """Give the seats of a hold back"""
+    try:
+        result = await release_hold(request.get("hold_id"))
+        return FragmentJSONResponse({"success": True, "data": result})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/tools/join_waitlist")
+async def api_join_waitlist(request: dict):
+    """Queue for a seat on a fully booked flight"""
+    try:
+        result = await join_waitlist(
+            request.get("flight_id"),
+            request.get("passenger_name"),
+            request.get("passenger_email"),
+            request.get("seat_preference", "any"),
+            request.get("priority", 0),
+            request.get("wait_seconds", 0)
         )
-        return {"success": True, "data": result}
+        return FragmentJSONResponse({"success": True, "data": result})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/tools/waitlist_status")
+async def api_waitlist_status(request: dict):
+    """Check a waitlist entry, optionally waiting for a seat"""
+    try:
+        result = await waitlist_status(request.get("entry_id"), request.get("wait_seconds", 0))
+        return FragmentJSONResponse({"success": True, "data": result})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/tools/leave_waitlist")
+async def api_leave_waitlist(request: dict):
+    """Leave a flight's waitlist"""
+    try:
+        result = await leave_waitlist(request.get("entry_id"))
+        return FragmentJSONResponse({"success": True, "data": result})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/tools/cancel_booking")
-async def api_cancel_booking(request: dict):
+async def api_cancel_booking(request: dict, idempotency_key: Optional[str] = Header(None)):
     """Cancel a booking"""
     try:
-        result = await cancel_booking(request.get("booking_id"))
-        return {"success": True, "data": result}
+        result = await cancel_booking(
+            request.get("booking_id"),
+            idempotency_key=request.get("idempotency_key") or idempotency_key
+        )
+        return FragmentJSONResponse({"success": True, "data": result})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/tools/list_bookings")
+async def api_list_bookings(request: dict):
+    """List a passenger's bookings"""
+    try:
+        result = await list_bookings(
+            request.get("passenger_email", ""),
+            request.get("status"),
+            request.get("limit", 20),
+            request.get("cursor")
+        )
+        return FragmentJSONResponse({"success": True, "data": result})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/tools/get_stats")
+async def api_get_stats(flight_id: Optional[str] = None, top_routes: int = 10):
+    """Get booking analytics"""
+    try:
+        result = await get_stats(flight_id, top_routes)
+        return FragmentJSONResponse({"success": True, "data": result})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/tools/list_airports")
-async def api_list_airports():
+async def api_list_airports(request: Request):
     """List all airports"""
     try:
-        result = await list_airports()
-        return {"success": True, "data": result}
+        return await _static_response(request, "/tools/list_airports", list_airports)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/tools/list_airlines")
-async def api_list_airlines():
+async def api_list_airlines(request: Request):
     """List all airlines"""
     try:
-        result = await list_airlines()
-        return {"success": True, "data": result}
+        return await _static_response(request, "/tools/list_airlines", list_airlines)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -95,7 +287,7 @@ async def api_flight_status(flight_id: str):
     """Get flight status"""
     try:
         result = await get_flight_status(flight_id)
-        return {"success": True, "data": result}
+        return FragmentJSONResponse({"success": True, "data": result})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -104,16 +296,35 @@ async def api_booking_details(booking_id: str):
     """Get booking details"""
     try:
         result = await get_booking_details(booking_id)
-        return {"success": True, "data": result}
+        return FragmentJSONResponse({"success": True, "data": result})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/resources/booking/list/{passenger_email}")
+async def api_passenger_bookings(passenger_email: str):
+    """Get the first page of a passenger's bookings"""
+    try:
+        result = await get_passenger_bookings(passenger_email)
+        return FragmentJSONResponse({"success": True, "data": result})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/resources/seat/map/{flight_id}")
+async def api_seat_map(flight_id: str):
+    """Get a flight's seat map"""
+    try:
+        result = await get_seat_map(flight_id)
+        return FragmentJSONResponse({"success": True, "data": result})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/resources/airport/info/{airport_code}")
-async def api_airport_info(airport_code: str):
+async def api_airport_info(airport_code: str, request: Request):
     """Get airport info"""
     try:
-        result = await get_airport_info(airport_code)
-        return {"success": True, "data": result}
+        return await _static_response(
+            request, f"/resources/airport/info/{airport_code.upper()}", lambda: get_airport_info(airport_code)
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -126,7 +337,7 @@ async def api_flight_suggestions(request: dict):
     """Get flight suggestions"""
     try:
         result = await find_flight_suggestions(request.get("travel_preferences"))
-        return {"success": True, "data": result}
+        return FragmentJSONResponse({"success": True, "data": result})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -138,7 +349,7 @@ async def api_booking_confirmation(request: dict):
             request.get("passenger_name"),
             request.get("flight_details")
         )
-        return {"success": True, "data": result}
+        return FragmentJSONResponse({"success": True, "data": result})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -147,7 +358,7 @@ async def api_travel_tips(request: dict):
     """Get travel tips"""
     try:
         result = await travel_tips(request.get("destination"))
-        return {"success": True, "data": result}
+        return FragmentJSONResponse({"success": True, "data": result})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -165,14 +376,27 @@ async def health_check():
         "endpoints": {
             "tools": [
                 "POST /tools/search_flights",
+                "POST /tools/search_flights_batch",
+                "POST /tools/search_itineraries",
                 "POST /tools/book_flight", 
+                "POST /tools/book_group",
+                "POST /tools/hold_seats",
+                "POST /tools/confirm_hold",
+                "POST /tools/release_hold",
+                "POST /tools/join_waitlist",
+                "POST /tools/waitlist_status",
+                "POST /tools/leave_waitlist",
                 "POST /tools/cancel_booking",
+                "POST /tools/list_bookings",
+                "GET /tools/get_stats",
                 "GET /tools/list_airports",
                 "GET /tools/list_airlines"
             ],
             "resources": [
                 "GET /resources/flight/status/{flight_id}",
                 "GET /resources/booking/details/{booking_id}",
+                "GET /resources/booking/list/{passenger_email}",
+                "GET /resources/seat/map/{flight_id}",
                 "GET /resources/airport/info/{airport_code}"
             ],
             "prompts": [
@@ -189,12 +413,25 @@ if __name__ == "__main__":
     print("📡 Available endpoints:")
     print("  - GET  / (health check)")
     print("  - POST /tools/search_flights")
+    print("  - POST /tools/search_flights_batch")
+    print("  - POST /tools/search_itineraries")
     print("  - POST /tools/book_flight")
+    print("  - POST /tools/book_group")
+    print("  - POST /tools/hold_seats")
+    print("  - POST /tools/confirm_hold")
+    print("  - POST /tools/release_hold")
+    print("  - POST /tools/join_waitlist")
+    print("  - POST /tools/waitlist_status")
+    print("  - POST /tools/leave_waitlist")
     print("  - POST /tools/cancel_booking")
+    print("  - POST /tools/list_bookings")
+    print("  - GET  /tools/get_stats")
     print("  - GET  /tools/list_airports")
     print("  - GET  /tools/list_airlines")
     print("  - GET  /resources/flight/status/{flight_id}")
     print("  - GET  /resources/booking/details/{booking_id}")
+    print("  - GET  /resources/booking/list/{passenger_email}")
+    print("  - GET  /resources/seat/map/{flight_id}")
     print("  - GET  /resources/airport/info/{airport_code}")
     print("  - POST /prompts/find_flight_suggestions")
     print("  - POST /prompts/booking_confirmation_template")
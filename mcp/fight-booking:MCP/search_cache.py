@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Search Result Cache
+
+LRU cache with a time-to-live and a memory cap for search responses.
+Every entry remembers the version of each route it was computed from;
+the server bumps a route's version whenever seats on it change, so an
+entry whose versions no longer match is treated as a miss and dropped.
+A hit can therefore never show stale seat availability.
+
+Cached values are shared between callers and must be treated as read-only.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class SearchCache:
+    """LRU + TTL cache validated against route versions"""
+
+    def __init__(
+        self,
+        max_entries: int = 4096,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._clock = clock
+        # key -> (expires_at, versions, size, value), least recently used first
+        self._entries: "OrderedDict[Hashable, Tuple[float, Tuple[int, ...], int, Any]]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _drop(self, key: Hashable):
+        self.bytes -= self._entries.pop(key)[2]
+
+    def get(self, key: Hashable, versions: Tuple[int, ...]) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, entry_versions, _, value = entry
+        if entry_versions != versions:
+            self.invalidations += 1
+        elif expires_at <= self._clock():
+            self.expirations += 1
+        else:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+        self._drop(key)
+        self.misses += 1
+        return None
+
+    def put(self, key: Hashable, versions: Tuple[int, ...], value: Any, size: int):
+        """Store a value; `size` is its approximate footprint in bytes"""
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (self._clock() + self.ttl, versions, size, value)
+        self.bytes += size
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Bitset Seat Maps
+
+Each flight's cabin is two Python ints used as bitsets over the seats of
+its aircraft layout (bit = row * seats_per_row + column):
+
+- booked: seats held by bookings this process knows about
+- blocked: seats sold elsewhere (the inventory only carries a seat count),
+  sized so the free seats always match the flight's available_seats
+
+Every layout precomputes window/aisle/middle class masks, so finding a
+free seat of a class is ``~occupied & mask`` and a lowest-set-bit lookup.
+Maps are only built for flights that are actually touched, which keeps
+memory at a few dozen bytes per booked flight.
+
+Flights are duck-typed: anything with id, aircraft_type and
+available_seats works.
+"""
+
+import random
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+SEAT_CLASSES = ("window", "aisle", "middle")
+
+
+class SeatLayout:
+    """Cabin layout such as "ABC-DEF": letters per row, "-" marks an aisle"""
+
+    def __init__(self, rows: int, groups: str):
+        self.rows = rows
+        self.groups = groups.split("-")
+        self.letters = "".join(self.groups)
+        self.width = len(self.letters)
+        self.capacity = rows * self.width
+
+        row_masks = {seat_class: 0 for seat_class in SEAT_CLASSES}
+        column = 0
+        for group_index, group in enumerate(self.groups):
+            last = len(group) - 1
+            for position in range(len(group)):
+                if (group_index, position) in ((0, 0), (len(self.groups) - 1, last)):
+                    seat_class = "window"
+                elif position in (0, last):
+                    seat_class = "aisle"
+                else:
+                    seat_class = "middle"
+                row_masks[seat_class] |= 1 << column
+                column += 1
+        self.class_masks = {
+            seat_class: sum(mask << (row * self.width) for row in range(rows))
+            for seat_class, mask in row_masks.items()
+        }
+        self.row_mask = (1 << self.width) - 1
+        # (first column, seat count) of every block between aisles, then the whole row
+        self.segments = []
+        column = 0
+        for group in self.groups:
+            self.segments.append((column, len(group)))
+            column += len(group)
+        self.full_mask = (1 << self.capacity) - 1
+
+    def label(self, seat: int) -> str:
+        row, column = divmod(seat, self.width)
+        return f"{row + 1}{self.letters[column]}"
+
+    def seat(self, label: str) -> Optional[int]:
+        """Bit index for a label like "12A", or None if it is not on this aircraft"""
+        label = label.strip().upper()
+        row, letter = label[:-1], label[-1:]
+        if not row.isdigit() or not letter or letter not in self.letters:
+            return None
+        row_number = int(row)
+        if not 1 <= row_number <= self.rows:
+            return None
+        return (row_number - 1) * self.width + self.letters.index(letter)
+
+
+LAYOUTS: Dict[str, SeatLayout] = {
+    "Boeing 737": SeatLayout(34, "ABC-DEF"),
+    "Airbus A320": SeatLayout(34, "ABC-DEF"),
+    "Boeing 777": SeatLayout(40, "ABC-DEFG-HJK"),
+    "Airbus A350": SeatLayout(36, "ABC-DEF-HJK"),
+}
+DEFAULT_LAYOUT = LAYOUTS["Airbus A320"]
+
+
+def layout_for(aircraft_type: str) -> SeatLayout:
+    return LAYOUTS.get(aircraft_type, DEFAULT_LAYOUT)
+
+
+def _lowest_bit(bits: int) -> int:
+    return (bits & -bits).bit_length() - 1
+
+
+def _run_start(bits: int, width: int, count: int) -> Optional[int]:
+    """Lowest position starting `count` consecutive set bits within `width` bits"""
+    if count > width:
+        return None
+    run = bits
+    for shift in range(1, count):
+        run &= bits >> shift
+    run &= (1 << (width - count + 1)) - 1
+    return _lowest_bit(run) if run else None
+
+
+def _adjacent_block(layout: SeatLayout, free: int, count: int, segments: List[Tuple[int, int]]) -> int:
+    """Bits of the front-most `count` adjacent free seats inside one segment of a row, or 0"""
+    for row in range(layout.rows):
+        row_free = free >> (row * layout.width) & layout.row_mask
+        for first, length in segments:
+            start = _run_start(row_free >> first & ((1 << length) - 1), length, count)
+            if start is not None:
+                return ((1 << count) - 1) << (row * layout.width + first + start)
+    return 0
+
+
+class SeatMap:
+    __slots__ = ("booked", "blocked")
+
+    def __init__(self, booked: int, blocked: int):
+        self.booked = booked
+        self.blocked = blocked
+
+
+class SeatMaps:
+    """Seat maps for every flight that has been touched"""
+
+    def __init__(self):
+        self._maps: Dict[str, SeatMap] = {}
+
+    def __len__(self) -> int:
+        return len(self._maps)
+
+    def _get(self, flight: Any) -> SeatMap:
+        seat_map = self._maps.get(flight.id)
+        if seat_map is None:
+            layout = layout_for(flight.aircraft_type)
+            # Seats sold before the map existed are picked from the flight id,
+            # so every process draws the same cabin for the same flight
+            sold = max(layout.capacity - flight.available_seats, 0)
+            blocked = 0
+            for seat in random.Random(flight.id).sample(range(layout.capacity), sold):
+                blocked |= 1 << seat
+            seat_map = self._maps[flight.id] = SeatMap(0, blocked)
+        return seat_map
+
+    def free_bits(self, flight: Any) -> int:
+        seat_map = self._get(flight)
+        return layout_for(flight.aircraft_type).full_mask & ~(seat_map.booked | seat_map.blocked)
+
+    def is_free(self, flight: Any, label: str) -> bool:
+        seat = layout_for(flight.aircraft_type).seat(label)
+        return seat is not None and bool(self.free_bits(flight) >> seat & 1)
+
+    def allocate(self, flight: Any, preference: str = "any") -> Optional[str]:
+        """Book one free seat; a class preference falls back to any free seat.
+
+        A specific seat label is honoured exactly or not at all. The caller
+        takes the seat off the flight's available_seats.
+        """
+        layout = layout_for(flight.aircraft_type)
+        free = self.free_bits(flight)
+        preference = (preference or "any").strip().lower()
+        if preference in layout.class_masks:
+            free = (free & layout.class_masks[preference]) or free
+        elif preference != "any":
+            seat = layout.seat(preference)
+            if seat is None or not free >> seat & 1:
+                return None
+            free = 1 << seat
+        if not free:
+            return None
+        seat = _lowest_bit(free)
+        self._get(flight).booked |= 1 << seat
+        return layout.label(seat)
+
+    def allocate_block(self, flight: Any, count: int) -> Optional[List[str]]:
+        """Book `count` seats together, or none at all.
+
+        Prefers seats side by side between two aisles, then side by side
+        across an aisle in one row, then the front-most free seats.
+        """
+        layout = layout_for(flight.aircraft_type)
+        free = self.free_bits(flight)
+        if count <= 0 or bin(free).count("1") < count:
+            return None
+        chosen = _adjacent_block(layout, free, count, layout.segments) or _adjacent_block(
+            layout, free, count, [(0, layout.width)]
+        )
+        if not chosen:
+            chosen = 0
+            for _ in range(count):
+                seat = free & -free
+                chosen |= seat
+                free &= ~seat
+        self._get(flight).booked |= chosen
+        seats = []
+        while chosen:
+            seat = _lowest_bit(chosen)
+            seats.append(layout.label(seat))
+            chosen &= chosen - 1
+        return seats
+
+    def release(self, flight: Any, label: str):
+        """Free a booked seat; the caller puts it back on available_seats"""
+        seat = layout_for(flight.aircraft_type).seat(label)
+        if seat is not None:
+            self._get(flight).booked &= ~(1 << seat)
+
+    def claim(self, flight: Any, label: str):
+        """Record a seat booked elsewhere (another process, or before a restart).
+
+        The booking is already part of available_seats, so one blocked seat
+        is freed to keep the free count unchanged.
+        """
+        seat = layout_for(flight.aircraft_type).seat(label)
+        if seat is None:
+            return
+        seat_map = self._get(flight)
+        bit = 1 << seat
+        if seat_map.booked & bit:
+            return
+        if seat_map.blocked & bit:
+            seat_map.blocked &= ~bit
+        elif seat_map.blocked:
+            seat_map.blocked &= seat_map.blocked - 1
+        seat_map.booked |= bit
+
+    def reload(self, flight: Any, labels: Iterable[str]):
+        """Make `labels` the booked seats, e.g. every seat the store counts as taken.
+
+        Seats freed elsewhere become free again; the caller then syncs the
+        map to the flight's available_seats.
+        """
+        layout = layout_for(flight.aircraft_type)
+        booked = 0
+        for label in labels:
+            seat = layout.seat(label)
+            if seat is not None:
+                booked |= 1 << seat
+        seat_map = self._get(flight)
+        seat_map.blocked &= ~booked
+        seat_map.booked = booked
+
+    def sync(self, flight: Any):
+        """Block or unblock seats until the free count matches available_seats"""
+        seat_map = self._maps.get(flight.id)
+        if seat_map is None:
+            return
+        free = self.free_bits(flight)
+        surplus = bin(free).count("1") - flight.available_seats
+        while surplus > 0 and free:
+            # Block from the back of the cabin, where seats sell last
+            seat = free.bit_length() - 1
+            seat_map.blocked |= 1 << seat
+            free &= ~(1 << seat)
+            surplus -= 1
+        while surplus < 0 and seat_map.blocked:
+            seat_map.blocked &= seat_map.blocked - 1
+            surplus += 1
+
+    def describe(self, flight: Any) -> Dict[str, Any]:
+        """Seat map view: one string per row, "." free and "x" taken"""
+        layout = layout_for(flight.aircraft_type)
+        free = self.free_bits(flight)
+        rows: List[str] = []
+        for row in range(layout.rows):
+            bits = free >> (row * layout.width) & layout.row_mask
+            marks = ["." if bits >> column & 1 else "x" for column in range(layout.width)]
+            groups, start = [], 0
+            for group in layout.groups:
+                groups.append("".join(marks[start:start + len(group)]))
+                start += len(group)
+            rows.append(" ".join(groups))
+        return {
+            "aircraft_type": flight.aircraft_type,
+            "layout": "-".join(layout.groups),
+            "rows": layout.rows,
+            "free_seats": bin(free).count("1"),
+            "free_by_class": {
+                seat_class: bin(free & mask).count("1") for seat_class, mask in layout.class_masks.items()
+            },
+            "seat_rows": [f"{row + 1:>2} {line}" for row, line in enumerate(rows)],
+        }
@@ -6,12 +6,37 @@ This bypasses MCP client issues and tests the core functionality
 
 import asyncio
 import json
+import time
+from collections import Counter, namedtuple
+import flight_booking_fastmcp as server
 from flight_booking_fastmcp import (
     search_flights, book_flight, cancel_booking, 
     list_airports, list_airlines,
     get_flight_status, get_booking_details, get_airport_info,
-    find_flight_suggestions, booking_confirmation_template, travel_tips
+    find_flight_suggestions, booking_confirmation_template, travel_tips,
+    generate_sample_flights, sample_inventory, search_cache, get_flight,
+    _cheapest_round_trips
 )
+from idempotency import IdempotencyStore
+from rest_api_server import api_book_flight
+
+# Minimal stand-in for a search leg: what round-trip pairing reads
+Leg = namedtuple("Leg", "id price departure_ts arrival_ts")
+
+async def page_through(*args, cursor=None, limit=5, **kwargs):
+    """Flight ids of every search_flights page from `cursor` on, following next_cursor"""
+    ids = []
+    while True:
+        page = await search_flights(*args, limit=limit, cursor=cursor, **kwargs)
+        ids.extend(flight["id"] for flight in page["flights"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids
+
+async def sell_out(flight_id):
+    """Book a flight until no seats are left"""
+    while "error" not in await book_flight(flight_id, "Seat Filler", "fill@example.com"):
+        pass
 
 async def test_all_functions():
     """Test all flight booking functions"""
@@ -101,6 +126,148 @@ async def test_all_functions():
     except Exception as e:
         print(f"   ❌ Error: {e}")
     
+    # Test 9: Round-trip pairing with few or no valid pairs
+    print("\n9. 🔄 Testing round-trip pairing on sparse grids...")
+    try:
+        hour = 3600
+        # 2000 outbound flights landing after every one of 2000 return flights leaves
+        outbound = [Leg(f"O{i}", 100 + i, 100 * hour, 101 * hour) for i in range(2000)]
+        inbound = [Leg(f"I{i}", 100 + i, i, i + hour) for i in range(2000)]
+        started = time.perf_counter()
+        pairs, count = _cheapest_round_trips(outbound, inbound, 10, hour)
+        elapsed = time.perf_counter() - started
+        assert (pairs, count) == ([], 0), f"expected no pairs, got {count}"
+        assert elapsed < 0.5, f"empty pairing took {elapsed:.2f}s"
+        print(f"   ✅ No valid pairs in a 2000 x 2000 grid, answered in {elapsed * 1000:.1f} ms")
+        
+        # One return leaves late enough, and only after the dearest outbound flight
+        late = Leg("I-late", 999.5, 2 * hour, 3 * hour)
+        outbound[-1] = Leg("O-early", 5000, 0, hour)
+        inbound = sorted(inbound + [late], key=lambda leg: leg.price)
+        pairs, count = _cheapest_round_trips(outbound, inbound, 10, hour)
+        assert [(o.id, i.id) for o, i in pairs] == [("O-early", "I-late")], pairs
+        assert count == 1, f"expected 1 valid pair, got {count}"
+        print("   ✅ The single valid pair in a sparse grid is found")
+    except Exception as e:
+        print(f"   ❌ Error: {e}")
+    
+    # Test 10: Search cache invalidation
+    print("\n10. 🗃️ Testing that a booking invalidates only its route's searches...")
+    try:
+        generate_sample_flights()
+        flights = sample_inventory(200)
+        booked = next(f for f in flights if f.available_seats > 0)
+        other = next(f for f in flights if (f.departure_airport, f.arrival_airport) != (booked.departure_airport, booked.arrival_airport))
+        searches = {
+            flight.id: (flight.departure_airport, flight.arrival_airport, flight.departure_time[:10])
+            for flight in (booked, other)
+        }
+        for args in searches.values():
+            await search_flights(*args, limit=100)
+        
+        seats_before = booked.available_seats
+        booking = await book_flight(booked.id, "Cache Tester", "cache@example.com")
+        assert "error" not in booking, booking["error"]
+        hits = search_cache.hits
+        await search_flights(*searches[other.id], limit=100)
+        assert search_cache.hits == hits + 1, "the other route's search was dropped"
+        invalidations = search_cache.invalidations
+        result = await search_flights(*searches[booked.id], limit=100)
+        assert search_cache.invalidations == invalidations + 1, "the booked route's search was served stale"
+        seats = next((f["available_seats"] for f in result["flights"] if f["id"] == booked.id), 0)
+        assert seats == seats_before - 1, f"search shows {seats} seats, expected {seats_before - 1}"
+        await cancel_booking(booking["booking_id"])
+        print(f"   ✅ Booking {booked.id} refreshed its route, {other.departure_airport} → {other.arrival_airport} stayed cached")
+    except Exception as e:
+        print(f"   ❌ Error: {e}")
+    
+    # Test 11: Idempotency keys
+    print("\n11. 🔑 Testing idempotency keys...")
+    try:
+        flight = next(f for f in sample_inventory(200) if f.available_seats >= 10)
+        seats_before = get_flight(flight.id).available_seats
+        duplicates = await asyncio.gather(*(
+            book_flight(flight.id, "Retry Tester", "retry@example.com", idempotency_key="retry-1")
+            for _ in range(5)
+        ))
+        booking_ids = {booking.get("booking_id") for booking in duplicates}
+        assert len(booking_ids) == 1 and None not in booking_ids, duplicates
+        seats = get_flight(flight.id).available_seats
+        assert seats == seats_before - 1, f"{seats_before - seats} seats taken by 5 duplicates"
+        print(f"   ✅ 5 concurrent duplicates made one booking: {booking_ids.pop()}")
+        
+        reused = await book_flight(flight.id, "Someone Else", "retry@example.com", idempotency_key="retry-1")
+        assert "error" in reused, reused
+        print(f"   ✅ Reused key refused: {reused['error']}")
+        
+        # A call that raised is not remembered, so a retry runs again
+        keys = IdempotencyStore()
+        calls = []
+        async def flaky():
+            calls.append(1)
+            if len(calls) == 1:
+                raise RuntimeError("store unavailable")
+            return {"booking_id": "BK-RETRY"}
+        try:
+            await keys.run("retry-2", "{}", flaky)
+            raise AssertionError("the first call should have raised")
+        except RuntimeError:
+            pass
+        result = await keys.run("retry-2", "{}", flaky)
+        assert result == {"booking_id": "BK-RETRY"} and len(calls) == 2, (result, calls)
+        assert await keys.run("retry-2", "{}", flaky) == result and len(calls) == 2
+        print("   ✅ A call that raised is retried, then its result replayed")
+        
+        # REST: an explicit null idempotency_key in the body falls back to the header
+        request = {"flight_id": flight.id, "passenger_name": "Rest Tester",
+                   "passenger_email": "rest@example.com", "idempotency_key": None}
+        first = json.loads((await api_book_flight(dict(request), idempotency_key="retry-3")).body)
+        second = json.loads((await api_book_flight(dict(request), idempotency_key="retry-3")).body)
+        assert "booking_id" in first["data"], first
+        assert first["data"]["booking_id"] == second["data"]["booking_id"], (first, second)
+        print(f"   ✅ Null body key used the Idempotency-Key header: {first['data']['booking_id']} replayed")
+        
+        await cancel_booking(duplicates[0]["booking_id"])
+        await cancel_booking(first["data"]["booking_id"])
+    except Exception as e:
+        print(f"   ❌ Error: {e}")
+    
+    # Test 12: Search cursors on both inventory backends
+    print("\n12. 📑 Testing search_flights cursors...")
+    backend = server.INVENTORY_BACKEND
+    try:
+        malformed = await search_flights("JFK", "LHR", "2026-10-25", cursor="not-a-cursor")
+        assert "error" in malformed, malformed
+        print(f"   ✅ Malformed cursor refused: {malformed['error']}")
+        
+        for server.INVENTORY_BACKEND in ("objects", "columnar"):
+            if server.INVENTORY_BACKEND == "columnar" and server.ColumnarInventory is None:
+                print("   ⚠️ numpy not installed, columnar backend skipped")
+                continue
+            server.load_generated_inventory(5000, seed=7)
+            (origin, destination, day), _ = Counter(
+                (f.departure_airport, f.arrival_airport, f.departure_time[:10]) for f in server.iter_inventory()
+            ).most_common(1)[0]
+            everything = [f["id"] for f in (await search_flights(origin, destination, day, limit=1000))["flights"]]
+            for flex_days in (0, 2):
+                expected = [f["id"] for f in (await search_flights(origin, destination, day, limit=1000, flex_days=flex_days))["flights"]]
+                paged = await page_through(origin, destination, day, flex_days=flex_days)
+                assert paged == expected, f"flex_days={flex_days}: {len(paged)} paged, {len(expected)} expected"
+            
+            # Sell out the flight the cursor points past and one on the next page
+            first = await search_flights(origin, destination, day, limit=5)
+            anchor, later = first["flights"][-1]["id"], everything[7]
+            await sell_out(anchor)
+            await sell_out(later)
+            rest = await page_through(origin, destination, day, cursor=first["next_cursor"])
+            assert rest == [i for i in everything[5:] if i != later], "pages skipped or repeated flights"
+            print(f"   ✅ {server.INVENTORY_BACKEND}: {len(everything)} flights paged in order, "
+                  f"stable after {anchor} and {later} sold out")
+    except Exception as e:
+        print(f"   ❌ Error: {e}")
+    finally:
+        server.INVENTORY_BACKEND = backend
+    
     print("\n🎉 All function tests completed!")
     print("🚀 Your Flight Booking MCP Server is working perfectly!")
     print("\n💡 The server functions correctly - MCP client connection has issues")
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Test Booking Behaviour Across Processes and Restarts
+The server reads its store configuration from the environment at import
+time, so every server here runs in a process of its own:
+
+1. A seat cancelled by another process can be booked again, once
+2. A journal cut off mid-record replays up to the cut and keeps working
+3. An unconfirmed hold expires and gives its seats back
+4. A hold adopted from the store never cancels a booking confirmed elsewhere
+
+    python test_store_behaviour.py
+"""
+
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+
+
+# ----------------------------------------------------------------------------
+# Steps, run inside a server process
+# ----------------------------------------------------------------------------
+
+async def _fill(server):
+    """Book the flight with the fewest seats until it is full"""
+    flight = min(server.flights_db, key=lambda f: f.available_seats)
+    bookings = []
+    while True:
+        result = await server.book_flight(flight.id, f"Passenger {len(bookings)}", "fill@example.com")
+        if "error" in result:
+            break
+        bookings.append((result["booking_id"], result["seat_number"]))
+    return {"flight_id": flight.id, "bookings": bookings, "seats_left": flight.available_seats}
+
+
+async def _book(server, flight_id):
+    return await server.book_flight(flight_id, "Late Passenger", "book@example.com")
+
+
+async def _cancel(server, booking_id):
+    return await server.cancel_booking(booking_id)
+
+
+async def _state(server, flight_id):
+    """Seat count, confirmed bookings and journal repairs as this process sees them"""
+    return {
+        "seats_left": server.get_flight(flight_id).available_seats,
+        "confirmed": sorted(
+            booking.id for booking in server.bookings_db
+            if booking.flight_id == flight_id and booking.status == "confirmed"
+        ),
+        "truncated_bytes": getattr(server.store, "truncated_bytes", 0),
+    }
+
+
+async def _hold_expiry(server):
+    """Hold two seats for a second and let the hold run out"""
+    flight = max(server.flights_db, key=lambda f: f.available_seats)
+    before = flight.available_seats
+    passengers = [{"name": f"Holder {i}", "email": "hold@example.com"} for i in range(2)]
+    hold = await server.hold_seats(flight.id, passengers, hold_seconds=1)
+    held = flight.available_seats
+    await asyncio.sleep(1 + 3 * server.HOLD_TICK_SECONDS)
+    return {
+        "before": before,
+        "held": held,
+        "after": flight.available_seats,
+        "statuses": [server.bookings_by_id[booking["booking_id"]].status for booking in hold["bookings"]],
+        "confirm": await server.confirm_hold(hold["hold_id"]),
+    }
+
+
+async def _hold(server):
+    """Hold one seat on the flight with the most seats"""
+    flight = max(server.flights_db, key=lambda f: f.available_seats)
+    before = flight.available_seats
+    hold = await server.hold_seats(flight.id, [{"name": "Holder", "email": "hold@example.com"}])
+    return {"flight_id": flight.id, "before": before, "hold_id": hold["hold_id"],
+            "booking_id": hold["bookings"][0]["booking_id"]}
+
+
+async def _confirm(server, hold_id, fail=False):
+    confirm = server.store.confirm
+    if fail:
+        async def broken(booking_ids):
+            raise RuntimeError("disk I/O error")
+        server.store.confirm = broken
+    try:
+        result = await server.confirm_hold(hold_id)
+    finally:
+        server.store.confirm = confirm
+    return {"result": result, "still_held": hold_id in server.seat_holds}
+
+
+async def _expire_adopted(server):
+    """Run out every hold this process adopted from the store"""
+    holds = [server._take_hold(hold_id) for hold_id in list(server.seat_holds)]
+    for hold in holds:
+        await server._release_hold(hold)
+    return len(holds)
+
+
+STEPS = {
+    "fill": _fill,
+    "book": _book,
+    "cancel": _cancel,
+    "state": _state,
+    "hold_expiry": _hold_expiry,
+    "hold": _hold,
+    "confirm": _confirm,
+    "expire_adopted": _expire_adopted,
+}
+
+
+def _serve(environment, commands, results):
+    os.environ.update(environment)
+    os.environ.setdefault("FLIGHT_INVENTORY_SEED", "42")
+    import flight_booking_fastmcp as server
+    server.generate_sample_flights()
+    for name, args in iter(commands.get, None):
+        results.put(asyncio.run(STEPS[name](server, *args)))
+    if server.store is not None:
+        server.store.close()
+
+
+class ServerProcess:
+    """A server in a process of its own, driven one step at a time"""
+
+    def __init__(self, **environment):
+        # Spawn, not fork: each server opens its own store
+        context = multiprocessing.get_context("spawn")
+        self._commands = context.Queue()
+        self._results = context.Queue()
+        self._process = context.Process(target=_serve, args=(environment, self._commands, self._results))
+        self._process.start()
+
+    def call(self, name, *args):
+        self._commands.put((name, args))
+        return self._results.get(timeout=60)
+
+    def stop(self):
+        self._commands.put(None)
+        self._process.join()
+
+
+# ----------------------------------------------------------------------------
+# Scenarios
+# ----------------------------------------------------------------------------
+
+failures = []
+
+
+def check(condition, message):
+    print(f"   {'✅' if condition else '❌'} {message}")
+    if not condition:
+        failures.append(message)
+
+
+def test_rebook_after_external_cancel(directory):
+    print("1. 🔁 Testing rebooking a seat cancelled by another process...")
+    db_path = os.path.join(directory, "shared.db")
+    first = ServerProcess(FLIGHT_DB_PATH=db_path)
+    filled = first.call("fill")
+    flight_id = filled["flight_id"]
+    booking_id, seat_number = filled["bookings"][0]
+    check(filled["seats_left"] == 0, f"{flight_id} filled with {len(filled['bookings'])} bookings")
+
+    second = ServerProcess(FLIGHT_DB_PATH=db_path)
+    check("error" not in second.call("cancel", booking_id), f"second process cancelled {booking_id}")
+    second.stop()
+
+    rebooked = first.call("book", flight_id)
+    check("error" not in rebooked, f"first process rebooked the freed seat: {rebooked.get('error', rebooked.get('booking_id'))}")
+    check(rebooked.get("seat_number") == seat_number, f"the rebooking got seat {seat_number}")
+    overbooked = first.call("book", flight_id)
+    check("error" in overbooked, "the flight is full again")
+
+    # Already cancelled elsewhere: cancelling again must not free a seat
+    first.call("cancel", booking_id)
+    overbooked = first.call("book", flight_id)
+    check("error" in overbooked, "a repeated cancel frees no seat")
+    state = first.call("state", flight_id)
+    check(state["seats_left"] == 0, f"{flight_id} has {state['seats_left']} seats left")
+    first.stop()
+
+
+def test_journal_replay_after_truncation(directory):
+    print("\n2. 📜 Testing journal replay after a torn write...")
+    journal_path = os.path.join(directory, "bookings.journal")
+
+    server = ServerProcess(FLIGHT_JOURNAL_PATH=journal_path)
+    filled = server.call("fill")
+    flight_id = filled["flight_id"]
+    booking_id = filled["bookings"][0][0]
+    check("error" not in server.call("cancel", booking_id), f"cancelled {booking_id}")
+    server.stop()
+    sold = len(filled["bookings"])
+
+    # Crash while the cancellation was being written: cut its record short
+    size = os.path.getsize(journal_path)
+    os.truncate(journal_path, size - 3)
+
+    server = ServerProcess(FLIGHT_JOURNAL_PATH=journal_path)
+    state = server.call("state", flight_id)
+    check(state["truncated_bytes"] > 0, f"replay dropped the torn tail ({state['truncated_bytes']} bytes)")
+    check(len(state["confirmed"]) == sold, f"{sold} bookings replayed, {booking_id} still confirmed")
+    check(state["seats_left"] == 0, f"{flight_id} still full after replay")
+    check("error" not in server.call("cancel", booking_id), f"cancelled {booking_id} again after restart")
+    rebooked = server.call("book", flight_id)
+    check("error" not in rebooked, "booked the freed seat")
+    server.stop()
+
+    server = ServerProcess(FLIGHT_JOURNAL_PATH=journal_path)
+    state = server.call("state", flight_id)
+    check(state["truncated_bytes"] == 0, "records written after the repair replay cleanly")
+    check(len(state["confirmed"]) == sold, f"{sold} confirmed bookings after a second restart")
+    check(booking_id not in state["confirmed"], f"{booking_id} stays cancelled")
+    check(state["seats_left"] == 0, f"{flight_id} has {state['seats_left']} seats left")
+    server.stop()
+
+
+def test_hold_expiry():
+    print("\n3. ⏳ Testing hold expiry...")
+    server = ServerProcess()
+    result = server.call("hold_expiry")
+    server.stop()
+    check(result["held"] == result["before"] - 2, "holding took two seats")
+    check(result["after"] == result["before"], "the expired hold gave both seats back")
+    check(result["statuses"] == ["cancelled", "cancelled"], f"held bookings ended as {result['statuses']}")
+    check("error" in result["confirm"], f"confirming too late is refused: {result['confirm'].get('error')}")
+
+
+def test_adopted_hold_after_confirm(directory):
+    print("\n4. 🤝 Testing an adopted hold confirmed by its owner...")
+    db_path = os.path.join(directory, "holds.db")
+    owner = ServerProcess(FLIGHT_DB_PATH=db_path)
+    held = owner.call("hold")
+    flight_id, booking_id = held["flight_id"], held["booking_id"]
+    # Started while the hold is live, so it adopts the hold with a timer of its own
+    other = ServerProcess(FLIGHT_DB_PATH=db_path)
+    other.call("state", flight_id)
+
+    failed = owner.call("confirm", held["hold_id"], True)
+    check("error" in failed["result"], f"a failing store is reported: {failed['result'].get('error')}")
+    check(failed["still_held"], "the hold is kept after the failed confirm")
+    confirmed = owner.call("confirm", held["hold_id"])
+    check("error" not in confirmed["result"], "the retried confirm books the seat")
+
+    check(other.call("expire_adopted") == 1, "the other process expired its adopted hold")
+    for name, server in (("owner", owner), ("other process", other)):
+        state = server.call("state", flight_id)
+        check(booking_id in state["confirmed"], f"{booking_id} is still confirmed for the {name}")
+        check(state["seats_left"] == held["before"] - 1, f"{flight_id} has {state['seats_left']} seats left for the {name}")
+    owner.stop()
+    other.stop()
+
+
+if __name__ == "__main__":
+    print("🧪 Testing Booking Behaviour Across Processes and Restarts")
+    print("=" * 50)
+    with tempfile.TemporaryDirectory() as directory:
+        test_rebook_after_external_cancel(directory)
+        test_journal_replay_after_truncation(directory)
+        test_hold_expiry()
+        test_adopted_hold_after_confirm(directory)
+    if failures:
+        print(f"\n❌ {len(failures)} checks failed")
+        sys.exit(1)
+    print("\n🎉 All behaviour tests passed!")
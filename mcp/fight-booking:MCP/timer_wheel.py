@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Hashed Timer Wheel
+
+Deadlines are hashed into a ring of slots by the tick they fall in.
+Scheduling and cancelling are a dict insert or delete, and each tick only
+visits its own slot. When the ring spans the longest timeout, every entry
+in a visited slot is due, so expiring costs O(1) per expired timer however
+many are pending. A longer timeout stays in its slot for extra turns of
+the ring and is skipped until its deadline passes.
+"""
+
+import math
+import time
+from typing import Callable, Dict, Hashable, List
+
+
+class TimerWheel:
+    """Expiry times keyed by id, with O(1) schedule, cancel and per-timer expiry"""
+
+    def __init__(self, tick: float = 1.0, slots: int = 4096, clock: Callable[[], float] = time.monotonic):
+        if tick <= 0 or slots <= 0:
+            raise ValueError("tick and slots must be positive")
+        self.tick = tick
+        self._slots: List[Dict[Hashable, float]] = [{} for _ in range(slots)]
+        # key -> index of the slot holding it
+        self._where: Dict[Hashable, int] = {}
+        # Last tick whose slot has been visited
+        self._current = math.floor(clock() / tick)
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._where
+
+    def schedule(self, key: Hashable, deadline: float):
+        """Fire `key` once the clock reaches `deadline`; rescheduling moves it"""
+        self.cancel(key)
+        # Never behind the cursor, or the slot would only come round a full turn later
+        index = max(math.ceil(deadline / self.tick), self._current + 1) % len(self._slots)
+        self._slots[index][key] = deadline
+        self._where[key] = index
+
+    def cancel(self, key: Hashable) -> bool:
+        index = self._where.pop(key, None)
+        if index is None:
+            return False
+        del self._slots[index][key]
+        return True
+
+    def advance(self, now: float) -> List[Hashable]:
+        """Visit every slot up to `now` and return the keys that expired"""
+        target = math.floor(now / self.tick)
+        # One turn of the ring visits every slot; more would see the same ones again
+        start = max(self._current + 1, target - len(self._slots) + 1)
+        expired = []
+        for current in range(start, target + 1):
+            slot = self._slots[current % len(self._slots)]
+            if not slot:
+                continue
+            due = [key for key, deadline in slot.items() if deadline <= now]
+            for key in due:
+                del slot[key]
+                del self._where[key]
+            expired.extend(due)
+        self._current = max(self._current, target)
+        return expired